@@ -0,0 +1,79 @@
+import cv2
+import numpy as np
+
+# Largura (em pixels) da miniatura em tons de cinza usada para medir o movimento
+LARGURA_MINIATURA = 64
+
+
+def miniatura(frame, largura=LARGURA_MINIATURA):
+    """Reduz o quadro BGR a uma miniatura em tons de cinza (float32, 0 a 1)."""
+    altura = max(1, round(frame.shape[0] * largura / frame.shape[1]))
+    cinza = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(cinza, (largura, altura), interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0
+
+
+class AmostradorMovimento:
+    """
+    Decide, quadro a quadro, se vale a pena rodar a inferência de pose.
+
+    O escore de movimento é a diferença absoluta média entre a miniatura do quadro e a do
+    último quadro inferido. A inferência roda sempre que o escore passa de limiar (cena
+    mudou) e, em posturas paradas, pelo menos a cada passo_maximo quadros.
+    """
+
+    def __init__(self, limiar=0.015, passo_maximo=15, largura=LARGURA_MINIATURA):
+        self.limiar = limiar
+        self.passo_maximo = max(int(passo_maximo), 1)
+        self.largura = largura
+        self.quadros = 0
+        self.inferidos = 0
+        self._referencia = None
+        self._desde_inferencia = 0
+
+    def escore(self, frame):
+        """Escore de movimento do quadro em relação ao último quadro inferido (0 a 1)."""
+        if self._referencia is None:
+            return np.inf
+        atual = miniatura(frame, self.largura)
+        if atual.shape != self._referencia.shape:
+            return np.inf
+        return float(np.abs(atual - self._referencia).mean())
+
+    def inferir(self, frame):
+        """True se o quadro deve passar pela inferência; caso contrário os keypoints são preenchidos."""
+        self.quadros += 1
+        self._desde_inferencia += 1
+        if self._desde_inferencia < self.passo_maximo and self.escore(frame) <= self.limiar:
+            return False
+        self._referencia = miniatura(frame, self.largura)
+        self._desde_inferencia = 0
+        self.inferidos += 1
+        return True
+
+    @property
+    def fracao_pulada(self):
+        return 1 - self.inferidos / self.quadros if self.quadros else 0.0
+
+
+def preencher(anteriores, ids_anteriores, seguintes=None, t=0.0):
+    """
+    Pessoas de um quadro pulado a uma fração t (0 a 1) entre dois quadros inferidos.
+    seguintes é a tupla (pessoas, track_ids) da próxima inferência; trilhas presentes nos
+    dois quadros têm os keypoints interpolados linearmente (com a menor das duas
+    confianças) e as demais trilhas do quadro anterior são mantidas. Sem seguintes (fim
+    do vídeo ou interpolação desligada), todas as pessoas anteriores são mantidas.
+    Retorna (pessoas (n, 17, 3), track_ids (n,)).
+    """
+    pessoas = np.array(anteriores, dtype=np.float32, copy=True)
+    if seguintes is None or not len(pessoas):
+        return pessoas, np.asarray(ids_anteriores)
+
+    atuais, ids_atuais = seguintes
+    posicao = {int(track): i for i, track in enumerate(ids_atuais)}
+    for i, track in enumerate(ids_anteriores):
+        j = posicao.get(int(track))
+        if j is None:
+            continue
+        pessoas[i, :, :2] += t * (atuais[j, :, :2] - pessoas[i, :, :2])
+        pessoas[i, :, 2] = np.minimum(pessoas[i, :, 2], atuais[j, :, 2])
+    return pessoas, np.asarray(ids_anteriores)
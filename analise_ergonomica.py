@@ -1,21 +1,13 @@
-import numpy as np
+from instrumentacao import medido
+from regras import EVENTO, PERSISTENCIA_MINIMA_S, obter_regras
 
 
-def calcular_angulo(a, b, c):
-    """Calcula o ângulo entre três pontos (em graus)."""
-    a, b, c = np.array(a), np.array(b), np.array(c)
-    ba = a - b
-    bc = c - b
-    cos_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc) + 1e-6)
-    angle = np.arccos(np.clip(cos_angle, -1.0, 1.0))
-    return np.degrees(angle)
-
-
-
-def analisar_metricas_ergonomicas(df_desvios):
-    metricas = {
+def metricas_iniciais():
+    """Dicionário de métricas sem nenhum desvio registrado."""
+    return {
         "Posturas Inadequadas": 0,
         "Movimentos Repetitivos": 0,
+        "Ciclos por Minuto": 0.0,
         "Posturas Forçadas (>90s)": 0,
         "Pausas/Ritmo de Trabalho": 0,
         "Mobiliário/Layout": 1,
@@ -25,57 +17,78 @@ def analisar_metricas_ergonomicas(df_desvios):
         "Postura Sentada": 0
     }
 
-    if df_desvios.empty:
+
+def classificar_risco(total_desvios):
+    """Risco postural baseado na quantidade de desvios."""
+    if total_desvios >= 10:
+        return "Alto"
+    if total_desvios >= 5:
+        return "Moderado"
+    return "Baixo"
+
+
+@medido("metricas")
+def analisar_metricas_ergonomicas(resumo, ciclos=None):
+    """
+    Calcula as métricas ergonômicas a partir do resumo por tipo de desvio de
+    desvios.resumo_desvios (eventos, desvio padrão do ângulo e trechos em ângulo extremo),
+    sem a tabela por quadro. ciclos é o resultado de ciclos.analisar_ciclos; sem ele,
+    repetição e pausas não são avaliadas.
+    """
+    metricas = metricas_iniciais()
+    if ciclos is not None:
+        metricas["Movimentos Repetitivos"] = ciclos["episodios_repetitivos"]
+        metricas["Ciclos por Minuto"] = ciclos["ciclos_por_minuto"]
+        metricas["Pausas/Ritmo de Trabalho"] = len(ciclos["pausas"])
+
+    if resumo.empty:
         return metricas
 
-    # Contagem total de desvios persistentes
-    # Contar eventos únicos por tipo de desvio
-    df_desvios = df_desvios.sort_values(by=["Desvio", "Frame"])
-    df_desvios["Frame_diff"] = df_desvios["Frame"].diff().fillna(1)
-    df_desvios["Desvio_diff"] = df_desvios["Desvio"] != df_desvios["Desvio"].shift()
-    df_desvios["Novo_evento"] = (df_desvios["Frame_diff"] != 1) | (df_desvios["Desvio_diff"])
-    df_desvios["Evento"] = df_desvios["Novo_evento"].cumsum()
-    metricas["Posturas Inadequadas"] = df_desvios.groupby(["Desvio", "Evento"]).ngroups
-
-    # Filtrar apenas os desvios com ângulos extremos
-    extremos = df_desvios[
-        ((df_desvios["Desvio"] == "Braço elevado acima do ombro") & (df_desvios["Ângulo"] > 150)) |
-        ((df_desvios["Desvio"] == "Flexão profunda do joelho") & (df_desvios["Ângulo"] < 60)) |
-        ((df_desvios["Desvio"] == "Inclinação excessiva do tronco") & (df_desvios["Ângulo"] < 90))
-        ].copy()
-    # Contar eventos únicos de flexão profunda do joelho
-    joelho = df_desvios[df_desvios["Desvio"] == "Flexão profunda do joelho"].copy()
-    joelho = joelho.sort_values(by="Frame")
-    joelho["Frame_diff"] = joelho["Frame"].diff().fillna(1)
-    joelho["Novo_evento"] = joelho["Frame_diff"] != 1
-    joelho["Evento"] = joelho["Novo_evento"].cumsum()
-    num_eventos_joelho = joelho["Evento"].nunique()
-
-    # Se quiser adicionar ao dicionário de métricas:
-    metricas["Flexão profunda do joelho"] = num_eventos_joelho
-
-    # Identificar eventos únicos
-    extremos = extremos.sort_values(by=["Desvio", "Frame"])
-    extremos["Frame_diff"] = extremos["Frame"].diff().fillna(1)
-    extremos["Desvio_diff"] = extremos["Desvio"] != extremos["Desvio"].shift()
-    extremos["Novo_evento"] = (extremos["Frame_diff"] != 1) | (extremos["Desvio_diff"])
-    extremos["Evento"] = extremos["Novo_evento"].cumsum()
-
-    # Contar eventos únicos
-    metricas["Ângulos Articulares Extremos"] = extremos.groupby(["Desvio", "Evento"]).ngroups
+    eventos = resumo.set_index("Desvio")["Eventos"]
+    metricas["Posturas Inadequadas"] = int(eventos.sum())
+    metricas["Flexão profunda do joelho"] = int(eventos.get("Flexão profunda do joelho", 0))
+    metricas["Ângulos Articulares Extremos"] = int(resumo["Extremos"].sum())
 
     # Posturas forçadas: número de tipos de desvio com persistência mínima já garantida
-    metricas["Posturas Forçadas (>90s)"] = len(df_desvios["Desvio"].unique())
+    metricas["Posturas Forçadas (>90s)"] = len(resumo)
 
-    # Posturas estáticas: desvios com pouca variação de ângulo
-    desvios_estaticos = df_desvios.groupby("Desvio")["Ângulo"].std()
-    metricas["Posturas Estáticas (>4s)"] = (desvios_estaticos < 5).sum()
+    # Posturas estáticas: desvios com pouca variação de ângulo (desvio padrão amostral < 5)
+    metricas["Posturas Estáticas (>4s)"] = int((resumo["Desvio padrão"] < 5).sum())
 
-    # Risco postural baseado na quantidade de desvios
-    total = metricas["Posturas Inadequadas"]
-    if total >= 10:
-        metricas["Risco Postural"] = "Alto"
-    elif total >= 5:
-        metricas["Risco Postural"] = "Moderado"
+    metricas["Risco Postural"] = classificar_risco(metricas["Posturas Inadequadas"])
 
     return metricas
+
+
+def gerar_diagnostico_avancado(metricas, resumo, regras=None):
+    """Lista de mensagens de diagnóstico a partir das métricas e do resumo de desvios.resumo_desvios."""
+    regras = obter_regras(regras).aplicacao(EVENTO)
+    diagnostico = []
+
+    # Diagnóstico baseado nas métricas
+    if metricas["Posturas Inadequadas"] > 0:
+        diagnostico.append(f"⚠️ Foram detectadas {metricas['Posturas Inadequadas']} posturas inadequadas, indicando risco ergonômico conforme a NR-17.")
+    if metricas["Movimentos Repetitivos"] > 0:
+        diagnostico.append(f"⚠️ Movimentos repetitivos foram identificados ({metricas['Ciclos por Minuto']:g} ciclos/min), o que pode levar a LER/DORT.")
+    if metricas["Posturas Forçadas (>90s)"] > 0:
+        diagnostico.append("⚠️ Posturas forçadas foram mantidas por mais de 90 segundos, o que representa risco elevado.")
+    if metricas["Pausas/Ritmo de Trabalho"] == 0:
+        diagnostico.append("⚠️ Ausência de pausas detectada. A NR-17 recomenda pausas regulares para recuperação.")
+    if metricas["Ângulos Articulares Extremos"] > 0:
+        diagnostico.append(f"⚠️ Foram detectados {metricas['Ângulos Articulares Extremos']} ângulos articulares extremos, o que pode causar sobrecarga muscular.")
+    if metricas["Posturas Estáticas (>4s)"] > 0:
+        diagnostico.append(f"⚠️ {metricas['Posturas Estáticas (>4s)']} posturas estáticas foram mantidas por mais de 4 segundos.")
+    if metricas["Risco Postural"] in ["Moderado", "Alto"]:
+        diagnostico.append(f"⚠️ O risco postural geral foi classificado como **{metricas['Risco Postural']}**, indicando necessidade de intervenção.")
+
+    # Diagnóstico baseado nos desvios detectados
+    if not resumo.empty:
+        tipos = resumo.set_index("Desvio")["Quadros"].sort_values(ascending=False, kind="stable")
+        for tipo, qtd in tipos.items():
+            duracao = regras.regra(tipo).duracao_minima_s if tipo in regras.nomes else PERSISTENCIA_MINIMA_S
+            diagnostico.append(f"🔍 Foram detectadas {qtd} ocorrências de \"{tipo}\" com persistência mínima de {duracao:g} segundos.")
+
+    if not diagnostico:
+        diagnostico.append("✅ Nenhum risco ergonômico relevante foi identificado. A postura está dentro dos limites recomendados.")
+
+    return diagnostico
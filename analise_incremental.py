@@ -0,0 +1,233 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from analise_ergonomica import metricas_iniciais, classificar_risco
+from desvios import COLUNAS_EVENTOS
+from pose_store import DEFAULT_FPS
+from regras import EVENTO, obter_regras
+
+
+class _Sequencia:
+    """Estado O(1) de uma sequência de quadros em desvio que ainda não terminou."""
+
+    __slots__ = ("inicio", "fim", "n", "minimo", "maximo", "soma", "soma_arred", "soma_q_arred",
+                 "extremos", "em_extremo")
+
+    def __init__(self, inicio):
+        self.inicio = inicio
+        self.fim = inicio
+        self.n = 0
+        self.minimo = math.inf
+        self.maximo = -math.inf
+        self.soma = 0.0
+        self.soma_arred = 0.0
+        self.soma_q_arred = 0.0
+        self.extremos = 0
+        self.em_extremo = False
+
+    def adicionar(self, quadro, angulo, extremo):
+        arredondado = round(angulo, 2)
+        self.fim = quadro
+        self.n += 1
+        self.minimo = min(self.minimo, angulo)
+        self.maximo = max(self.maximo, angulo)
+        self.soma += angulo
+        self.soma_arred += arredondado
+        self.soma_q_arred += arredondado * arredondado
+        if extremo and not self.em_extremo:
+            self.extremos += 1
+        self.em_extremo = extremo
+
+
+class _EstadoOperador:
+    """Sequências abertas e contagens acumuladas de um operador (trilha)."""
+
+    def __init__(self, tipos):
+        self.quadros = 0
+        self.abertas = {tipo: None for tipo in tipos}
+        self.eventos_por_tipo = {tipo: 0 for tipo in tipos}
+        self.extremos = 0
+        # Por tipo: [quadros, soma, soma dos quadrados] dos ângulos em desvio persistente
+        self.estatisticas = {tipo: [0, 0.0, 0.0] for tipo in tipos}
+
+
+class AnalisadorIncremental:
+    """
+    Análise ergonômica feita à medida que os quadros de pose chegam.
+
+    Mantém, para cada operador, apenas o estado da sequência aberta de cada tipo de
+    desvio e produz avisos assim que um desvio atinge a persistência mínima ("alerta")
+    e quando termina ("concluído"). Ao final, eventos e métricas coincidem com
+    detectar_eventos e analisar_metricas_ergonomicas aplicados ao vídeo inteiro (exceto
+    repetição e pausas, que dependem da série completa; veja ciclos.analisar_ciclos).
+    fps e frame_skip descrevem a amostragem dos quadros recebidos; os desvios são as
+    regras de evento de regras, cada uma com sua persistência mínima em segundos
+    (persistencia_minima_s substitui a de todas).
+
+    Os avisos ao vivo usam os keypoints brutos de cada quadro; o resultado final de
+    run_pose_estimation passa por suavizacao.preprocessar, de modo que a análise do vídeo
+    inteiro pode diferir ligeiramente dos avisos.
+    """
+
+    def __init__(self, fps=DEFAULT_FPS, frame_skip=1, persistencia_minima_s=None, regras=None):
+        self.fps = fps
+        self.frame_skip = frame_skip
+        self.regras = obter_regras(regras).aplicacao(EVENTO)
+        self.persistencia_minima = dict(zip(self.regras.nomes, self.regras.amostras_minimas(
+            fps, frame_skip, persistencia_minima_s).tolist()))
+        self.quadro = 0
+        self.eventos = []
+        self._operadores = {}
+        # Operadores com alguma sequência aberta: os únicos que um quadro pode encerrar
+        self._abertos = {}
+
+    def _evento(self, operador, tipo, seq):
+        return {
+            "Operador": operador,
+            "Desvio": tipo,
+            "Frame inicial": seq.inicio,
+            "Frame final": seq.fim,
+            "Início (s)": round(seq.inicio / self.fps, 2),
+            "Fim (s)": round(seq.fim / self.fps, 2),
+            "Duração (s)": round(seq.n * self.frame_skip / self.fps, 2),
+            "Ângulo mín": round(seq.minimo, 2),
+            "Ângulo máx": round(seq.maximo, 2),
+            "Ângulo médio": round(seq.soma / seq.n, 2),
+        }
+
+    def _fechar(self, operador, tipo, avisos):
+        estado = self._operadores[operador]
+        seq = estado.abertas[tipo]
+        estado.abertas[tipo] = None
+        if seq is None or seq.n < self.persistencia_minima[tipo]:
+            return
+
+        evento = self._evento(operador, tipo, seq)
+        self.eventos.append(evento)
+        estado.eventos_por_tipo[tipo] += 1
+        estado.extremos += seq.extremos
+        estatisticas = estado.estatisticas[tipo]
+        estatisticas[0] += seq.n
+        estatisticas[1] += seq.soma_arred
+        estatisticas[2] += seq.soma_q_arred
+        avisos.append(dict(evento, Status="concluído"))
+
+    def atualizar(self, pessoas, track_ids=None, quadro=None):
+        """
+        Consome as pessoas detectadas em um quadro (array (n, 17, 2|3)) com seus ids de
+        trilha e retorna a lista de avisos gerados. quadro é o índice do quadro no vídeo
+        (padrão: o seguinte ao último consumido).
+        """
+        quadro = self.quadro if quadro is None else quadro
+        pessoas = np.asarray(pessoas, dtype=np.float64)
+        n = len(pessoas) if pessoas.size else 0
+        track_ids = range(n) if track_ids is None else [int(track) for track in track_ids]
+        if n:
+            # Todas as regras avaliadas de uma vez para todas as pessoas do quadro: (regras, pessoas)
+            valores = self.regras.valores(self.regras.angulos(pessoas))
+            violacoes = self.regras.violacoes(valores)
+            extremos = self.regras.extremos.avaliar(np.round(valores, 2))
+
+        avisos = []
+        for j, operador in enumerate(track_ids):
+            estado = self._operadores.setdefault(operador, _EstadoOperador(self.regras.nomes))
+            estado.quadros += 1
+            for r, tipo in enumerate(self.regras.nomes):
+                if not violacoes[r, j]:
+                    self._fechar(operador, tipo, avisos)
+                    continue
+
+                angulo = float(valores[r, j])
+                seq = estado.abertas[tipo]
+                if seq is None:
+                    seq = estado.abertas[tipo] = _Sequencia(quadro)
+                seq.adicionar(quadro, angulo, bool(extremos[r, j]))
+
+                if seq.n == self.persistencia_minima[tipo]:
+                    avisos.append({
+                        "Status": "alerta",
+                        "Operador": operador,
+                        "Desvio": tipo,
+                        "Frame inicial": seq.inicio,
+                        "Início (s)": round(seq.inicio / self.fps, 2),
+                        "Ângulo": round(angulo, 2),
+                    })
+
+            if any(seq is not None for seq in estado.abertas.values()):
+                self._abertos[operador] = estado
+            else:
+                self._abertos.pop(operador, None)
+
+        # Operadores ausentes neste quadro interrompem suas sequências
+        presentes = set(track_ids)
+        for operador in [operador for operador in self._abertos if operador not in presentes]:
+            del self._abertos[operador]
+            for tipo in self.regras.nomes:
+                self._fechar(operador, tipo, avisos)
+
+        self.quadro = quadro + 1
+        return avisos
+
+    def finalizar(self):
+        """Encerra as sequências abertas no fim do vídeo e retorna os avisos gerados."""
+        avisos = []
+        for operador in self._abertos:
+            for tipo in self.regras.nomes:
+                self._fechar(operador, tipo, avisos)
+        self._abertos.clear()
+        return avisos
+
+    def processar(self, quadros):
+        """
+        Consome um gerador de quadros e produz os avisos à medida que surgem. Cada item é
+        um array de pessoas ou uma tupla (quadro, pessoas, track_ids).
+        """
+        for item in quadros:
+            if isinstance(item, tuple):
+                quadro, pessoas, track_ids = item
+                avisos = self.atualizar(pessoas, track_ids, quadro)
+            else:
+                avisos = self.atualizar(item)
+            for aviso in avisos:
+                yield aviso
+        for aviso in self.finalizar():
+            yield aviso
+
+    def operador_principal(self):
+        """Operador visto em mais quadros até agora."""
+        if not self._operadores:
+            return 0
+        return max(self._operadores, key=lambda operador: self._operadores[operador].quadros)
+
+    def eventos_dataframe(self, operador=None):
+        """Eventos concluídos no mesmo formato de detectar_eventos (padrão: todos os operadores)."""
+        eventos = self.eventos if operador is None else [e for e in self.eventos if e["Operador"] == operador]
+        return pd.DataFrame(eventos, columns=COLUNAS_EVENTOS)
+
+    def metricas(self, operador=None):
+        """Métricas ergonômicas de um operador (padrão: o principal) com os eventos concluídos até agora."""
+        metricas = metricas_iniciais()
+        estado = self._operadores.get(self.operador_principal() if operador is None else operador)
+        if estado is None:
+            return metricas
+        por_tipo = {tipo: n for tipo, n in estado.eventos_por_tipo.items() if n}
+        if not por_tipo:
+            return metricas
+
+        metricas["Posturas Inadequadas"] = sum(por_tipo.values())
+        metricas["Flexão profunda do joelho"] = por_tipo.get("Flexão profunda do joelho", 0)
+        metricas["Ângulos Articulares Extremos"] = estado.extremos
+        metricas["Posturas Forçadas (>90s)"] = len(por_tipo)
+
+        # Posturas estáticas: desvios com pouca variação de ângulo (desvio padrão amostral < 5)
+        estaticos = 0
+        for n, soma, soma_q in estado.estatisticas.values():
+            if n > 1:
+                variancia = max(soma_q - soma * soma / n, 0.0) / (n - 1)
+                estaticos += math.sqrt(variancia) < 5
+        metricas["Posturas Estáticas (>4s)"] = estaticos
+
+        metricas["Risco Postural"] = classificar_risco(metricas["Posturas Inadequadas"])
+        return metricas
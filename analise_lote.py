@@ -0,0 +1,331 @@
+"""
+Análise ergonômica em lote, sem interface.
+
+Uso:
+    python -m analise_lote "gravacoes/**/*.mp4" -o resultados -j 4
+
+Para cada vídeo é criada uma pasta em --saida com metricas.json (métricas, diagnóstico e
+parâmetros), eventos.csv, desvios_por_minuto.csv, pausas.csv e o dataset de pose em pose/;
+--quadros csv|parquet grava também a tabela por quadro (desvios.csv ou .parquet). Vídeos cuja pasta já
+tem metricas.json com os mesmos parâmetros e regras (arquivo e conteúdo) são pulados (use --forcar
+para reprocessar).
+Ao final, resumo.csv reúne as métricas de todos os vídeos da pasta de saída.
+
+Datasets de pose salvos (pastas com meta.json) também podem ser passados no lugar dos
+vídeos, e --reanalisar refaz a análise a partir dos datasets já gravados em --saida; em
+ambos os casos não há inferência e o vídeo não é necessário (ex.: resultados/*/pose).
+--regras troca o arquivo de regras ergonômicas (padrão: regras_ergonomicas.json) e
+--log-desempenho acrescenta os tempos de cada etapa de cada vídeo a um arquivo JSON Lines.
+
+Com menos vídeos pendentes que --processos (ex.: uma gravação de um turno inteiro),
+--trechos N divide cada vídeo em N trechos processados em paralelo (veja parallel_pose),
+um vídeo de cada vez; com mais vídeos, o paralelismo é por vídeo e --trechos é ignorado.
+
+Com --historico ARQUIVO, as métricas e os eventos de cada vídeo são gravados também no
+histórico SQLite (veja historico), com o posto (--posto), o operador (--operador-nome) e a
+data da gravação (--data; padrão: data de modificação do vídeo), para comparações e
+tendências entre lotes.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from analise_ergonomica import analisar_metricas_ergonomicas, gerar_diagnostico_avancado
+from ciclos import analisar_ciclos
+from desvios import detectar_eventos, resumo_desvios
+from exportacao import FORMATOS, exportar_desvios
+from historico import registrar_analise
+from instrumentacao import VARIAVEL_LOG, Desempenho
+from model_registry import MODEL_SIZES, BACKENDS, model_path_for
+from parallel_pose import run_pose_estimation_parallel
+from pose_cache import hash_arquivo
+from pose_dataset import carregar_dataset, e_dataset, ler_metadados, salvar_dataset, valor_nativo
+from recorte import ROI_AUTOMATICA
+from regras import VARIAVEL_REGRAS, obter_regras
+from yolo_pose_analysis import run_pose_estimation
+
+ARQUIVO_METRICAS = "metricas.json"
+ARQUIVO_RESUMO = "resumo.csv"
+PASTA_POSE = "pose"
+
+
+def listar_videos(padroes):
+    """
+    Expande caminhos e padrões glob (com ** recursivo) em uma lista ordenada e sem
+    repetições de vídeos e pastas de datasets de pose.
+    """
+    videos = set()
+    for padrao in padroes:
+        encontrados = glob.glob(padrao, recursive=True) if glob.has_magic(padrao) else [padrao]
+        videos.update(os.path.abspath(video) for video in encontrados if os.path.isfile(video) or e_dataset(video))
+    return sorted(videos)
+
+
+def pasta_do_video(saida, video):
+    """Pasta de resultados do vídeo: nome do arquivo mais um hash curto do caminho (evita colisões)."""
+    if e_dataset(video) and os.path.basename(video) == PASTA_POSE:
+        # Dataset gravado por um lote anterior: os resultados ficam ao lado dele
+        return os.path.dirname(video)
+    nome = os.path.splitext(os.path.basename(video))[0]
+    return os.path.join(saida, f"{nome}-{hashlib.sha1(video.encode()).hexdigest()[:8]}")
+
+
+def parametros_analise(parametros):
+    """
+    Parâmetros gravados em metricas.json: os da estimativa de pose (None se desconhecidos)
+    mais o arquivo de regras em vigor e o hash do seu conteúdo, normalizados como no JSON.
+    """
+    origem = obter_regras().origem
+    parametros = dict(parametros or {}, regras=origem,
+                      regras_hash=hash_arquivo(origem) if origem and os.path.isfile(origem) else None)
+    return json.loads(json.dumps(parametros, default=valor_nativo))
+
+
+def ja_processado(pasta, parametros):
+    """
+    True se a pasta já tem o resultado completo do vídeo com os mesmos parâmetros
+    (veja parametros_analise: inclui as regras em vigor).
+    """
+    caminho = os.path.join(pasta, ARQUIVO_METRICAS)
+    if not os.path.exists(caminho):
+        return False
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            return json.load(f).get("parametros") == parametros
+    except (OSError, ValueError):
+        return False
+
+
+def _pose_do_video(video, pasta, parametros, reanalisar, threads, trechos=None, processos=None):
+    """
+    PoseStore do vídeo: de um dataset (entrada ou já gravado na pasta) ou por inferência,
+    dividida em trechos processados por até processos processos quando trechos > 1.
+    Os parâmetros da inferência ficam no metadata do dataset ("parametros").
+    """
+    if e_dataset(video):
+        return carregar_dataset(video)
+    pasta_pose = os.path.join(pasta, PASTA_POSE)
+    if reanalisar and e_dataset(pasta_pose):
+        return carregar_dataset(pasta_pose)
+
+    if trechos and trechos > 1:
+        pose_data, _ = run_pose_estimation_parallel(video, workers=processos, segments=trechos, **parametros)
+    else:
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        pose_data, _ = run_pose_estimation(video, **parametros)
+    pose_data.metadata.update(video_hash=hash_arquivo(video), video_path=video, parametros=parametros)
+    salvar_dataset(pose_data, pasta_pose)
+    return pose_data
+
+
+def _data_gravacao(video, pose_data):
+    """Data (AAAA-MM-DD) da gravação: modificação do arquivo de vídeo ou criação do dataset."""
+    caminho = pose_data.metadata.get("video_path", video)
+    if os.path.isfile(caminho):
+        return time.strftime("%Y-%m-%d", time.localtime(os.path.getmtime(caminho)))
+    return pose_data.metadata.get("criado_em", "")[:10] or None
+
+
+def processar_video(video, pasta, parametros, threads=None, reanalisar=False, quadros=None, historico=None,
+                    trechos=None, processos=None):
+    """
+    Executa a estimativa de pose (ou carrega o dataset salvo) e a análise ergonômica de um
+    vídeo e grava os arquivos na pasta (quadros: formato da tabela por quadro, se desejada).
+    metricas.json é gravado por último e marca o vídeo como processado; nele ficam também
+    os tempos de cada etapa (veja instrumentacao). historico ({"caminho", "posto",
+    "operador", "data"}) registra o resultado também no histórico. Com trechos > 1, a
+    inferência é dividida em trechos paralelos (até processos processos). Os parâmetros
+    gravados são os com que o dataset foi gerado, que diferem de parametros quando um
+    dataset salvo é reaproveitado. Retorna a linha do resumo.
+    """
+    desempenho = Desempenho(video)
+    with desempenho.ativa():
+        pose_data = _pose_do_video(video, pasta, parametros, reanalisar, threads, trechos, processos)
+        resumo = resumo_desvios(pose_data)
+        ciclos = analisar_ciclos(pose_data)
+        metricas = analisar_metricas_ergonomicas(resumo, ciclos=ciclos)
+
+        exportar_desvios(pose_data, pasta, quadros)
+        ciclos["pausas"].to_csv(os.path.join(pasta, "pausas.csv"), index=False)
+        diagnostico = gerar_diagnostico_avancado(metricas, resumo)
+    desempenho.finalizar().gravar()
+
+    resultado = {
+        "video": pose_data.metadata.get("video_path", video),
+        "parametros": parametros_analise(pose_data.metadata.get("parametros")),
+        "quadros": pose_data.n_frames,
+        "duracao_s": round(pose_data.n_frames * pose_data.frame_skip / pose_data.fps, 2),
+        "regras": obter_regras().origem,
+        "metricas": metricas,
+        "diagnostico": diagnostico,
+        "desempenho": desempenho.resumo(),
+    }
+    temporario = os.path.join(pasta, ARQUIVO_METRICAS + ".tmp")
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2, default=valor_nativo)
+    os.replace(temporario, os.path.join(pasta, ARQUIVO_METRICAS))
+
+    if historico is not None:
+        registrar_analise(metricas, detectar_eventos(pose_data), posto=historico.get("posto"),
+                          operador=historico.get("operador"),
+                          data=historico.get("data") or _data_gravacao(video, pose_data),
+                          video=resultado["video"], video_hash=pose_data.metadata.get("video_hash"),
+                          trilha=pose_data.primary_operator(), duracao_s=resultado["duracao_s"],
+                          regras=resultado["regras"], caminho=historico.get("caminho"))
+    return resultado
+
+
+def gerar_resumo(saida):
+    """Reúne os metricas.json da pasta de saída em resumo.csv (um vídeo por linha)."""
+    linhas = []
+    for caminho in sorted(glob.glob(os.path.join(saida, "*", ARQUIVO_METRICAS))):
+        with open(caminho, encoding="utf-8") as f:
+            resultado = json.load(f)
+        linhas.append({"Vídeo": resultado["video"], "Quadros": resultado["quadros"],
+                       "Duração (s)": resultado["duracao_s"], **resultado["metricas"]})
+    resumo = pd.DataFrame(linhas)
+    resumo.to_csv(os.path.join(saida, ARQUIVO_RESUMO), index=False)
+    return resumo
+
+
+def _relatar(video, obter_resultado, falhas):
+    """Mostra o resultado de um vídeo ou registra a falha em falhas."""
+    try:
+        resultado = obter_resultado()
+        print(f"[ok] {video} — risco postural {resultado['metricas']['Risco Postural']}")
+    except Exception as e:
+        falhas[video] = str(e)
+        print(f"[erro] {video}: {e}", file=sys.stderr)
+
+
+def analisar_lote(videos, saida, processos=None, forcar=False, reanalisar=False, quadros=None, historico=None,
+                  trechos=None, **parametros):
+    """
+    Processa os vídeos em paralelo (um processo por vídeo, até processos ao mesmo tempo)
+    e retorna (resumo, falhas), onde falhas é {vídeo: mensagem de erro}. Com reanalisar,
+    os datasets de pose já gravados são reaproveitados e só a análise é refeita. historico
+    é repassado a processar_video. Com trechos > 1 e menos vídeos pendentes que
+    processos, os vídeos são processados um de cada vez, cada um dividido em trechos
+    paralelos.
+    """
+    parametros = dict(parametros, save_annotated_video=False)
+    processos = max(int(processos or os.cpu_count() or 1), 1)
+    pendentes = []
+    for video in videos:
+        pasta = pasta_do_video(saida, video)
+        pose = ler_metadados(video).get("parametros") if e_dataset(video) else parametros
+        if not (forcar or reanalisar) and ja_processado(pasta, parametros_analise(pose)):
+            print(f"[pulado] {video}")
+            continue
+        pendentes.append((video, pasta))
+
+    falhas = {}
+    if pendentes and trechos and trechos > 1 and len(pendentes) < processos:
+        for video, pasta in pendentes:
+            _relatar(video, lambda: processar_video(video, pasta, parametros, None, reanalisar, quadros, historico,
+                                                    trechos, processos), falhas)
+    elif pendentes:
+        threads = max((os.cpu_count() or 1) // min(processos, len(pendentes)), 1)
+        contexto = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(processos, len(pendentes)), mp_context=contexto) as executor:
+            futuros = {executor.submit(processar_video, video, pasta, parametros, threads, reanalisar, quadros,
+                                       historico): video
+                       for video, pasta in pendentes}
+            for futuro in as_completed(futuros):
+                _relatar(futuros[futuro], futuro.result, falhas)
+
+    os.makedirs(saida, exist_ok=True)
+    return gerar_resumo(saida), falhas
+
+
+def _roi(texto):
+    """Converte o argumento --roi em ROI_AUTOMATICA ou em uma tupla (x1, y1, x2, y2)."""
+    if texto == ROI_AUTOMATICA:
+        return texto
+    try:
+        valores = [float(v) for v in texto.split(",")]
+    except ValueError:
+        valores = []
+    if len(valores) != 4:
+        raise argparse.ArgumentTypeError("use 'auto' ou x1,y1,x2,y2")
+    return valores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m analise_lote",
+                                     description="Análise ergonômica em lote de vídeos, sem interface.")
+    parser.add_argument("videos", nargs="+", help="arquivos de vídeo ou padrões glob (ex.: 'gravacoes/**/*.mp4')")
+    parser.add_argument("-o", "--saida", default="resultados_lote", help="pasta de resultados (padrão: %(default)s)")
+    parser.add_argument("-j", "--processos", type=int, default=None,
+                        help="vídeos processados ao mesmo tempo (padrão: número de CPUs)")
+    parser.add_argument("--trechos", type=int, default=None, metavar="N",
+                        help="divide cada vídeo em N trechos paralelos quando há menos vídeos que --processos")
+    parser.add_argument("--frame-skip", type=int, default=1, help="processar 1 a cada N quadros (padrão: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=8, help="quadros por lote de inferência (padrão: %(default)s)")
+    parser.add_argument("--tamanho", choices=MODEL_SIZES, default="n", help="tamanho do YOLO11 Pose (padrão: %(default)s)")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="pytorch",
+                        help="backend de inferência; onnx/openvino exigem o modelo exportado (padrão: %(default)s)")
+    parser.add_argument("--modelo", default=None, help="caminho dos pesos; substitui --tamanho e --backend")
+    parser.add_argument("--imgsz", type=int, default=None, help="resolução de entrada do modelo (padrão: a do modelo)")
+    parser.add_argument("--amostragem-adaptativa", type=float, default=None, metavar="LIMIAR",
+                        help="limiar de movimento da amostragem adaptativa (ex.: 0.015); desligada por padrão")
+    parser.add_argument("--roi", type=_roi, default=None,
+                        help="região de interesse: 'auto' ou x1,y1,x2,y2 em pixels ou frações do quadro")
+    parser.add_argument("--sem-suavizacao", action="store_true",
+                        help="usa os keypoints brutos, sem interpolar lacunas nem suavizar")
+    parser.add_argument("--regras", default=None, metavar="ARQUIVO", help="arquivo JSON de regras ergonômicas")
+    parser.add_argument("--quadros", choices=FORMATOS, default=None,
+                        help="grava também a tabela de desvios por quadro nesse formato (parquet requer pyarrow)")
+    parser.add_argument("--log-desempenho", default=None, metavar="ARQUIVO",
+                        help="acrescenta os tempos de cada etapa de cada vídeo a um arquivo JSON Lines")
+    parser.add_argument("--historico", default=None, metavar="ARQUIVO",
+                        help="registra métricas e eventos de cada vídeo neste histórico SQLite")
+    parser.add_argument("--posto", default=None, help="posto de trabalho gravado no histórico")
+    parser.add_argument("--operador-nome", default=None, help="operador gravado no histórico")
+    parser.add_argument("--data", default=None, metavar="AAAA-MM-DD",
+                        help="data da gravação no histórico (padrão: data de modificação de cada vídeo)")
+    parser.add_argument("--forcar", action="store_true", help="reprocessa vídeos que já têm resultado")
+    parser.add_argument("--reanalisar", action="store_true",
+                        help="refaz só a análise a partir dos datasets de pose já gravados em --saida")
+    args = parser.parse_args(argv)
+
+    videos = listar_videos(args.videos)
+    if not videos:
+        parser.error("nenhum vídeo encontrado")
+    if args.log_desempenho:
+        os.environ[VARIAVEL_LOG] = os.path.abspath(args.log_desempenho)
+    if args.regras:
+        # Pela variável de ambiente as regras chegam também aos processos do lote
+        os.environ[VARIAVEL_REGRAS] = os.path.abspath(args.regras)
+    try:
+        obter_regras()
+    except (OSError, ValueError) as e:
+        parser.error(f"arquivo de regras inválido: {e}")
+    historico = None
+    if args.historico:
+        historico = {"caminho": os.path.abspath(args.historico), "posto": args.posto,
+                     "operador": args.operador_nome, "data": args.data}
+
+    resumo, falhas = analisar_lote(videos, args.saida, processos=args.processos, forcar=args.forcar,
+                                   reanalisar=args.reanalisar, quadros=args.quadros, historico=historico,
+                                   trechos=args.trechos,
+                                   model_path=args.modelo or model_path_for(args.tamanho, args.backend),
+                                   imgsz=args.imgsz, frame_skip=args.frame_skip,
+                                   batch_size=args.batch_size, motion_threshold=args.amostragem_adaptativa,
+                                   roi=args.roi, preprocess=not args.sem_suavizacao)
+    print(f"{len(resumo)} vídeo(s) no resumo: {os.path.join(args.saida, ARQUIVO_RESUMO)}")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,346 @@
+"""
+Benchmark do pipeline vídeo -> pose -> relatório, sem rede e sem GPU.
+
+Uso:
+    python -m benchmark --duracao 600 --pessoas 2 --saida bench.json
+    python -m benchmark --duracao 600 --pessoas 2 --comparar bench.json
+
+Gera um vídeo sintético e um dataset de pose sintético (operadores com ciclos de braço,
+inclinações do tronco e pausas) e mede cada etapa separadamente: decodificação,
+inferência (modelo sintético no lugar do YOLO, com latência configurável),
+resumo_desvios, analisar_metricas_ergonomicas, ciclos, gráficos e
+exportação CSV. Para cada etapa são informados o tempo (melhor de --repeticoes), os
+quadros de vídeo processados (ou cobertos pelo dataset) por segundo e o pico de memória alocada (medido em uma execução extra com
+tracemalloc, para não distorcer os tempos). O resultado em JSON pode ser comparado
+entre commits com --comparar.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from analise_ergonomica import analisar_metricas_ergonomicas
+from ciclos import analisar_ciclos
+from desvios import contar_quadros_em_desvio, detectar_eventos, resumo_desvios
+from exportacao import exportar_desvios
+from instrumentacao import pico_rss_mb
+from pose_store import PoseStore
+from yolo_pose_analysis import run_pose_estimation
+
+VERSAO_RESULTADO = 1
+
+# Etapas na ordem de execução
+ETAPAS = ("decodificacao", "inferencia", "desvios", "metricas", "ciclos", "graficos", "csv")
+
+# Esqueleto em pé (x, y) relativo ao centro do quadril, em pixels; braços são calculados à parte
+_CORPO = np.array([
+    (0, -170), (-5, -175), (5, -175), (-10, -170), (10, -170),  # rosto
+    (-25, -140), (25, -140),  # ombros
+    (0, 0), (0, 0), (0, 0), (0, 0),  # cotovelos e punhos
+    (-15, 0), (15, 0), (-15, 80), (15, 80), (-15, 160), (15, 160),  # quadris, joelhos, tornozelos
+], dtype=np.float64)
+_TRONCO = np.arange(11)  # keypoints que acompanham a inclinação do tronco
+
+PERIODO_CICLO_S = 4.0
+
+
+def esqueletos(tempos, pessoas, largura=640, altura=480):
+    """
+    Keypoints sintéticos (quadros, pessoas, 17, 3) nos instantes pedidos. Cada operador
+    repete um ciclo de braço de PERIODO_CICLO_S, inclina o tronco 15 s a cada 90 s e
+    pausa (braços parados) 30 s a cada 5 min; os operadores ficam lado a lado.
+    """
+    tempos = np.asarray(tempos, dtype=np.float64)[:, None] + np.arange(pessoas) * 7.0
+    fase = 2 * np.pi * tempos / PERIODO_CICLO_S
+    pausa = (tempos % 300) >= 270
+    fase = np.where(pausa, 0.0, fase)
+
+    pontos = np.broadcast_to(_CORPO, tempos.shape + _CORPO.shape).copy()
+    elevacao = 0.6 + 0.5 * np.sin(fase)  # ângulo do braço com a vertical
+    flexao = 1.0 + 0.6 * np.sin(fase + 1.0)  # flexão do cotovelo
+    for lado, (ombro, cotovelo, punho) in enumerate(((5, 7, 9), (6, 8, 10))):
+        sinal = -1 if lado == 0 else 1
+        pontos[..., cotovelo, 0] = pontos[..., ombro, 0] + sinal * 60 * np.sin(elevacao)
+        pontos[..., cotovelo, 1] = pontos[..., ombro, 1] + 60 * np.cos(elevacao)
+        pontos[..., punho, 0] = pontos[..., cotovelo, 0] + sinal * 55 * np.sin(elevacao + flexao)
+        pontos[..., punho, 1] = pontos[..., cotovelo, 1] + 55 * np.cos(elevacao + flexao)
+
+    # Inclinação do tronco: gira a parte superior em torno do quadril
+    inclinacao = np.where((tempos % 90) >= 75, np.radians(60), 0.0)[..., None]
+    x, y = pontos[..., _TRONCO, 0].copy(), pontos[..., _TRONCO, 1].copy()
+    pontos[..., _TRONCO, 0] = x * np.cos(inclinacao) - y * np.sin(inclinacao)
+    pontos[..., _TRONCO, 1] = x * np.sin(inclinacao) + y * np.cos(inclinacao)
+
+    escala = altura / 600.0
+    centros = np.stack([(np.arange(pessoas) + 0.5) * largura / pessoas, np.full(pessoas, altura * 0.55)], axis=-1)
+    keypoints = np.empty(pontos.shape[:-1] + (3,), dtype=np.float32)
+    keypoints[..., :2] = pontos * escala + centros[:, None, :]
+    keypoints[..., 2] = 0.9
+    return keypoints
+
+
+def pose_sintetica(duracao_s, fps=30.0, pessoas=1, frame_skip=2, largura=640, altura=480):
+    """PoseStore sintético com duracao_s segundos amostrados a cada frame_skip quadros."""
+    frames = np.arange(0, int(round(duracao_s * fps)), frame_skip)
+    keypoints = esqueletos(frames / fps, pessoas, largura, altura)
+    track_ids = np.broadcast_to(np.arange(1, pessoas + 1), (len(frames), pessoas)).copy()
+    return PoseStore.from_arrays(keypoints, track_ids, frames, fps=fps, frame_skip=frame_skip,
+                                 metadata={"sintetico": True})
+
+
+def video_sintetico(caminho, duracao_s, fps=30.0, pessoas=1, largura=640, altura=480):
+    """Grava um vídeo com os esqueletos sintéticos desenhados e retorna o número de quadros."""
+    n = int(round(duracao_s * fps))
+    out = cv2.VideoWriter(caminho, cv2.VideoWriter_fourcc(*"mp4v"), fps, (largura, altura))
+    try:
+        for inicio in range(0, n, 256):
+            bloco = esqueletos(np.arange(inicio, min(inicio + 256, n)) / fps, pessoas, largura, altura)
+            for pessoas_quadro in bloco:
+                quadro = np.full((altura, largura, 3), 40, dtype=np.uint8)
+                for x, y in pessoas_quadro[..., :2].reshape(-1, 2).astype(int):
+                    cv2.circle(quadro, (int(x), int(y)), 4, (255, 255, 255), -1)
+                out.write(quadro)
+    finally:
+        out.release()
+    return n
+
+
+class _Tensor:
+    def __init__(self, dados):
+        self.dados = dados
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.dados
+
+
+class _Keypoints:
+    def __init__(self, dados):
+        self.data = _Tensor(dados)
+
+
+class _Resultado:
+    def __init__(self, dados):
+        self.keypoints = _Keypoints(dados)
+
+
+class ModeloSintetico:
+    """
+    Substituto do PoseModel: a cada quadro recebido devolve os esqueletos sintéticos do
+    instante seguinte (os quadros chegam em ordem, a cada dt segundos). latencia_s simula
+    o custo de inferência de um quadro.
+    """
+
+    def __init__(self, dt, pessoas=1, largura=640, altura=480, latencia_s=0.0):
+        self.dt = dt
+        self.pessoas = pessoas
+        self.largura = largura
+        self.altura = altura
+        self.latencia_s = latencia_s
+        self.quadros = 0
+
+    def __call__(self, frames):
+        tempos = (self.quadros + np.arange(len(frames))) * self.dt
+        self.quadros += len(frames)
+        if self.latencia_s:
+            time.sleep(self.latencia_s * len(frames))
+        return [_Resultado(pessoas) for pessoas in esqueletos(tempos, self.pessoas, self.largura, self.altura)]
+
+    def warmup(self):
+        pass
+
+
+def _copia(pose_data):
+    """Cópia do PoseStore sem os resultados memorizados (cada medição parte do zero)."""
+    return PoseStore.from_arrays(pose_data.keypoints, pose_data.track_ids, pose_data.frames, pose_data.inferred,
+                                 fps=pose_data.fps, frame_skip=pose_data.frame_skip, metadata=pose_data.metadata)
+
+
+def medir(executar, quadros, repeticoes=3, preparar=None):
+    """
+    Mede executar(*preparar()) repeticoes vezes (preparar fica fora do cronômetro) e mais
+    uma com tracemalloc para o pico de memória. Retorna o dicionário da etapa.
+    """
+    preparar = preparar or tuple
+    tempos = []
+    for _ in range(max(repeticoes, 1)):
+        argumentos = preparar()
+        gc.collect()
+        inicio = time.perf_counter()
+        executar(*argumentos)
+        tempos.append(time.perf_counter() - inicio)
+
+    argumentos = preparar()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        executar(*argumentos)
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    segundos = min(tempos)
+    return {
+        "segundos": round(segundos, 6),
+        "segundos_medio": round(sum(tempos) / len(tempos), 6),
+        "quadros": int(quadros),
+        "quadros_por_s": round(quadros / segundos, 1) if segundos > 0 else None,
+        "pico_memoria_mb": round(pico / 2 ** 20, 2),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def executar_benchmark(duracao=60.0, duracao_video=10.0, fps=30.0, pessoas=1, frame_skip=2, batch_size=8,
+                       largura=640, altura=480, latencia_ms=0.0, repeticoes=3, etapas=ETAPAS, progresso=None):
+    """Executa as etapas pedidas e retorna o resultado (dicionário serializável em JSON)."""
+    parametros = dict(duracao=duracao, duracao_video=duracao_video, fps=fps, pessoas=pessoas, frame_skip=frame_skip,
+                      batch_size=batch_size, largura=largura, altura=altura, latencia_ms=latencia_ms,
+                      repeticoes=repeticoes)
+    resultados = {}
+
+    def registrar(nome, resultado):
+        resultados[nome] = resultado
+        if progresso:
+            progresso(nome, resultado)
+
+    with tempfile.TemporaryDirectory(prefix="ergoview-bench-") as pasta:
+        if {"decodificacao", "inferencia"} & set(etapas) and duracao_video > 0:
+            video = os.path.join(pasta, "sintetico.mp4")
+            n_video = video_sintetico(video, duracao_video, fps, pessoas, largura, altura)
+
+            def decodificar():
+                cap = cv2.VideoCapture(video)
+                while cap.read()[0]:
+                    pass
+                cap.release()
+
+            def inferir(modelo):
+                run_pose_estimation(video, frame_skip=frame_skip, batch_size=batch_size, model=modelo)
+
+            if "decodificacao" in etapas:
+                registrar("decodificacao", medir(decodificar, n_video, repeticoes))
+            if "inferencia" in etapas:
+                registrar("inferencia", medir(
+                    inferir, n_video, repeticoes,
+                    lambda: (ModeloSintetico(frame_skip / fps, pessoas, largura, altura, latencia_ms / 1000.0),)))
+
+        pose_data = pose_sintetica(duracao, fps, pessoas, frame_skip, largura, altura)
+        n_pose = pose_data.n_frames * frame_skip
+        resumo = resumo_desvios(pose_data)
+
+        if "desvios" in etapas:
+            registrar("desvios", medir(resumo_desvios, n_pose, repeticoes, lambda: (_copia(pose_data),)))
+        if "metricas" in etapas:
+            registrar("metricas", medir(analisar_metricas_ergonomicas, n_pose, repeticoes,
+                                        lambda: (resumo.copy(),)))
+        if "ciclos" in etapas:
+            registrar("ciclos", medir(analisar_ciclos, n_pose, repeticoes, lambda: (_copia(pose_data),)))
+        if "graficos" in etapas:
+            try:
+                from graficos import figura_desvios_dataset, figuras_angulos
+            except ImportError as e:
+                registrar("graficos", {"indisponivel": str(e)})
+            else:
+                registrar("graficos", medir(lambda dados: (figuras_angulos(dados), figura_desvios_dataset(dados)),
+                                            n_pose, repeticoes, lambda: (_copia(pose_data),)))
+        if "csv" in etapas:
+            def exportar(dados):
+                exportar_desvios(dados, pasta, quadros="csv")
+
+            def preparar_csv():
+                # As sequências de desvio são calculadas antes: a etapa mede só a exportação
+                dados = _copia(pose_data)
+                detectar_eventos(dados)
+                return (dados,)
+
+            registrar("csv", medir(exportar, n_pose, repeticoes, preparar_csv))
+
+    return {
+        "versao": VERSAO_RESULTADO,
+        "commit": _commit(),
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "parametros": parametros,
+        "amostras_pose": pose_data.n_frames,
+        "linhas_desvios": contar_quadros_em_desvio(pose_data),
+        "etapas": resultados,
+        "pico_rss_mb": pico_rss_mb(),
+    }
+
+
+def comparar(atual, base):
+    """Linhas de texto com a variação de tempo de cada etapa em relação a um resultado anterior."""
+    linhas = [f"Comparação com {base.get('commit') or 'base'} ({base.get('data', '?')}):"]
+    if base.get("parametros") != atual["parametros"]:
+        linhas.append("  atenção: parâmetros diferentes")
+    for nome, etapa in atual["etapas"].items():
+        anterior = base.get("etapas", {}).get(nome, {})
+        if "segundos" not in etapa or not anterior.get("segundos"):
+            continue
+        variacao = (etapa["segundos"] / anterior["segundos"] - 1) * 100
+        linhas.append(f"  {nome:<14} {anterior['segundos']:>10.4f}s -> {etapa['segundos']:>10.4f}s ({variacao:+.1f}%)")
+    return linhas
+
+
+def _linha(nome, etapa):
+    if "indisponivel" in etapa:
+        return f"{nome:<14} indisponível: {etapa['indisponivel']}"
+    return (f"{nome:<14} {etapa['segundos']:>10.4f}s {etapa['quadros_por_s'] or 0:>12.1f} quadros/s "
+            f"{etapa['pico_memoria_mb']:>9.2f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--duracao", type=float, default=60.0, help="duração do dataset de pose sintético (s)")
+    parser.add_argument("--duracao-video", type=float, default=10.0,
+                        help="duração do vídeo sintético para decodificação e inferência (s; 0 pula o vídeo)")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--pessoas", type=int, default=1)
+    parser.add_argument("--frame-skip", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--largura", type=int, default=640)
+    parser.add_argument("--altura", type=int, default=480)
+    parser.add_argument("--latencia-ms", type=float, default=0.0,
+                        help="latência simulada do modelo por quadro (ms); 0 mede só o pipeline")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--etapas", nargs="+", choices=ETAPAS, default=list(ETAPAS))
+    parser.add_argument("-o", "--saida", default=None, help="grava o resultado em JSON neste arquivo")
+    parser.add_argument("--comparar", default=None, metavar="JSON", help="resultado anterior para comparação")
+    args = parser.parse_args(argv)
+
+    resultado = executar_benchmark(args.duracao, args.duracao_video, args.fps, args.pessoas, args.frame_skip,
+                                   args.batch_size, args.largura, args.altura, args.latencia_ms, args.repeticoes,
+                                   args.etapas, progresso=lambda nome, etapa: print(_linha(nome, etapa), flush=True))
+    print(f"{'pico RSS':<14} {resultado['pico_rss_mb']} MB")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            print("\n".join(comparar(resultado, json.load(f))))
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
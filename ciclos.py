@@ -0,0 +1,244 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from desvios import run_lengths
+from instrumentacao import medido
+from joint_angles import MIN_CONFIDENCE, COTOVELO_DIR, COTOVELO_ESQ, OMBRO_DIR, OMBRO_ESQ, PUNHO_DIR, PUNHO_ESQ, \
+    QUADRIL_DIR, QUADRIL_ESQ, calcular_angulos
+from pose_store import PoseStore, as_keypoint_array, memorizado, timing
+
+# Janelas deslizantes da análise de ciclos (segundos)
+JANELA_S = 60.0
+PASSO_S = 30.0
+
+# Faixa de períodos procurada. Ciclos de até 30 s caracterizam trabalho altamente
+# repetitivo (critério de Silverstein)
+PERIODO_MINIMO_S = 0.5
+PERIODO_MAXIMO_S = 30.0
+
+# Autocorrelação mínima no período do ciclo para a janela ser considerada periódica
+CORRELACAO_MINIMA = 0.5
+
+# Fração mínima de amostras válidas de um sinal na janela para ele ser usado
+VALIDOS_MINIMOS = 0.8
+
+# Velocidade média dos punhos (comprimentos de tronco por segundo) abaixo da qual há repouso
+LIMIAR_REPOUSO = 0.15
+SUAVIZACAO_S = 1.0
+
+# Duração mínima de um repouso para contar como pausa
+PAUSA_MINIMA_S = 10.0
+
+# Janelas processadas por vez na FFT (limita a memória em gravações longas)
+JANELAS_POR_BLOCO = 32
+
+COLUNAS_JANELAS = ["Início (s)", "Fim (s)", "Ciclos/min", "Correlação", "Repetitiva"]
+COLUNAS_PAUSAS = ["Início (s)", "Fim (s)", "Duração (s)"]
+
+# Só estes keypoints são usados; os triplos abaixo indexam esta seleção
+_PONTOS = (OMBRO_ESQ, COTOVELO_ESQ, PUNHO_ESQ, OMBRO_DIR, COTOVELO_DIR, PUNHO_DIR, QUADRIL_ESQ, QUADRIL_DIR)
+_TRIPLETS = {"cotovelo_esq": (0, 1, 2), "cotovelo_dir": (3, 4, 5)}
+_OMBROS, _PUNHOS, _QUADRIS = [0, 3], [2, 5], [6, 7]
+
+
+def _soma_acumulada(valores, axis=-1):
+    """Soma acumulada com um zero à esquerda: soma de [i, j) = s[j] - s[i]."""
+    acumulada = np.cumsum(valores, axis=axis, dtype=np.float64)
+    forma = list(acumulada.shape)
+    forma[axis] = 1
+    return np.concatenate([np.zeros(forma), acumulada], axis=axis)
+
+
+def _media(valores, axis):
+    """Média que ignora NaN, sem aviso para fatias vazias (resultado NaN)."""
+    validos = np.isfinite(valores)
+    n = validos.sum(axis=axis)
+    soma = np.where(validos, valores, 0.0).sum(axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, soma / n, np.nan)
+
+
+def media_movel(valores, largura):
+    """Média móvel centrada que ignora NaN (NaN onde a janela não tem valores)."""
+    validos = np.isfinite(valores)
+    soma = _soma_acumulada(np.where(validos, valores, 0.0))
+    contagem = _soma_acumulada(validos)
+    inicio = np.clip(np.arange(len(valores)) - largura // 2, 0, len(valores))
+    fim = np.minimum(inicio + largura, len(valores))
+    n = contagem[fim] - contagem[inicio]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, (soma[fim] - soma[inicio]) / n, np.nan)
+
+
+def _interpolar(sinal):
+    """Preenche NaN por interpolação linear (nas extremidades repete o valor mais próximo)."""
+    validos = np.isfinite(sinal)
+    if validos.all() or not validos.any():
+        return np.where(validos, sinal, 0.0)
+    indices = np.arange(len(sinal))
+    return np.interp(indices, indices[validos], sinal[validos])
+
+
+def sinais_movimento(keypoints, dt):
+    """
+    Sinais dos membros superiores de um operador (quadros, 17, 3) amostrado a cada dt s.
+    Retorna (sinais (canais, quadros), atividade (quadros,)): os canais são os ângulos dos
+    cotovelos e as posições dos punhos em relação aos ombros; a atividade é a velocidade
+    média dos punhos, com as posições suavizadas em SUAVIZACAO_S para que o ruído dos
+    keypoints não pareça movimento. Distâncias são medidas em comprimentos de tronco
+    (mediana do vídeo), o que as torna independentes da distância à câmera.
+    """
+    keypoints = np.asarray(keypoints[:, list(_PONTOS)], dtype=np.float64)
+    angulos = calcular_angulos(keypoints, triplets=_TRIPLETS)
+    xy = keypoints[..., :2]
+    xy[~(keypoints[..., 2] >= MIN_CONFIDENCE)] = np.nan
+
+    ombros = xy[:, _OMBROS].mean(axis=1)
+    tronco = np.linalg.norm(ombros - xy[:, _QUADRIS].mean(axis=1), axis=-1)
+    escala = np.median(tronco[np.isfinite(tronco)]) if np.isfinite(tronco).any() else 1.0
+    escala = escala if escala > 0 else 1.0
+
+    punhos = xy[:, _PUNHOS] / escala
+    relativos = punhos - ombros[:, None] / escala
+    sinais = np.vstack([angulos["cotovelo_esq"] / 180.0, angulos["cotovelo_dir"] / 180.0,
+                        relativos.reshape(len(xy), 4).T])
+
+    largura = max(int(round(SUAVIZACAO_S / dt)), 1)
+    suavizados = np.stack([media_movel(punhos[:, i, j], largura) for i in range(2) for j in range(2)], axis=-1)
+    velocidade = np.full((len(xy), 2), np.nan)
+    velocidade[1:] = np.linalg.norm(np.diff(suavizados.reshape(-1, 2, 2), axis=0), axis=-1) / dt
+    velocidade[~np.isfinite(punhos).all(axis=-1)] = np.nan
+    return sinais, _media(velocidade, axis=1)
+
+
+def _autocorrelacao(janelas):
+    """
+    Autocorrelação normalizada (r[0] = 1) de cada janela (..., largura) pela FFT, sem
+    viés de tamanho (cada defasagem k dividida por largura - k). Janelas constantes viram NaN.
+    """
+    largura = janelas.shape[-1]
+    centradas = janelas - janelas.mean(axis=-1, keepdims=True)
+    espectro = np.fft.rfft(centradas, n=2 * largura, axis=-1)
+    auto = np.fft.irfft(espectro.real ** 2 + espectro.imag ** 2, axis=-1)[..., :largura]
+    auto /= largura - np.arange(largura)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return auto / np.where(auto[..., :1] > 1e-12, auto[..., :1], np.nan)
+
+
+def periodicidade(sinais, validos, dt):
+    """
+    Analisa os sinais (canais, quadros) em janelas deslizantes de JANELA_S com passo
+    PASSO_S. Em cada janela, o período é o primeiro pico da autocorrelação média dos
+    canais válidos, depois do primeiro cruzamento por zero, entre PERIODO_MINIMO_S e
+    PERIODO_MAXIMO_S e com correlação de pelo menos CORRELACAO_MINIMA (sem esse pico,
+    a maior correlação da faixa). Múltiplos do período não são confundidos com ele.
+    Retorna (inícios das janelas, largura, período em amostras, correlação no período).
+    O custo é linear na duração (cada janela custa O(largura log largura)).
+    """
+    n = sinais.shape[1]
+    largura = min(int(round(JANELA_S / dt)), n)
+    defasagem_minima = max(int(np.ceil(PERIODO_MINIMO_S / dt)), 1)
+    defasagem_maxima = min(int(PERIODO_MAXIMO_S / dt), largura // 2)
+    if defasagem_maxima <= defasagem_minima:
+        return np.zeros(0, dtype=np.int64), largura, np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    passo = max(int(round(PASSO_S / dt)), 1)
+    inicios = np.arange(0, n - largura + 1, passo)
+    if inicios[-1] != n - largura:
+        inicios = np.append(inicios, n - largura)
+
+    acumulados = _soma_acumulada(validos, axis=1)
+    usar = (acumulados[:, inicios + largura] - acumulados[:, inicios]) / largura >= VALIDOS_MINIMOS
+    preenchidos = np.vstack([_interpolar(sinal) for sinal in sinais])
+    vistas = sliding_window_view(preenchidos, largura, axis=1)
+
+    defasagens = np.arange(largura)
+    faixa = (defasagens >= defasagem_minima) & (defasagens <= defasagem_maxima)
+    periodos = np.zeros(len(inicios), dtype=np.int64)
+    correlacoes = np.full(len(inicios), -np.inf)
+    for bloco in range(0, len(inicios), JANELAS_POR_BLOCO):
+        fatia = slice(bloco, bloco + JANELAS_POR_BLOCO)
+        auto = _autocorrelacao(vistas[:, inicios[fatia]])
+        canais = usar[:, fatia] & np.isfinite(auto[..., 0])
+        media = np.where(canais[..., None], np.nan_to_num(auto), 0.0).sum(axis=0) / \
+            np.maximum(canais.sum(axis=0), 1)[:, None]
+
+        negativos = media < 0
+        cruzamento = np.where(negativos.any(axis=-1), negativos.argmax(axis=-1), largura)
+        candidatas = faixa & (defasagens >= cruzamento[:, None])
+        picos = np.zeros_like(candidatas)
+        picos[:, 1:-1] = (media[:, 1:-1] >= media[:, :-2]) & (media[:, 1:-1] > media[:, 2:])
+        picos &= candidatas & (media >= CORRELACAO_MINIMA)
+        periodo = np.where(picos.any(axis=-1), picos.argmax(axis=-1),
+                           np.where(candidatas, media, -np.inf).argmax(axis=-1))
+        correlacao = media[np.arange(len(media)), periodo]
+        periodos[fatia] = periodo
+        correlacoes[fatia] = np.where(canais.any(axis=0) & candidatas.any(axis=-1), correlacao, -np.inf)
+    return inicios, largura, periodos, correlacoes
+
+
+@medido("ciclos")
+def analisar_ciclos_keypoints(keypoints, dt, tempos=None):
+    """
+    Ciclos de trabalho e pausas de um operador (quadros, 17, 3) amostrado a cada dt s.
+    Retorna um dicionário com:
+      janelas: DataFrame por janela (início, fim, ciclos/min, correlação, repetitiva);
+      pausas: DataFrame dos repousos de pelo menos PAUSA_MINIMA_S (quadros sem o
+              operador também contam como repouso);
+      episodios_repetitivos: trechos de janelas repetitivas consecutivas;
+      ciclos_por_minuto: mediana das janelas repetitivas (0 sem repetição);
+      tempo_em_pausa_s: soma das pausas.
+    """
+    n = len(keypoints)
+    if n == 0:
+        return {"janelas": pd.DataFrame(columns=COLUNAS_JANELAS), "pausas": pd.DataFrame(columns=COLUNAS_PAUSAS),
+                "episodios_repetitivos": 0, "ciclos_por_minuto": 0.0, "tempo_em_pausa_s": 0.0}
+    tempos = np.arange(n) * dt if tempos is None else np.asarray(tempos, dtype=np.float64)
+    sinais, atividade = sinais_movimento(keypoints, dt)
+
+    suavizada = media_movel(atividade, max(int(round(SUAVIZACAO_S / dt)), 1))
+    repouso = ~(suavizada >= LIMIAR_REPOUSO)
+    inicios, fins = run_lengths(repouso)
+    pausas = (fins - inicios) * dt >= PAUSA_MINIMA_S
+    inicios, fins = inicios[pausas], fins[pausas]
+    df_pausas = pd.DataFrame({
+        "Início (s)": np.round(tempos[inicios], 2),
+        "Fim (s)": np.round(tempos[fins - 1], 2),
+        "Duração (s)": np.round((fins - inicios) * dt, 2),
+    }, columns=COLUNAS_PAUSAS)
+
+    janelas, largura, periodos, correlacoes = periodicidade(sinais, np.isfinite(sinais), dt)
+    ativos = _soma_acumulada(~repouso)
+    em_atividade = (ativos[janelas + largura] - ativos[janelas]) / max(largura, 1) >= 0.5
+    repetitivas = (correlacoes >= CORRELACAO_MINIMA) & em_atividade
+    with np.errstate(divide="ignore"):
+        ciclos = np.where(periodos > 0, 60.0 / (periodos * dt), 0.0)
+    df_janelas = pd.DataFrame({
+        "Início (s)": np.round(tempos[janelas], 2),
+        "Fim (s)": np.round(tempos[janelas + largura - 1], 2) if len(janelas) else [],
+        "Ciclos/min": np.round(np.where(repetitivas, ciclos, np.nan), 2),
+        "Correlação": np.round(np.maximum(correlacoes, -1.0), 3),
+        "Repetitiva": repetitivas,
+    }, columns=COLUNAS_JANELAS)
+
+    return {
+        "janelas": df_janelas,
+        "pausas": df_pausas,
+        "episodios_repetitivos": len(run_lengths(repetitivas)[0]),
+        "ciclos_por_minuto": round(float(np.median(ciclos[repetitivas])), 2) if repetitivas.any() else 0.0,
+        "tempo_em_pausa_s": round(float((fins - inicios).sum() * dt), 2),
+    }
+
+
+def analisar_ciclos(pose_data, operador=None):
+    """
+    Ciclos de trabalho e pausas do operador (padrão: o principal); veja
+    analisar_ciclos_keypoints. O resultado é calculado uma vez por dataset e operador.
+    """
+    def calcular():
+        fps, frame_skip = timing(pose_data)
+        tempos = pose_data.timestamps if isinstance(pose_data, PoseStore) else None
+        return analisar_ciclos_keypoints(as_keypoint_array(pose_data, operador), frame_skip / fps, tempos)
+
+    return memorizado(pose_data, ("ciclos", operador), calcular)
@@ -0,0 +1,321 @@
+import numpy as np
+import pandas as pd
+
+from instrumentacao import etapa
+from pose_store import PoseStore, as_track_arrays, memorizado, timing
+from regras import EVENTO, obter_regras
+
+# Valor de operador que seleciona todas as trilhas
+TODOS = "todos"
+
+COLUNAS_EVENTOS = ["Operador", "Desvio", "Frame inicial", "Frame final", "Início (s)", "Fim (s)", "Duração (s)",
+                   "Ângulo mín", "Ângulo máx", "Ângulo médio"]
+COLUNAS_QUADROS = ["Frame", "Tempo (s)", "Desvio", "Ângulo", "Operador"]
+COLUNAS_RESUMO = ["Desvio", "Eventos", "Quadros", "Ângulo médio", "Desvio padrão", "Extremos"]
+COLUNAS_MINUTOS = ["Operador", "Minuto", "Desvio", "Eventos", "Tempo em desvio (s)", "Ângulo mín", "Ângulo máx",
+                   "Ângulo médio"]
+
+# Linhas por bloco ao percorrer a tabela por quadro sem montá-la inteira
+LINHAS_POR_BLOCO = 100_000
+
+
+def run_lengths(mascara):
+    """Retorna (inícios, fins) das sequências de True em uma máscara booleana; o fim é exclusivo."""
+    bordas = np.diff(np.concatenate([[0], np.asarray(mascara, dtype=np.int8), [0]]))
+    return np.nonzero(bordas == 1)[0], np.nonzero(bordas == -1)[0]
+
+
+def _reduzir_sequencias(ufunc, valores, inicios, fins):
+    """Aplica ufunc.reduceat em cada intervalo [início, fim) sem loop em Python."""
+    limites = np.column_stack([inicios, fins]).ravel()
+    return ufunc.reduceat(np.append(valores, 0), limites)[::2]
+
+
+def run_lengths_por_trilha(mascara, linhas, trilhas):
+    """
+    Sequências de True em uma série de células ordenadas por (trilha, linha); a sequência
+    é interrompida quando a trilha muda ou a trilha falta em algum quadro.
+    Retorna (inícios, fins) com fim exclusivo.
+    """
+    continua = np.zeros_like(mascara)
+    continua[1:] = mascara[1:] & mascara[:-1] & (trilhas[1:] == trilhas[:-1]) & (linhas[1:] == linhas[:-1] + 1)
+    fim = mascara.copy()
+    fim[:-1] &= ~continua[1:]
+    return np.nonzero(mascara & ~continua)[0], np.nonzero(fim)[0] + 1
+
+
+def _analisar(pose_data, regras, persistencia_minima):
+    """
+    Calcula os ângulos de todos os operadores de uma vez e avalia todas as regras de
+    evento em uma única operação. Os ângulos são organizados por célula ocupada, em ordem
+    de (trilha, linha), e empilhados por regra: valores tem forma (regras, células). As
+    sequências persistentes são intervalos [início, fim) no array valores achatado.
+    """
+    keypoints, track_ids, frames = as_track_arrays(pose_data)
+    with etapa("angulos", len(frames)):
+        angulos = regras.angulos(keypoints)
+    with etapa("persistencia", len(frames)):
+        return _sequencias_persistentes(regras, angulos, track_ids, frames, persistencia_minima)
+
+
+def _sequencias_persistentes(regras, angulos, track_ids, frames, persistencia_minima):
+    linhas, vagas = np.nonzero(track_ids >= 0)
+    trilhas = track_ids[linhas, vagas]
+    ordem = np.lexsort((linhas, trilhas))
+    linhas, vagas, trilhas = linhas[ordem], vagas[ordem], trilhas[ordem]
+    valores = regras.valores({articulacao: angulos[articulacao][linhas, vagas] for articulacao in regras.articulacoes})
+    if not len(regras):
+        valores = np.empty((0, len(linhas)))
+
+    # Cada regra é um grupo separado de trilhas: as sequências não atravessam regras
+    n_regras, n_celulas = valores.shape
+    grupos = np.arange(n_regras)[:, None] * (int(trilhas.max(initial=0)) + 1) + trilhas
+    inicios, fins = run_lengths_por_trilha(regras.violacoes(valores).ravel(), np.tile(linhas, n_regras),
+                                           grupos.ravel())
+    persistentes = (fins - inicios) >= persistencia_minima[inicios // max(n_celulas, 1)]
+    return valores, frames[linhas], trilhas, inicios[persistentes], fins[persistentes]
+
+
+def _operador_padrao(pose_data, operador):
+    if operador is not None:
+        return operador
+    return pose_data.primary_operator() if isinstance(pose_data, PoseStore) else 0
+
+
+def _sequencias_do_operador(trilhas, inicios, fins, operador):
+    if operador != TODOS:
+        selecionadas = trilhas[inicios % len(trilhas)] == operador
+        inicios, fins = inicios[selecionadas], fins[selecionadas]
+    return inicios, fins
+
+
+def _analisar_com_cache(pose_data, regras, persistencia_minima):
+    return memorizado(pose_data, ("sequencias", regras, tuple(persistencia_minima)),
+                      lambda: _analisar(pose_data, regras, persistencia_minima))
+
+
+def _tempo(pose_data, fps):
+    """fps efetivo e salto de quadros do dataset; fps informado tem prioridade sobre o do dataset."""
+    fps_dataset, frame_skip = timing(pose_data)
+    return fps or fps_dataset, frame_skip
+
+
+def _sequencias(pose_data, fps, persistencia_minima_s, operador, regras):
+    """Regras de evento, fps, frame_skip e as sequências persistentes do operador."""
+    operador = _operador_padrao(pose_data, operador)
+    fps, frame_skip = _tempo(pose_data, fps)
+    regras = obter_regras(regras).aplicacao(EVENTO)
+    persistencia_minima = regras.amostras_minimas(fps, frame_skip, persistencia_minima_s)
+    valores, quadros_celula, trilhas, inicios, fins = _analisar_com_cache(pose_data, regras, persistencia_minima)
+    inicios, fins = _sequencias_do_operador(trilhas, inicios, fins, operador)
+    return regras, fps, frame_skip, valores, quadros_celula, trilhas, inicios, fins
+
+
+def detectar_eventos(pose_data, fps=None, persistencia_minima_s=None, operador=None, regras=None):
+    """
+    Detecta os desvios persistentes e retorna um DataFrame com um evento por linha
+    (início, fim, duração e ângulos mínimo/máximo/médio). O frame final é inclusivo.
+    Os desvios são as regras de evento de regras (padrão: o arquivo de regras do projeto);
+    a persistência mínima de cada regra é dada em segundos e convertida em amostras usando
+    o fps e o frame_skip do dataset. persistencia_minima_s substitui a de todas as regras.
+    operador escolhe a trilha analisada (padrão: o operador principal; TODOS para todas).
+    """
+    operador = _operador_padrao(pose_data, operador)
+    fps, frame_skip = _tempo(pose_data, fps)
+    regras = obter_regras(regras).aplicacao(EVENTO)
+    return memorizado(pose_data, ("eventos", regras, fps, persistencia_minima_s, operador),
+                      lambda: _tabela_eventos(pose_data, regras, fps, frame_skip, persistencia_minima_s,
+                                              operador)).copy()
+
+
+def _tabela_eventos(pose_data, regras, fps, frame_skip, persistencia_minima_s, operador):
+    persistencia_minima = regras.amostras_minimas(fps, frame_skip, persistencia_minima_s)
+    valores, quadros_celula, trilhas, inicios, fins = _analisar_com_cache(pose_data, regras, persistencia_minima)
+    inicios, fins = _sequencias_do_operador(trilhas, inicios, fins, operador)
+    if not len(inicios):
+        return pd.DataFrame(columns=COLUNAS_EVENTOS)
+
+    n_celulas = len(trilhas)
+    angulos = valores.ravel()
+    quadros = fins - inicios
+    primeiro, ultimo = quadros_celula[inicios % n_celulas], quadros_celula[(fins - 1) % n_celulas]
+    return pd.DataFrame({
+        "Operador": trilhas[inicios % n_celulas],
+        "Desvio": np.asarray(regras.nomes, dtype=object)[inicios // n_celulas],
+        "Frame inicial": primeiro,
+        "Frame final": ultimo,
+        "Início (s)": np.round(primeiro / fps, 2),
+        "Fim (s)": np.round(ultimo / fps, 2),
+        "Duração (s)": np.round(quadros * frame_skip / fps, 2),
+        "Ângulo mín": np.round(_reduzir_sequencias(np.minimum, angulos, inicios, fins), 2),
+        "Ângulo máx": np.round(_reduzir_sequencias(np.maximum, angulos, inicios, fins), 2),
+        "Ângulo médio": np.round(_reduzir_sequencias(np.add, angulos, inicios, fins) / quadros, 2),
+    })
+
+
+def detectar_desvios_com_persistencia(pose_data, fps=None, persistencia_minima_s=None, operador=None, regras=None):
+    """
+    Retorna a tabela por quadro (Frame, Tempo (s), Desvio, Ângulo, Operador) de todos os
+    quadros amostrados que fazem parte de um desvio persistente. A tabela é montada a cada
+    chamada e não fica guardada com o dataset: prefira detectar_eventos, resumo_desvios ou
+    desvios_em_blocos quando a granularidade por quadro não for necessária.
+    """
+    regras, fps, _, valores, quadros_celula, trilhas, inicios, fins = _sequencias(
+        pose_data, fps, persistencia_minima_s, operador, regras)
+    with etapa("tabela_quadros", len(quadros_celula)):
+        return _linhas_quadros(regras, fps, valores, quadros_celula, trilhas, inicios, fins)
+
+
+def _linhas_quadros(regras, fps, valores, quadros_celula, trilhas, inicios, fins, primeira=0, ultima=None):
+    """
+    Linhas [primeira, ultima) da tabela por quadro, sem montar as demais: a linha k é a
+    k-ésima posição das sequências [início, fim) concatenadas em ordem.
+    """
+    tamanhos = fins - inicios
+    acumulado = np.cumsum(tamanhos)
+    total = int(acumulado[-1]) if len(acumulado) else 0
+    ultima = total if ultima is None else min(ultima, total)
+    if primeira >= ultima:
+        return pd.DataFrame(columns=COLUNAS_QUADROS)
+
+    linhas = np.arange(primeira, ultima)
+    sequencia = np.searchsorted(acumulado, linhas, side="right")
+    posicoes = inicios[sequencia] + linhas - (acumulado[sequencia] - tamanhos[sequencia])
+    celulas = posicoes % len(trilhas)
+    return pd.DataFrame({
+        "Frame": quadros_celula[celulas],
+        "Tempo (s)": np.round(quadros_celula[celulas] / fps, 2),
+        "Desvio": np.asarray(regras.nomes, dtype=object)[posicoes // len(trilhas)],
+        "Ângulo": np.round(valores.ravel()[posicoes], 2),
+        "Operador": trilhas[celulas]
+    })
+
+
+def _posicoes_em_sequencias(inicios, fins):
+    """Posições do array valores achatado cobertas pelas sequências [início, fim), em ordem."""
+    tamanhos = fins - inicios
+    deslocamentos = np.repeat(inicios - (np.cumsum(tamanhos) - tamanhos), tamanhos)
+    return deslocamentos + np.arange(int(tamanhos.sum()))
+
+
+def resumo_desvios(pose_data, fps=None, persistencia_minima_s=None, operador=None, regras=None):
+    """
+    Resumo por tipo de desvio calculado direto das sequências persistentes, sem a tabela
+    por quadro: eventos, quadros em desvio, média e desvio padrão amostral do ângulo e
+    trechos em ângulo extremo dentro dos eventos. Só aparecem os tipos com eventos.
+    """
+    operador = _operador_padrao(pose_data, operador)
+    fps, frame_skip = _tempo(pose_data, fps)
+    regras = obter_regras(regras).aplicacao(EVENTO)
+    return memorizado(pose_data, ("resumo", regras, fps, persistencia_minima_s, operador),
+                      lambda: _tabela_resumo(pose_data, regras, fps, frame_skip, persistencia_minima_s,
+                                             operador)).copy()
+
+
+def _tabela_resumo(pose_data, regras, fps, frame_skip, persistencia_minima_s, operador):
+    persistencia_minima = regras.amostras_minimas(fps, frame_skip, persistencia_minima_s)
+    valores, quadros_celula, trilhas, inicios, fins = _analisar_com_cache(pose_data, regras, persistencia_minima)
+    inicios, fins = _sequencias_do_operador(trilhas, inicios, fins, operador)
+    if not len(inicios):
+        return pd.DataFrame(columns=COLUNAS_RESUMO)
+
+    n_celulas, n_regras = len(trilhas), len(regras)
+    angulos = valores.ravel()
+    regra = inicios // n_celulas
+    eventos = np.bincount(regra, minlength=n_regras)
+    quadros = np.bincount(regra, fins - inicios, n_regras)
+    soma = np.bincount(regra, _reduzir_sequencias(np.add, angulos, inicios, fins), n_regras)
+    soma_q = np.bincount(regra, _reduzir_sequencias(np.add, angulos * angulos, inicios, fins), n_regras)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = soma / quadros
+        desvio_padrao = np.where(quadros > 1, np.sqrt(np.maximum(soma_q - soma * media, 0.0) / (quadros - 1)),
+                                 np.nan)
+
+    # Extremos: trechos contíguos em ângulo extremo, contados dentro de cada sequência
+    # (com os ângulos arredondados, como na tabela por quadro e na análise incremental)
+    posicoes = _posicoes_em_sequencias(inicios, fins)
+    extremo = regras.extremos_por_regra(np.round(angulos[posicoes], 2), posicoes // n_celulas)
+    comeco = np.ones(len(posicoes), dtype=bool)
+    comeco[1:] = ~extremo[:-1]
+    comeco[np.cumsum(fins - inicios)[:-1]] = True
+    extremos = np.bincount(posicoes[extremo & comeco] // n_celulas, minlength=n_regras)
+
+    presentes = eventos > 0
+    return pd.DataFrame({
+        "Desvio": np.asarray(regras.nomes, dtype=object)[presentes],
+        "Eventos": eventos[presentes],
+        "Quadros": quadros[presentes].astype(np.int64),
+        "Ângulo médio": np.round(media[presentes], 2),
+        "Desvio padrão": np.round(desvio_padrao[presentes], 2),
+        "Extremos": extremos[presentes],
+    }, columns=COLUNAS_RESUMO)
+
+
+def contar_quadros_em_desvio(pose_data, fps=None, persistencia_minima_s=None, operador=None, regras=None):
+    """Número de linhas da tabela por quadro, sem montá-la."""
+    inicios, fins = _sequencias(pose_data, fps, persistencia_minima_s, operador, regras)[-2:]
+    return int((fins - inicios).sum())
+
+
+def desvios_em_blocos(pose_data, linhas_por_bloco=LINHAS_POR_BLOCO, fps=None, persistencia_minima_s=None,
+                      operador=None, regras=None):
+    """
+    Gera a tabela de detectar_desvios_com_persistencia em DataFrames de até
+    linhas_por_bloco linhas, montados um de cada vez (para gravar em disco vídeos longos
+    sem ter a tabela inteira em memória).
+    """
+    sequencias = _sequencias(pose_data, fps, persistencia_minima_s, operador, regras)
+    regras, fps, _, valores, quadros_celula, trilhas, inicios, fins = sequencias
+    total = int((fins - inicios).sum())
+    for primeira in range(0, total, linhas_por_bloco):
+        yield _linhas_quadros(regras, fps, valores, quadros_celula, trilhas, inicios, fins, primeira,
+                              primeira + linhas_por_bloco)
+
+
+def pagina_desvios(pose_data, pagina, linhas_por_pagina=100, fps=None, persistencia_minima_s=None, operador=None,
+                   regras=None):
+    """Página (a partir de 0) da tabela por quadro e o total de linhas: (DataFrame, total)."""
+    regras, fps, _, valores, quadros_celula, trilhas, inicios, fins = _sequencias(
+        pose_data, fps, persistencia_minima_s, operador, regras)
+    primeira = max(int(pagina), 0) * linhas_por_pagina
+    return (_linhas_quadros(regras, fps, valores, quadros_celula, trilhas, inicios, fins, primeira,
+                            primeira + linhas_por_pagina), int((fins - inicios).sum()))
+
+
+def desvios_por_minuto(pose_data, fps=None, persistencia_minima_s=None, operador=None, regras=None):
+    """
+    Agregado por operador, minuto do vídeo e desvio: eventos iniciados no minuto, tempo
+    em desvio persistente (s) e ângulos mínimo/máximo/médio dos quadros em desvio.
+    """
+    regras, fps, frame_skip, valores, quadros_celula, trilhas, inicios, fins = _sequencias(
+        pose_data, fps, persistencia_minima_s, operador, regras)
+    if not len(inicios):
+        return pd.DataFrame(columns=COLUNAS_MINUTOS)
+
+    # Posições do array valores achatado que pertencem a alguma sequência persistente
+    n_celulas = len(trilhas)
+    marcas = np.zeros(valores.size + 1, dtype=np.int64)
+    np.add.at(marcas, inicios, 1)
+    np.add.at(marcas, fins, -1)
+    posicoes = np.nonzero(np.cumsum(marcas[:-1]))[0]
+    celulas = posicoes % n_celulas
+    quadros = pd.DataFrame({"Operador": trilhas[celulas],
+                            "Minuto": (quadros_celula[celulas] / fps // 60).astype(np.int64),
+                            "Regra": posicoes // n_celulas,
+                            "Ângulo": valores.ravel()[posicoes]})
+    tabela = quadros.groupby(["Operador", "Minuto", "Regra"])["Ângulo"].agg(["size", "min", "max", "mean"])
+
+    eventos = pd.DataFrame({"Operador": trilhas[inicios % n_celulas],
+                            "Minuto": (quadros_celula[inicios % n_celulas] / fps // 60).astype(np.int64),
+                            "Regra": inicios // n_celulas}).value_counts()
+    tabela = tabela.join(eventos.rename("Eventos")).fillna({"Eventos": 0}).reset_index()
+    return pd.DataFrame({
+        "Operador": tabela["Operador"],
+        "Minuto": tabela["Minuto"],
+        "Desvio": np.asarray(regras.nomes, dtype=object)[tabela["Regra"]],
+        "Eventos": tabela["Eventos"].astype(np.int64),
+        "Tempo em desvio (s)": np.round(tabela["size"] * frame_skip / fps, 2),
+        "Ângulo mín": np.round(tabela["min"], 2),
+        "Ângulo máx": np.round(tabela["max"], 2),
+        "Ângulo médio": np.round(tabela["mean"], 2),
+    })
@@ -1,47 +1,35 @@
-import math
+import numpy as np
+from pose_store import NUM_KEYPOINTS
+from regras import QUADRO, obter_regras
 
-def calculate_angle(a, b, c):
-    ba = [a[i] - b[i] for i in range(2)]
-    bc = [c[i] - b[i] for i in range(2)]
+# Índices do modelo YOLOv8 Pose:
+# 5: shoulder_r, 7: elbow_r, 9: wrist_r
+# 11: hip_r, 13: knee_r, 15: ankle_r
+_JOINTS = (5, 7, 9, 11, 13, 15)
 
-    dot_product = sum(ba[i] * bc[i] for i in range(2))
-    magnitude_ba = math.sqrt(sum(ba[i] ** 2 for i in range(2)))
-    magnitude_bc = math.sqrt(sum(bc[i] ** 2 for i in range(2)))
-
-    if magnitude_ba * magnitude_bc == 0:
-        return 0
-
-    angle_rad = math.acos(dot_product / (magnitude_ba * magnitude_bc))
-    return math.degrees(angle_rad)
-
-def generate_diagnosis(pose_data):
+def generate_diagnosis(pose_data, regras=None):
     diagnostics = []
+    regras = obter_regras(regras).aplicacao(QUADRO)
 
+    points = np.full((len(pose_data), NUM_KEYPOINTS, 3), np.nan)
     for frame_idx, joints in enumerate(pose_data):
         try:
-            # Índices do modelo YOLOv8 Pose:
-            # 5: shoulder_r, 7: elbow_r, 9: wrist_r
-            # 11: hip_r, 13: knee_r, 15: ankle_r
-
-            shoulder = [joints['joint_5']['x'], joints['joint_5']['y']]
-            elbow = [joints['joint_7']['x'], joints['joint_7']['y']]
-            wrist = [joints['joint_9']['x'], joints['joint_9']['y']]
-
-            hip = [joints['joint_11']['x'], joints['joint_11']['y']]
-            knee = [joints['joint_13']['x'], joints['joint_13']['y']]
-            ankle = [joints['joint_15']['x'], joints['joint_15']['y']]
-
-            elbow_angle = calculate_angle(shoulder, elbow, wrist)
-            knee_angle = calculate_angle(hip, knee, ankle)
-
-            if elbow_angle < 45 or elbow_angle > 160:
-                diagnostics.append(f"Frame {frame_idx}: Ângulo do cotovelo fora da faixa ergonômica ({elbow_angle:.1f}°).")
-            if knee_angle < 60 or knee_angle > 160:
-                diagnostics.append(f"Frame {frame_idx}: Ângulo do joelho fora da faixa ergonômica ({knee_angle:.1f}°).")
-
+            points[frame_idx, list(_JOINTS)] = [[joints[f'joint_{j}']['x'], joints[f'joint_{j}']['y'], 1.0]
+                                                for j in _JOINTS]
         except KeyError:
             continue
 
+    # Todas as regras por quadro avaliadas de uma vez: (regras, quadros)
+    if len(regras):
+        angles = regras.valores(regras.angulos(points, min_confidence=0.0))
+        out = regras.violacoes(angles)
+    else:
+        out = np.zeros((0, len(points)), dtype=bool)
+
+    for frame_idx in np.nonzero(out.any(axis=0))[0]:
+        for regra_idx in np.nonzero(out[:, frame_idx])[0]:
+            diagnostics.append(f"Frame {frame_idx}: {regras.nomes[regra_idx]} ({angles[regra_idx, frame_idx]:.1f}°).")
+
     if not diagnostics:
         diagnostics.append("Postura dentro dos limites ergonômicos em todos os quadros analisados.")
 
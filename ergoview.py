@@ -1,183 +1,186 @@
 import streamlit as st
 import os
-import numpy as np
 import time
-import pandas as pd
-import threading
 from ergonomics import generate_diagnosis
-from analise_ergonomica import analisar_metricas_ergonomicas
-from yolo_pose_analysis import run_pose_estimation
+from analise_ergonomica import analisar_metricas_ergonomicas, gerar_diagnostico_avancado
+from ciclos import analisar_ciclos
+from desvios import (detectar_eventos, resumo_desvios, desvios_por_minuto, pagina_desvios,
+                     contar_quadros_em_desvio)
+from exportacao import exportar_desvios_por_quadro
+from instrumentacao import Desempenho, tabela_etapas
+from pose_store import PoseStore
+from model_registry import MODEL_SIZES, BACKENDS, DEFAULT_IMGSZ, model_path_for
+from recorte import ROI_AUTOMATICA
+from pose_cache import CACHE_DIR, hash_video, chave_cache, carregar_do_cache, salvar_no_cache, caminho_video_anotado
+from renderizacao import iniciar_renderizacao, status_renderizacao, NA_FILA, CONCLUIDA, ERRO, CANCELADA
+from tarefas import salvar_entrada, enviar_tarefa, status_tarefa, resultado_tarefa, cancelar_tarefa
+from pose_dataset import DATASETS_DIR, salvar_dataset, carregar_dataset, listar_datasets
+from graficos import figuras_angulos, figura_desvios_dataset
+from historico import (COLUNAS_METRICAS, registrar_analise, valores_distintos, listar_analises, agregar,
+                       eventos_por_desvio, comparar_analises)
+from regras import EVENTO, descrever, obter_regras
 import plotly.express as px
-import plotly.graph_objects as go
 
 st.set_page_config(page_title="ErgoView - Análise Ergonômica", layout="wide")
 
-def calculate_angle(a, b, c):
-    a, b, c = np.array(a), np.array(b), np.array(c)
-    ba = a - b
-    bc = c - b
-    cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc) + 1e-6)
-    angle = np.arccos(np.clip(cosine_angle, -1.0, 1.0))
-    return np.degrees(angle)
-
-def detectar_desvios_com_persistencia(pose_data, fps=30, persistencia_minima=90):
-    desvios_por_tipo = {
-        "Inclinação excessiva do tronco": [],
-        "Braço elevado acima do ombro": [],
-        "Flexão profunda do joelho": []
-    }
-
-    for i, frame in enumerate(pose_data):
-        keypoints = frame["keypoints"]
-        try:
-            neck = np.mean([keypoints[5], keypoints[6]], axis=0)
-            hip = np.mean([keypoints[11], keypoints[12]], axis=0)
-            knee = keypoints[13]
-            tronco_angle = calculate_angle(neck, hip, knee)
-            if tronco_angle < 135:
-                desvios_por_tipo["Inclinação excessiva do tronco"].append((i, tronco_angle))
-
-            shoulder_left = keypoints[5]
-            elbow_left = keypoints[7]
-            wrist_left = keypoints[9]
-            arm_angle = calculate_angle(shoulder_left, elbow_left, wrist_left)
-            if arm_angle > 90:
-                desvios_por_tipo["Braço elevado acima do ombro"].append((i, arm_angle))
-
-            hip_left = keypoints[11]
-            knee_left = keypoints[13]
-            ankle_left = keypoints[15]
-            knee_angle = calculate_angle(hip_left, knee_left, ankle_left)
-            if knee_angle < 90:
-                desvios_por_tipo["Flexão profunda do joelho"].append((i, knee_angle))
-        except Exception:
-            continue
-
-    desvios_filtrados = []
-    for tipo, ocorrencias in desvios_por_tipo.items():
-        if not ocorrencias:
-            continue
-        sequencia = []
-        for idx in range(len(ocorrencias)):
-            if not sequencia:
-                sequencia.append(ocorrencias[idx])
-            elif ocorrencias[idx][0] == sequencia[-1][0] + 1:
-                sequencia.append(ocorrencias[idx])
-            else:
-                if len(sequencia) >= persistencia_minima:
-                    for frame_idx, angulo in sequencia:
-                        tempo_segundos = frame_idx / fps
-                        desvios_filtrados.append({
-                            "Frame": frame_idx,
-                            "Tempo (s)": round(tempo_segundos, 2),
-                            "Desvio": tipo,
-                            "Ângulo": round(angulo, 2)
-                        })
-                sequencia = [ocorrencias[idx]]
-        if len(sequencia) >= persistencia_minima:
-            for frame_idx, angulo in sequencia:
-                tempo_segundos = frame_idx / fps
-                desvios_filtrados.append({
-                    "Frame": frame_idx,
-                    "Tempo (s)": round(tempo_segundos, 2),
-                    "Desvio": tipo,
-                    "Ângulo": round(angulo, 2)
-                })
-
-    return pd.DataFrame(desvios_filtrados)
-
-def gerar_diagnostico_avancado(metricas, df_desvios):
-    diagnostico = []
-
-    # Diagnóstico baseado nas métricas
-    if metricas["Posturas Inadequadas"] > 0:
-        diagnostico.append(f"⚠️ Foram detectadas {metricas['Posturas Inadequadas']} posturas inadequadas, indicando risco ergonômico conforme a NR-17.")
-    if metricas["Movimentos Repetitivos"] > 0:
-        diagnostico.append("⚠️ Movimentos repetitivos foram identificados, o que pode levar a LER/DORT.")
-    if metricas["Posturas Forçadas (>90s)"] > 0:
-        diagnostico.append("⚠️ Posturas forçadas foram mantidas por mais de 90 segundos, o que representa risco elevado.")
-    if metricas["Pausas/Ritmo de Trabalho"] == 0:
-        diagnostico.append("⚠️ Ausência de pausas detectada. A NR-17 recomenda pausas regulares para recuperação.")
-    if metricas["Ângulos Articulares Extremos"] > 0:
-        diagnostico.append(f"⚠️ Foram detectados {metricas['Ângulos Articulares Extremos']} ângulos articulares extremos, o que pode causar sobrecarga muscular.")
-    if metricas["Posturas Estáticas (>4s)"] > 0:
-        diagnostico.append(f"⚠️ {metricas['Posturas Estáticas (>4s)']} posturas estáticas foram mantidas por mais de 4 segundos.")
-    if metricas["Risco Postural"] in ["Moderado", "Alto"]:
-        diagnostico.append(f"⚠️ O risco postural geral foi classificado como **{metricas['Risco Postural']}**, indicando necessidade de intervenção.")
-
-    # Diagnóstico baseado nos desvios detectados
-    if not df_desvios.empty:
-        tipos = df_desvios["Desvio"].value_counts()
-        for tipo, qtd in tipos.items():
-            diagnostico.append(f"🔍 Foram detectadas {qtd} ocorrências de \"{tipo}\" com persistência mínima de 3 segundos.")
-
-    if not diagnostico:
-        diagnostico.append("✅ Nenhum risco ergonômico relevante foi identificado. A postura está dentro dos limites recomendados.")
-
-    return diagnostico
-
-
 # Interface com abas
 st.title("📊 ErgoView - Análise Ergonômica com Visão Computacional")
 st.markdown("Bem-vindo ao **ErgoView**, uma ferramenta para auxiliar ergonomistas na análise de operações industriais com base em vídeo. Software desenvolvido por Eng Diógenes Oliveira")
 
-tab1, tab2, tab3, tab4 = st.tabs(["📥 Upload e Processamento", "📊 Métricas e Alertas", "📈 Gráficos e Diagnóstico", "📎 Relatórios e Downloads"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["📥 Upload e Processamento", "📊 Métricas e Alertas", "📈 Gráficos e Diagnóstico",
+                                       "📎 Relatórios e Downloads", "📚 Histórico"])
 
 with tab1:
     st.header("📥 Upload de Vídeo")
     video_file = st.file_uploader("Envie um vídeo no formato .mp4", type=["mp4"])
     if video_file is not None:
-        with open("uploaded_video.mp4", "wb") as f:
-            f.write(video_file.read())
-        st.video("uploaded_video.mp4")
-
-        timer_placeholder = st.empty()
-        progress_bar = st.progress(0.0)
-        st.info("🔍 Processando vídeo... Isso pode levar alguns segundos.")
-        start_time = time.time()
-        running = True
-
-        def update_timer():
-            while running:
-                elapsed = time.time() - start_time
-                timer_placeholder.markdown(f"⏱️ Tempo decorrido: **{elapsed:.1f} segundos**")
-                time.sleep(0.1)
-
-        def atualizar_progresso(p):
-            progress_bar.progress(min(p, 1.0))
-
-        timer_thread = threading.Thread(target=update_timer)
-        timer_thread.start()
-
-        try:
-            pose_data, processed_video_path = run_pose_estimation(
-                "uploaded_video.mp4",
-                progress_callback=atualizar_progresso,
-                frame_skip=1,
-                save_annotated_video=True
-            )
-            running = False
-            timer_thread.join()
-            elapsed_time = time.time() - start_time
-            st.success(f"✅ Detecção de pose concluída em {elapsed_time:.2f} segundos.")
+        video_bytes = video_file.getvalue()
+        st.video(video_bytes)
+
+        # Reexecuções do Streamlit reaproveitam o resultado já calculado para o mesmo vídeo
+        frame_skip = st.select_slider("Processar 1 a cada N quadros", options=[1, 2, 3, 5], value=1,
+                                      help="Valores maiores aceleram o processamento; os tempos continuam em segundos.")
+        adaptativa = st.checkbox("Amostragem adaptativa (pula quadros parados)", value=False,
+                                 help="Só roda o modelo quando a cena muda; posturas paradas reaproveitam os keypoints.")
+        with st.expander("⚙️ Opções do modelo"):
+            tamanho = st.selectbox("Tamanho do modelo", MODEL_SIZES, index=0,
+                                   help="Modelos maiores são mais precisos e mais lentos.")
+            backend = st.selectbox("Backend de inferência", list(BACKENDS), index=0,
+                                   help="ONNX e OpenVINO rodam mais rápido na CPU, mas precisam do modelo exportado localmente.")
+            imgsz = st.select_slider("Resolução de entrada (px)", options=[320, 416, 480, 640], value=DEFAULT_IMGSZ)
+            modo_roi = st.radio("Região de interesse", ["Quadro inteiro", "Automática (segue o operador)", "Retângulo fixo"],
+                                horizontal=True, help="Envia ao modelo só a parte do quadro onde está o operador.")
+            roi = None
+            if modo_roi == "Automática (segue o operador)":
+                roi = ROI_AUTOMATICA
+            elif modo_roi == "Retângulo fixo":
+                faixa_x = st.slider("Faixa horizontal (%)", 0, 100, (0, 100))
+                faixa_y = st.slider("Faixa vertical (%)", 0, 100, (0, 100))
+                roi = (faixa_x[0] / 100, faixa_y[0] / 100, faixa_x[1] / 100, faixa_y[1] / 100)
+            suavizar = st.checkbox("Limpar e suavizar keypoints", value=True,
+                                   help="Descarta pontos de baixa confiança, preenche falhas curtas e suaviza o "
+                                        "movimento antes do cálculo dos ângulos.")
+        parametros_pose = dict(model_path=model_path_for(tamanho, backend), imgsz=imgsz, frame_skip=frame_skip,
+                               motion_threshold=0.015 if adaptativa else None, roi=roi, preprocess=suavizar)
+        # Hash e cópia do upload só quando o arquivo muda, não a cada reexecução (ex.: acompanhamento da tarefa)
+        if (st.session_state.get("upload_id") != video_file.file_id
+                or not os.path.exists(st.session_state.get("video_path", ""))):
+            st.session_state.video_hash = hash_video(video_bytes)
+            st.session_state.video_path = salvar_entrada(video_bytes, st.session_state.video_hash)
+            st.session_state.upload_id = video_file.file_id
+        video_hash = st.session_state.video_hash
+        video_path = st.session_state.video_path
+        chave = chave_cache(video_hash, **parametros_pose)
+        em_cache = carregar_do_cache(chave)
+
+        if em_cache is not None:
+            pose_data, processed_video_path = em_cache
+            st.success("✅ Detecção de pose recuperada do cache.")
             st.session_state.pose_data = pose_data
             st.session_state.processed_video_path = processed_video_path
-        except Exception as e:
-            running = False
-            timer_thread.join()
-            st.error(f"Erro ao processar o vídeo: {e}")
-            st.stop()
+            st.session_state.chave_video = chave
+        else:
+            # A inferência roda na fila de tarefas, fora da sessão: a página só envia a tarefa
+            # e acompanha o andamento. Sessões com o mesmo vídeo e parâmetros compartilham a tarefa.
+            status = status_tarefa(chave)
+            if status is None:
+                enviar_tarefa(video_path, tarefa_id=chave, batch_size=8, **parametros_pose)
+                status = status_tarefa(chave)
+
+            if status["estado"] == CONCLUIDA:
+                pose_data = resultado_tarefa(chave)
+                st.success(f"✅ Detecção de pose concluída em {status['decorrido_s']:.2f} segundos.")
+                st.session_state.desempenho_inferencia = status["desempenho"]
+                if adaptativa:
+                    st.caption(f"Amostragem adaptativa: {pose_data.skipped_fraction:.0%} dos quadros dispensaram a inferência.")
+                pose_data.metadata.update(video=video_file.name, video_hash=video_hash)
+                salvar_no_cache(chave, pose_data)
+                pose_data, processed_video_path = carregar_do_cache(chave)
+                st.session_state.pose_data = pose_data
+                st.session_state.processed_video_path = processed_video_path
+                st.session_state.chave_video = chave
+            elif status["estado"] in (ERRO, CANCELADA):
+                if status["estado"] == ERRO:
+                    st.error(f"Erro ao processar o vídeo: {status['erro']}")
+                else:
+                    st.warning("Processamento cancelado.")
+                if st.button("🔁 Processar novamente"):
+                    enviar_tarefa(video_path, tarefa_id=chave, batch_size=8, **parametros_pose)
+                    st.rerun()
+                st.stop()
+            else:
+                st.progress(min(status["progresso"], 1.0),
+                            text="⏳ Aguardando vaga na fila de processamento..." if status["estado"] == NA_FILA
+                            else "🔍 Processando vídeo... Isso pode levar alguns segundos.")
+                st.markdown(f"⏱️ Tempo decorrido: **{status['decorrido_s']:.1f} segundos**")
+
+                # Alertas ao vivo: a análise acompanha a inferência quadro a quadro, dentro da tarefa
+                st.markdown("### 🚨 Alertas durante o processamento")
+                alertas = []
+                for aviso in status["alertas"][-10:]:
+                    if aviso["Status"] == "alerta":
+                        alertas.append(f"⚠️ {aviso['Início (s)']:.1f}s — Operador {aviso['Operador']}: "
+                                       f"{aviso['Desvio']} ({aviso['Ângulo']:.0f}°)")
+                    else:
+                        alertas.append(f"🔸 {aviso['Início (s)']:.1f}s–{aviso['Fim (s)']:.1f}s — Operador {aviso['Operador']}: "
+                                       f"{aviso['Desvio']} por {aviso['Duração (s)']:.1f}s")
+                if alertas:
+                    st.markdown("\n".join(f"- {alerta}" for alerta in alertas))
+                metricas = status["metricas"]
+                if metricas:
+                    st.caption(f"Posturas inadequadas: {metricas['Posturas Inadequadas']} · "
+                               f"Ângulos extremos: {metricas['Ângulos Articulares Extremos']} · "
+                               f"Risco postural: {metricas['Risco Postural']}")
+
+                if st.button("⏹️ Cancelar processamento"):
+                    cancelar_tarefa(chave)
+                time.sleep(1)
+                st.rerun()
+
+    # Datasets salvos podem ser reabertos (e reanalisados) sem o vídeo e sem nova inferência
+    st.subheader("📂 Datasets de pose")
+    if "pose_data" in st.session_state and isinstance(st.session_state.pose_data, PoseStore):
+        metadados = st.session_state.pose_data.metadata
+        nome_padrao = f"{os.path.splitext(metadados.get('video', 'dataset'))[0]}-{metadados.get('video_hash', '')[:8]}"
+        nome_dataset = st.text_input("Nome do dataset", value=nome_padrao.rstrip("-"))
+        if st.button("💾 Salvar dataset atual") and nome_dataset:
+            pasta = salvar_dataset(st.session_state.pose_data, os.path.join(DATASETS_DIR, os.path.basename(nome_dataset)))
+            st.success(f"Dataset salvo em {pasta}")
+    datasets = listar_datasets(DATASETS_DIR)
+    if datasets:
+        escolhido = st.selectbox("Abrir dataset salvo", datasets,
+                                 format_func=lambda d: f"{os.path.basename(d[0])} — {d[1].get('video', '?')} "
+                                                       f"({d[1]['n_frames']} quadros, {d[1].get('criado_em', '')})")
+        if st.button("📂 Abrir dataset"):
+            st.session_state.pose_data = carregar_dataset(escolhido[0])
+            st.session_state.processed_video_path = None
+            st.session_state.chave_video = None
+            st.success(f"✅ Dataset {os.path.basename(escolhido[0])} carregado.")
+
+# Com mais de uma pessoa no vídeo, as análises são feitas por operador (trilha)
+operador = None
+if "pose_data" in st.session_state and isinstance(st.session_state.pose_data, PoseStore):
+    operadores = st.session_state.pose_data.operators()
+    if len(operadores) > 1:
+        operador = st.sidebar.selectbox("👷 Operador analisado", operadores,
+                                        format_func=lambda o: f"Operador {o}")
+
+# Tempos das análises desta execução do script, mostrados no painel de desempenho
+desempenho_analise = Desempenho("análise")
+desempenho_analise.ativar()
 
 with tab2:
     st.header("📊 Métricas Ergonômicas")
     if "pose_data" in st.session_state:
         pose_data = st.session_state.pose_data
-        df_desvios = detectar_desvios_com_persistencia(pose_data, fps=30, persistencia_minima=90)
-        metricas = analisar_metricas_ergonomicas(df_desvios)
+        resumo = resumo_desvios(pose_data, operador=operador)
+        ciclos = analisar_ciclos(pose_data, operador)
+        metricas = analisar_metricas_ergonomicas(resumo, ciclos=ciclos)
 
         col1, col2, col3 = st.columns(3)
         col1.metric("Posturas Inadequadas", metricas["Posturas Inadequadas"], "NR-17")
-        col2.metric("Movimentos Repetitivos", metricas["Movimentos Repetitivos"], "NR-17")
+        col2.metric("Movimentos Repetitivos", metricas["Movimentos Repetitivos"], "NR-17",
+                    help=f"{metricas['Ciclos por Minuto']:g} ciclos/min nos trechos repetitivos")
         col3.metric("Posturas Forçadas", metricas["Posturas Forçadas (>90s)"], "NR-17")
 
         col4, col5, col6 = st.columns(3)
@@ -198,7 +201,7 @@ with tab2:
 
         if metricas["Movimentos Repetitivos"] > 0:
             st.warning(
-                "🔸 Foram identificados movimentos repetitivos com os membros superiores, o que pode causar fadiga muscular e lesões por esforço repetitivo (LER/DORT), conforme a NR-17.")
+                f"🔸 Foram identificados {metricas['Movimentos Repetitivos']} trechos de movimentos repetitivos com os membros superiores (cerca de {metricas['Ciclos por Minuto']:g} ciclos por minuto), o que pode causar fadiga muscular e lesões por esforço repetitivo (LER/DORT), conforme a NR-17.")
 
         if metricas["Posturas Forçadas (>90s)"] > 0:
             st.warning(
@@ -207,10 +210,18 @@ with tab2:
         if metricas["Pausas/Ritmo de Trabalho"] == 0:
             st.warning(
                 "🔸 Não foram detectadas pausas significativas durante a atividade. A NR-17 recomenda pausas para recuperação física e mental.")
+        else:
+            st.info(f"🔹 {metricas['Pausas/Ritmo de Trabalho']} pausa(s) detectada(s), somando {ciclos['tempo_em_pausa_s']:.0f} segundos.")
+
+        with st.expander("🔁 Ciclos de trabalho e pausas"):
+            st.dataframe(ciclos["janelas"])
+            st.dataframe(ciclos["pausas"])
 
         if metricas["Ângulos Articulares Extremos"] > 0:
+            exemplos = ", ".join(f"{regra.articulacao} {descrever(*regra.extremo)}"
+                                 for regra in obter_regras().aplicacao(EVENTO) if regra.extremo)
             st.warning(
-                f"🔸 Foram identificadas {metricas['Ângulos Articulares Extremos']} ocorrências de ângulos articulares extremos (ex: tronco < 90°, braço > 150°, joelho < 60°), o que representa risco postural segundo a ISO 11226.")
+                f"🔸 Foram identificadas {metricas['Ângulos Articulares Extremos']} ocorrências de ângulos articulares extremos (ex: {exemplos}), o que representa risco postural segundo a ISO 11226.")
 
         if metricas["Posturas Estáticas (>4s)"] > 0:
             st.warning(
@@ -220,100 +231,47 @@ with tab2:
             st.warning(
                 f"🔸 A classificação geral de risco postural foi **{metricas['Risco Postural']}**, indicando necessidade de intervenção ergonômica segundo a ISO 11226.")
 
+        # Só as métricas e os eventos vão para o histórico; as comparações ficam na aba Histórico
+        with st.expander("💾 Salvar no histórico"):
+            with st.form("salvar_historico"):
+                posto = st.text_input("Posto de trabalho")
+                nome_operador = st.text_input("Operador")
+                data_gravacao = st.date_input("Data da gravação")
+                if st.form_submit_button("Salvar"):
+                    trilha = operador if operador is not None else pose_data.primary_operator()
+                    registrar_analise(metricas, detectar_eventos(pose_data, operador=trilha),
+                                      posto=posto or None, operador=nome_operador or None, data=data_gravacao,
+                                      video=pose_data.metadata.get("video", pose_data.metadata.get("video_path")),
+                                      video_hash=pose_data.metadata.get("video_hash"), trilha=trilha,
+                                      duracao_s=pose_data.n_frames * pose_data.frame_skip / pose_data.fps,
+                                      regras=obter_regras().origem)
+                    st.success("✅ Análise salva no histórico.")
+
         pose_data = st.session_state.pose_data
 
 with tab3:
     st.header("📈 Gráficos e Diagnóstico")
     if "pose_data" in st.session_state:
         pose_data = st.session_state.pose_data
-        # Gerar df_angulos a partir de pose_data
-        dados = []
-        fps = 30
-        for i, frame in enumerate(pose_data):
-            keypoints = frame["keypoints"]
-            try:
-                ang_cotovelo = calculate_angle(keypoints[5], keypoints[7], keypoints[9])  # ombro, cotovelo, punho
-                ang_joelho = calculate_angle(keypoints[11], keypoints[13], keypoints[15])  # quadril, joelho, tornozelo
-                tempo = i / fps
-                dados.append({
-                    "Tempo (s)": round(tempo, 2),
-                    "Ângulo Cotovelo": round(ang_cotovelo, 2),
-                    "Ângulo Joelho": round(ang_joelho, 2)
-                })
-            except Exception:
-                continue
-
-        df_angulos = pd.DataFrame(dados)
-        df_desvios = detectar_desvios_com_persistencia(pose_data, fps=30, persistencia_minima=90)
-
-        # Gráfico 1: Evolução dos Ângulos ao Longo do Tempo
-        fig1 = go.Figure()
-
-        # Traços dos ângulos
-        fig1.add_trace(go.Scatter(x=df_angulos["Tempo (s)"], y=df_angulos["Ângulo Cotovelo"],
-                                  mode='lines', name='Ângulo Cotovelo'))
-        fig1.add_trace(go.Scatter(x=df_angulos["Tempo (s)"], y=df_angulos["Ângulo Joelho"],
-                                  mode='lines', name='Ângulo Joelho'))
-
-        # Linhas horizontais de referência para cotovelo
-        fig1.add_hline(y=90, line=dict(color="red", dash="dash"),
-                       annotation_text="Limite Inferior Cotovelo (90°)", annotation_position="top left")
-        fig1.add_hline(y=150, line=dict(color="red", dash="dash"),
-                       annotation_text="Limite Superior Cotovelo (150°)", annotation_position="top left")
-
-        # Linhas horizontais de referência para joelho
-        fig1.add_hline(y=60, line=dict(color="blue", dash="dot"),
-                       annotation_text="Limite Inferior Joelho (60°)", annotation_position="bottom left")
-        fig1.add_hline(y=90, line=dict(color="blue", dash="dot"),
-                       annotation_text="Limite Superior Joelho (90°)", annotation_position="bottom left")
-
-        # Layout
-        fig1.update_layout(title="Evolução dos Ângulos com Limites Ergonômicos",
-                           xaxis_title="Tempo (s)", yaxis_title="Ângulo (graus)")
+        resumo = resumo_desvios(pose_data, operador=operador)
 
+        # Gráficos 1 e 2: evolução e distribuição dos ângulos, reduzidas para um número fixo
+        # de pontos/bins e montadas uma vez por dataset e operador
+        fig1, fig2 = figuras_angulos(pose_data, operador)
         st.plotly_chart(fig1, use_container_width=True)
-
-        # Gráfico 2: Histograma dos Ângulos
-        fig2 = go.Figure()
-
-        # Histogramas
-        fig2.add_trace(go.Histogram(x=df_angulos["Ângulo Cotovelo"], name="Cotovelo", opacity=0.6))
-        fig2.add_trace(go.Histogram(x=df_angulos["Ângulo Joelho"], name="Joelho", opacity=0.6))
-
-        # Linhas verticais de referência
-        fig2.add_vline(x=90, line=dict(color="red", dash="dash"), annotation_text="Limite Inferior Cotovelo",
-                       annotation_position="top right")
-        fig2.add_vline(x=150, line=dict(color="red", dash="dash"), annotation_text="Limite Superior Cotovelo",
-                       annotation_position="top right")
-        fig2.add_vline(x=60, line=dict(color="blue", dash="dot"), annotation_text="Limite Inferior Joelho",
-                       annotation_position="top right")
-        fig2.add_vline(x=90, line=dict(color="blue", dash="dot"), annotation_text="Limite Superior Joelho",
-                       annotation_position="top right")
-
-        # Layout
-        fig2.update_layout(
-            barmode='overlay',
-            title="Distribuição dos Ângulos Articulares com Limites Ergonômicos",
-            xaxis_title="Ângulo (graus)",
-            yaxis_title="Frequência"
-        )
-
         st.plotly_chart(fig2, use_container_width=True)
 
         # Gráfico 3: Contagem de Desvios por Tipo
-        st.dataframe(df_desvios.head())
-        contagem = df_desvios["Desvio"].value_counts().reset_index()
-        contagem.columns = ["Desvio", "Contagem"]
-        fig3 = px.bar(contagem, x="Desvio", y="Contagem", title="Contagem de Desvios por Tipo")
+        st.dataframe(resumo, hide_index=True)
+        fig3 = px.bar(resumo, x="Desvio", y="Eventos", title="Contagem de Desvios por Tipo")
         st.plotly_chart(fig3, use_container_width=True)
 
         # Gráfico 4: Dispersão de Ângulo vs Tempo
-        fig4 = px.scatter(df_desvios, x="Tempo (s)", y="Ângulo", color="Desvio",
-                          title="Desvios Detectados: Ângulo vs Tempo")
+        fig4 = figura_desvios_dataset(pose_data, operador)
         st.plotly_chart(fig4, use_container_width=True)
 
         st.subheader("🧠 Diagnóstico Ergonômico")
-        diagnosis = gerar_diagnostico_avancado(metricas, df_desvios)
+        diagnosis = gerar_diagnostico_avancado(metricas, resumo)
         if diagnosis:
             for item in diagnosis:
                 st.write("•", item)
@@ -325,16 +283,51 @@ with tab4:
     st.header("📎 Relatórios e Downloads")
     if "pose_data" in st.session_state:
         pose_data = st.session_state.pose_data
-        df_desvios = detectar_desvios_com_persistencia(pose_data, fps=30, persistencia_minima=90)
-
-        if not df_desvios.empty:
-            st.dataframe(df_desvios)
-            csv = df_desvios.to_csv(index=False).encode("utf-8")
-            st.download_button("📥 Baixar CSV dos Desvios", data=csv, file_name="desvios_nr17.csv", mime="text/csv")
+        # Eventos e agregados por minuto são pequenos; a tabela por quadro é paginada e,
+        # para download, gravada em disco em blocos
+        df_eventos = detectar_eventos(pose_data, operador=operador)
+
+        if not df_eventos.empty:
+            st.markdown("#### Eventos de desvio")
+            st.dataframe(df_eventos)
+            st.download_button("📥 Baixar CSV dos Eventos", data=df_eventos.to_csv(index=False).encode("utf-8"),
+                               file_name="eventos_nr17.csv", mime="text/csv")
+
+            df_minutos = desvios_por_minuto(pose_data, operador=operador)
+            st.markdown("#### Desvios por minuto")
+            st.dataframe(df_minutos)
+            st.download_button("📥 Baixar CSV por Minuto", data=df_minutos.to_csv(index=False).encode("utf-8"),
+                               file_name="desvios_por_minuto_nr17.csv", mime="text/csv")
+
+            with st.expander("🔎 Desvios quadro a quadro"):
+                linhas_por_pagina = 200
+                total = contar_quadros_em_desvio(pose_data, operador=operador)
+                paginas = max((total - 1) // linhas_por_pagina + 1, 1)
+                pagina = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, value=1) - 1
+                st.dataframe(pagina_desvios(pose_data, pagina, linhas_por_pagina, operador=operador)[0])
+                st.caption(f"{total} quadros em desvio persistente.")
+
+                # Gravado na entrada do vídeo no cache, que entra na remoção LRU
+                nome_csv = f"desvios-{pose_data.metadata.get('video_hash', 'dataset')[:12]}-{operador}.csv"
+                caminho_csv = os.path.join(CACHE_DIR, st.session_state.get("chave_video") or "exportacoes", nome_csv)
+                if st.button("📝 Gerar CSV completo por quadro"):
+                    os.makedirs(os.path.dirname(caminho_csv), exist_ok=True)
+                    exportar_desvios_por_quadro(pose_data, caminho_csv, operador=operador)
+                if os.path.exists(caminho_csv):
+                    with open(caminho_csv, "rb") as f:
+                        st.download_button("📥 Baixar CSV dos Desvios", data=f, file_name="desvios_nr17.csv",
+                                           mime="text/csv")
         else:
             st.info("Nenhum desvio postural detectado conforme NR-17.")
 
-        if "processed_video_path" in st.session_state and os.path.exists(st.session_state.processed_video_path):
+        # O vídeo anotado é gerado sob demanda, em segundo plano, a partir dos keypoints salvos
+        st.subheader("🎬 Vídeo com esqueleto")
+        chave_video = st.session_state.get("chave_video")
+        status = status_renderizacao(chave_video) if chave_video else None
+        if status and status["estado"] == CONCLUIDA:
+            st.session_state.processed_video_path = status["caminho"]
+
+        if st.session_state.get("processed_video_path") and os.path.exists(st.session_state.processed_video_path):
             with open(st.session_state.processed_video_path, "rb") as f:
                 st.download_button(
                     label="📥 Baixar vídeo com esqueleto",
@@ -342,3 +335,87 @@ with tab4:
                     file_name="video_esqueleto.mp4",
                     mime="video/mp4"
                 )
+        elif not chave_video:
+            st.info("O vídeo anotado precisa do vídeo original; envie-o na aba de upload.")
+        elif status is None or status["estado"] in (CONCLUIDA, ERRO, CANCELADA):
+            if status and status["erro"]:
+                st.error(f"Erro ao gerar o vídeo anotado: {status['erro']}")
+            if st.button("🎬 Gerar vídeo com esqueleto"):
+                iniciar_renderizacao(st.session_state.video_path, pose_data, caminho_video_anotado(chave_video),
+                                     tarefa_id=chave_video)
+                st.rerun()
+        else:
+            st.progress(status["progresso"], text=f"Renderizando vídeo anotado ({status['estado']})...")
+            st.caption("As métricas e gráficos já estão disponíveis enquanto o vídeo é gerado.")
+            if st.button("🔄 Atualizar status"):
+                st.rerun()
+
+with tab5:
+    st.header("📚 Histórico de Análises")
+    postos = valores_distintos("posto")
+    operadores_historico = valores_distintos("operador")
+    col1, col2, col3 = st.columns(3)
+    filtro_postos = col1.multiselect("Postos", postos)
+    filtro_operadores = col2.multiselect("Operadores", operadores_historico)
+    periodo = col3.date_input("Período", value=[])
+    filtros = dict(postos=filtro_postos, operadores=filtro_operadores,
+                   inicio=periodo[0] if len(periodo) > 0 else None, fim=periodo[1] if len(periodo) > 1 else None)
+
+    analises = listar_analises(**filtros)
+    if analises.empty:
+        st.info("Nenhuma análise no histórico. Salve uma análise na aba de métricas ou use "
+                "analise_lote com --historico.")
+    else:
+        rotulos_metricas = {coluna: metrica for metrica, coluna in COLUNAS_METRICAS.items()}
+
+        st.markdown("#### Resumo agregado")
+        agrupamento = st.selectbox("Agrupar por", ["posto", "operador", "mes", "semana", "dia"],
+                             format_func={"posto": "Posto", "operador": "Operador", "mes": "Mês",
+                                          "semana": "Semana", "dia": "Dia"}.get)
+        st.dataframe(agregar(agrupamento, **filtros).rename(columns=rotulos_metricas), hide_index=True)
+
+        st.markdown("#### Tendência por posto")
+        col1, col2 = st.columns(2)
+        periodo_tendencia = col1.selectbox("Período", ["mes", "semana", "dia"],
+                                           format_func={"mes": "Mês", "semana": "Semana", "dia": "Dia"}.get)
+        coluna_tendencia = col2.selectbox("Indicador", ["eventos_por_hora", *COLUNAS_METRICAS.values()],
+                                          format_func=lambda c: rotulos_metricas.get(c, "Eventos por hora"))
+        tendencia = agregar(("posto", periodo_tendencia), **filtros)
+        st.plotly_chart(px.line(tendencia, x=periodo_tendencia, y=coluna_tendencia, color="posto", markers=True,
+                                labels={coluna_tendencia: rotulos_metricas.get(coluna_tendencia, "Eventos por hora")}),
+                        use_container_width=True)
+
+        st.markdown("#### Comparação entre gravações")
+        rotulos = {linha.id: f"#{linha.id} · {linha.posto or '?'} · {linha.operador or '?'} · {linha.data}"
+                   for linha in analises.itertuples()}
+        escolhidas = st.multiselect("Análises", list(rotulos), default=list(rotulos)[:2], format_func=rotulos.get)
+        if escolhidas:
+            st.dataframe(comparar_analises(escolhidas).astype(str))
+            tempos = eventos_por_desvio("id", ids=escolhidas)
+            tempos["análise"] = tempos["id"].map(rotulos)
+            st.plotly_chart(px.bar(tempos, x="desvio", y="tempo_total_s", color="análise", barmode="group",
+                                   labels={"desvio": "Desvio", "tempo_total_s": "Tempo em desvio (s)"}),
+                            use_container_width=True)
+
+        with st.expander("📋 Análises registradas"):
+            st.dataframe(analises.rename(columns=rotulos_metricas), hide_index=True)
+
+
+# Painel de desempenho: onde o tempo foi gasto (E/S, modelo ou pandas)
+with st.sidebar.expander("⚡ Desempenho"):
+    status = status_renderizacao(st.session_state["chave_video"]) if st.session_state.get("chave_video") else None
+    resumos = [("Inferência", st.session_state.get("desempenho_inferencia")),
+               ("Análises desta atualização", desempenho_analise.finalizar().resumo()),
+               ("Vídeo anotado", status["desempenho"] if status else None)]
+    for titulo, resumo in resumos:
+        if not resumo or not resumo["etapas"]:
+            continue
+        detalhes = [f"{resumo['duracao_s']:.2f} s"]
+        if resumo["quadros_por_s"]:
+            detalhes.append(f"{resumo['quadros_por_s']:g} quadros/s")
+        if resumo["pico_rss_mb"]:
+            detalhes.append(f"pico de memória {resumo['pico_rss_mb']:g} MB")
+        st.markdown(f"**{titulo}** — {' · '.join(detalhes)}")
+        st.dataframe(tabela_etapas(resumo), hide_index=True)
+        for nome, fila in resumo["filas"].items():
+            st.caption(f"Fila {nome}: média {fila['media']:g}, máximo {fila['maximo']}")
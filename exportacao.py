@@ -0,0 +1,92 @@
+import os
+
+from desvios import LINHAS_POR_BLOCO, COLUNAS_QUADROS, desvios_em_blocos, desvios_por_minuto, detectar_eventos
+from instrumentacao import medido
+
+ARQUIVO_EVENTOS = "eventos.csv"
+ARQUIVO_MINUTOS = "desvios_por_minuto.csv"
+ARQUIVO_QUADROS = "desvios"  # + .csv ou .parquet
+
+# Formatos da tabela por quadro; parquet exige o pacote pyarrow
+FORMATOS = ("csv", "parquet")
+
+
+def _formato(caminho, formato):
+    formato = formato or os.path.splitext(caminho)[1].lstrip(".").lower() or "csv"
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportação desconhecido: {formato}")
+    return formato
+
+
+def _gravar_csv(blocos, caminho):
+    linhas = 0
+    with open(caminho, "w", encoding="utf-8", newline="") as f:
+        for bloco in blocos:
+            bloco.to_csv(f, header=not linhas, index=False)
+            linhas += len(bloco)
+        if not linhas:
+            f.write(",".join(COLUNAS_QUADROS) + "\n")
+    return linhas
+
+
+def _gravar_parquet(blocos, caminho):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("A exportação em Parquet requer o pacote pyarrow (pip install pyarrow).") from None
+
+    linhas = 0
+    escritor = None
+    try:
+        for bloco in blocos:
+            tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(caminho, tabela.schema)
+            escritor.write_table(tabela)
+            linhas += len(bloco)
+        if escritor is None:
+            schema = pa.schema([("Frame", pa.int64()), ("Tempo (s)", pa.float64()), ("Desvio", pa.string()),
+                                ("Ângulo", pa.float64()), ("Operador", pa.int64())])
+            pq.write_table(schema.empty_table(), caminho)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return linhas
+
+
+@medido("exportacao_quadros")
+def exportar_desvios_por_quadro(pose_data, caminho, formato=None, linhas_por_bloco=LINHAS_POR_BLOCO, **opcoes):
+    """
+    Grava em disco a tabela por quadro de detectar_desvios_com_persistencia, um bloco de
+    linhas_por_bloco linhas de cada vez, sem montar a tabela inteira em memória. formato
+    ("csv" ou "parquet") vem da extensão do caminho quando não informado; opcoes (fps,
+    operador, regras...) são repassadas a desvios.desvios_em_blocos. O arquivo só aparece
+    no caminho depois de completo. Retorna o número de linhas gravadas.
+    """
+    formato = _formato(caminho, formato)
+    temporario = caminho + ".tmp"
+    blocos = desvios_em_blocos(pose_data, linhas_por_bloco, **opcoes)
+    try:
+        linhas = _gravar_csv(blocos, temporario) if formato == "csv" else _gravar_parquet(blocos, temporario)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+    return linhas
+
+
+def exportar_desvios(pose_data, pasta, quadros=None, **opcoes):
+    """
+    Grava na pasta os desvios em formato compacto: eventos.csv (um intervalo por linha) e
+    desvios_por_minuto.csv (agregado por operador, minuto e desvio). Com quadros ("csv" ou
+    "parquet"), grava também a tabela por quadro em blocos. Retorna {tipo: caminho}.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    arquivos = {"eventos": os.path.join(pasta, ARQUIVO_EVENTOS), "minutos": os.path.join(pasta, ARQUIVO_MINUTOS)}
+    detectar_eventos(pose_data, **opcoes).to_csv(arquivos["eventos"], index=False)
+    desvios_por_minuto(pose_data, **opcoes).to_csv(arquivos["minutos"], index=False)
+    if quadros:
+        arquivos["quadros"] = os.path.join(pasta, f"{ARQUIVO_QUADROS}.{_formato('', quadros)}")
+        exportar_desvios_por_quadro(pose_data, arquivos["quadros"], quadros, **opcoes)
+    return arquivos
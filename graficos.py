@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from desvios import contar_quadros_em_desvio, desvios_em_blocos
+from instrumentacao import etapa
+from joint_angles import calcular_angulos
+from pose_store import DEFAULT_FPS, PoseStore, as_keypoint_array, memorizado
+from regras import EVENTO, obter_regras
+
+# Número máximo de pontos por série enviados ao navegador
+PONTOS_ALVO = 2000
+
+# Largura (em graus) das barras dos histogramas de ângulo
+LARGURA_BIN = 2.0
+
+# Articulação -> (nome exibido, cor e traço das linhas de referência) nos gráficos de ângulo
+SERIES_ANGULOS = {
+    "cotovelo_esq": ("Ângulo Cotovelo", "red", "dash"),  # ombro, cotovelo, punho
+    "joelho_esq": ("Ângulo Joelho", "blue", "dot"),  # quadril, joelho, tornozelo
+}
+
+
+def reduzir_min_max(x, y, pontos=PONTOS_ALVO):
+    """
+    Reduz a série (x, y) a cerca de pontos amostras mantendo, em cada intervalo, o mínimo
+    e o máximo (na ordem em que ocorrem), de modo que picos e vales continuam visíveis.
+    Intervalos só com NaN viram um ponto NaN, preservando as lacunas da linha.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=np.float64)
+    if len(y) <= pontos:
+        return x, y
+
+    tamanho = int(np.ceil(len(y) / max(pontos // 2, 1)))
+    n_blocos = int(np.ceil(len(y) / tamanho))
+    blocos = np.full(n_blocos * tamanho, np.nan)
+    blocos[:len(y)] = y
+    blocos = blocos.reshape(n_blocos, tamanho)
+
+    vazios = np.isnan(blocos).all(axis=1)
+    inicio = np.arange(n_blocos) * tamanho
+    minimos = inicio + np.argmin(np.where(np.isnan(blocos), np.inf, blocos), axis=1)
+    maximos = inicio + np.argmax(np.where(np.isnan(blocos), -np.inf, blocos), axis=1)
+
+    indices = np.sort(np.stack([minimos, maximos], axis=1), axis=1)
+    indices[vazios] = inicio[vazios, None]
+    indices = np.unique(np.minimum(indices.ravel(), len(y) - 1))
+    return x[indices], y[indices]
+
+
+def histograma(valores, largura=LARGURA_BIN, intervalo=(0, 180)):
+    """Contagens de um histograma calculado no servidor: (centros dos bins, contagens)."""
+    valores = np.asarray(valores, dtype=np.float64)
+    bordas = np.arange(intervalo[0], intervalo[1] + largura, largura)
+    contagens, bordas = np.histogram(valores[np.isfinite(valores)], bins=bordas)
+    return (bordas[:-1] + bordas[1:]) / 2, contagens
+
+
+def limites_grafico(regras=None):
+    """
+    Linhas de referência (ângulo, cor, traço, texto) das séries exibidas: os limites e
+    extremos das regras de evento de cada articulação.
+    """
+    regras = obter_regras(regras).aplicacao(EVENTO)
+    linhas = []
+    for articulacao, (nome, cor, traco) in SERIES_ANGULOS.items():
+        angulos = regras.limites(articulacao)
+        for i, angulo in enumerate(angulos):
+            posicao = ""
+            if len(angulos) > 1 and i in (0, len(angulos) - 1):
+                posicao = " Inferior" if i == 0 else " Superior"
+            linhas.append((angulo, cor, traco, f"Limite{posicao} {nome.replace('Ângulo ', '')} ({angulo:g}°)"))
+    return linhas
+
+
+def _series_angulos(pose_data, operador):
+    angulos = calcular_angulos(as_keypoint_array(pose_data, operador), list(SERIES_ANGULOS))
+    tempo = pose_data.timestamps if isinstance(pose_data, PoseStore) else np.arange(len(pose_data)) / DEFAULT_FPS
+    return tempo, {nome: angulos[articulacao] for articulacao, (nome, _, _) in SERIES_ANGULOS.items()}
+
+
+def figura_evolucao(tempo, series, limites=(), pontos=PONTOS_ALVO):
+    """Linhas de ângulo ao longo do tempo, reduzidas por min/max, com as linhas de referência."""
+    fig = go.Figure()
+    for nome, valores in series.items():
+        x, y = reduzir_min_max(tempo, valores, pontos)
+        fig.add_trace(go.Scattergl(x=x, y=np.round(y, 2), mode="lines", name=nome))
+    for angulo, cor, traco, texto in limites:
+        posicao = "top left" if cor == "red" else "bottom left"
+        fig.add_hline(y=angulo, line=dict(color=cor, dash=traco), annotation_text=texto,
+                      annotation_position=posicao)
+    fig.update_layout(title="Evolução dos Ângulos com Limites Ergonômicos",
+                      xaxis_title="Tempo (s)", yaxis_title="Ângulo (graus)")
+    return fig
+
+
+def figura_histograma(series, limites=()):
+    """Histogramas dos ângulos com as contagens já calculadas (barras), e as linhas de referência."""
+    fig = go.Figure()
+    for nome, valores in series.items():
+        centros, contagens = histograma(valores)
+        fig.add_trace(go.Bar(x=centros, y=contagens, width=LARGURA_BIN, name=nome.replace("Ângulo ", ""),
+                             opacity=0.6))
+    for angulo, cor, traco, texto in limites:
+        fig.add_vline(x=angulo, line=dict(color=cor, dash=traco), annotation_text=texto.rsplit(" (", 1)[0],
+                      annotation_position="top right")
+    fig.update_layout(barmode="overlay", bargap=0,
+                      title="Distribuição dos Ângulos Articulares com Limites Ergonômicos",
+                      xaxis_title="Ângulo (graus)", yaxis_title="Frequência")
+    return fig
+
+
+def figura_desvios(df_desvios, pontos=PONTOS_ALVO):
+    """Dispersão ângulo x tempo dos quadros em desvio, reduzida por min/max em cada tipo."""
+    fig = go.Figure()
+    for tipo, grupo in df_desvios.groupby("Desvio", sort=True):
+        grupo = grupo.sort_values("Tempo (s)")
+        x, y = reduzir_min_max(grupo["Tempo (s)"].to_numpy(), grupo["Ângulo"].to_numpy(), pontos)
+        fig.add_trace(go.Scattergl(x=x, y=y, mode="markers", name=tipo))
+    fig.update_layout(title="Desvios Detectados: Ângulo vs Tempo", xaxis_title="Tempo (s)", yaxis_title="Ângulo",
+                      legend_title_text="Desvio")
+    return fig
+
+
+def figuras_angulos(pose_data, operador=None, regras=None):
+    """
+    (evolução, histograma) dos ângulos do operador, com as linhas de referência das
+    regras, montadas uma vez por dataset, operador e conjunto de regras. O tamanho das
+    figuras não depende da duração do vídeo.
+    """
+    regras = obter_regras(regras)
+
+    def montar():
+        tempo, series = _series_angulos(pose_data, operador)
+        with etapa("graficos", len(tempo)):
+            limites = limites_grafico(regras)
+            return figura_evolucao(tempo, series, limites), figura_histograma(series, limites)
+
+    return memorizado(pose_data, ("figuras_angulos", operador, regras), montar)
+
+
+def reduzir_desvios_em_blocos(blocos, pontos=PONTOS_ALVO):
+    """
+    Reduz por min/max, bloco a bloco, as linhas (Tempo (s), Desvio, Ângulo) da tabela por
+    quadro gerada em blocos por desvios.desvios_em_blocos: só as amostras reduzidas de
+    cada bloco ficam em memória. Retorna a tabela reduzida, pronta para figura_desvios.
+    """
+    reduzidos = []
+    for bloco in blocos:
+        for tipo, grupo in bloco.groupby("Desvio", sort=False):
+            grupo = grupo.sort_values("Tempo (s)")
+            x, y = reduzir_min_max(grupo["Tempo (s)"].to_numpy(), grupo["Ângulo"].to_numpy(), pontos)
+            reduzidos.append(pd.DataFrame({"Tempo (s)": x, "Desvio": tipo, "Ângulo": y}))
+    if not reduzidos:
+        return pd.DataFrame(columns=["Tempo (s)", "Desvio", "Ângulo"])
+    return pd.concat(reduzidos, ignore_index=True)
+
+
+def figura_desvios_dataset(pose_data, operador=None, regras=None):
+    """
+    Dispersão dos desvios persistentes do operador, montada uma vez por dataset, operador
+    e regras a partir da tabela por quadro gerada e reduzida em blocos (sem montá-la inteira).
+    """
+    regras = obter_regras(regras)
+    def montar():
+        linhas = contar_quadros_em_desvio(pose_data, operador=operador, regras=regras)
+        with etapa("graficos", linhas):
+            blocos = desvios_em_blocos(pose_data, operador=operador, regras=regras)
+            return figura_desvios(reduzir_desvios_em_blocos(blocos))
+
+    return memorizado(pose_data, ("figura_desvios", operador, regras), montar)
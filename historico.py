@@ -0,0 +1,243 @@
+"""
+Histórico local de resultados (SQLite): métricas de cada vídeo analisado e os intervalos
+dos eventos de desvio, indexados por posto de trabalho, operador e data. As consultas
+leem só esses resumos, nunca os dados de pose nem os vídeos, e servem para comparar
+gravações e acompanhar tendências (ex.: um posto antes e depois de uma mudança de layout).
+"""
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import pandas as pd
+
+from pose_dataset import valor_nativo
+
+ARQUIVO_HISTORICO = "ergoview_historico.sqlite"
+
+# Variável de ambiente que aponta para outro arquivo de histórico (vale também para processos filhos)
+VARIAVEL_HISTORICO = "ERGOVIEW_HISTORICO"
+
+# Versão do esquema do banco; bancos de outra versão não são abertos
+VERSAO_HISTORICO = 1
+
+# Métrica de analisar_metricas_ergonomicas -> coluna numérica da tabela analises
+COLUNAS_METRICAS = {
+    "Posturas Inadequadas": "posturas_inadequadas",
+    "Movimentos Repetitivos": "movimentos_repetitivos",
+    "Ciclos por Minuto": "ciclos_por_minuto",
+    "Posturas Forçadas (>90s)": "posturas_forcadas",
+    "Pausas/Ritmo de Trabalho": "pausas",
+    "Mobiliário/Layout": "mobiliario_layout",
+    "Ângulos Articulares Extremos": "angulos_extremos",
+    "Posturas Estáticas (>4s)": "posturas_estaticas",
+    "Postura Sentada": "postura_sentada",
+}
+
+# Agrupamentos aceitos por agregar(); período vem da data da gravação
+AGRUPAMENTOS = {
+    "posto": "a.posto",
+    "operador": "a.operador",
+    "dia": "a.data",
+    "semana": "strftime('%Y-S%W', a.data)",
+    "mes": "strftime('%Y-%m', a.data)",
+}
+
+_ESQUEMA = f"""
+CREATE TABLE IF NOT EXISTS analises (
+    id INTEGER PRIMARY KEY,
+    posto TEXT,
+    operador TEXT,
+    data TEXT,
+    video TEXT,
+    video_hash TEXT,
+    trilha INTEGER,
+    duracao_s REAL,
+    regras TEXT,
+    risco TEXT,
+    {", ".join(f"{coluna} REAL" for coluna in COLUNAS_METRICAS.values())},
+    metricas TEXT,
+    registrada_em TEXT
+);
+CREATE TABLE IF NOT EXISTS eventos (
+    analise_id INTEGER NOT NULL REFERENCES analises(id) ON DELETE CASCADE,
+    trilha INTEGER,
+    desvio TEXT,
+    inicio_s REAL,
+    fim_s REAL,
+    duracao_s REAL,
+    angulo_min REAL,
+    angulo_max REAL,
+    angulo_medio REAL
+);
+CREATE INDEX IF NOT EXISTS analises_posto ON analises (posto, data);
+CREATE INDEX IF NOT EXISTS analises_operador ON analises (operador, data);
+CREATE INDEX IF NOT EXISTS analises_data ON analises (data);
+CREATE INDEX IF NOT EXISTS analises_video ON analises (video_hash, posto, operador, trilha);
+CREATE INDEX IF NOT EXISTS eventos_analise ON eventos (analise_id, desvio);
+"""
+
+
+def conectar(caminho=None):
+    """
+    Abre (criando, se preciso) o banco do histórico: caminho, o arquivo da variável
+    ERGOVIEW_HISTORICO ou ARQUIVO_HISTORICO. Vários processos podem gravar ao mesmo tempo:
+    o modo WAL e o tempo de espera evitam erros de banco bloqueado.
+    """
+    caminho = caminho or os.environ.get(VARIAVEL_HISTORICO) or ARQUIVO_HISTORICO
+    conexao = sqlite3.connect(caminho, timeout=30)
+    conexao.execute("PRAGMA foreign_keys = ON")
+    conexao.execute("PRAGMA journal_mode = WAL")
+    versao = conexao.execute("PRAGMA user_version").fetchone()[0]
+    if versao == 0:
+        with conexao:
+            conexao.executescript(_ESQUEMA)
+            conexao.execute(f"PRAGMA user_version = {VERSAO_HISTORICO}")
+    elif versao != VERSAO_HISTORICO:
+        conexao.close()
+        raise ValueError(f"Versão de histórico não suportada em {caminho}: {versao}")
+    return conexao
+
+
+def registrar_analise(metricas, eventos, posto=None, operador=None, data=None, video=None, video_hash=None,
+                      trilha=None, duracao_s=None, regras=None, caminho=None):
+    """
+    Grava as métricas de um vídeo (dicionário de analisar_metricas_ergonomicas) e seus
+    eventos (DataFrame de detectar_eventos) e retorna o id da análise. data é a data da
+    gravação (date, datetime ou texto AAAA-MM-DD; padrão: hoje). Uma análise anterior do
+    mesmo vídeo, posto, operador e trilha é substituída.
+    """
+    data = str(data or time.strftime("%Y-%m-%d"))[:10]
+    colunas = ["posto", "operador", "data", "video", "video_hash", "trilha", "duracao_s", "regras", "risco",
+               *COLUNAS_METRICAS.values(), "metricas", "registrada_em"]
+    valores = [posto, operador, data, video, video_hash, valor_nativo(trilha), valor_nativo(duracao_s), regras,
+               metricas.get("Risco Postural"), *[valor_nativo(metricas.get(m)) for m in COLUNAS_METRICAS],
+               json.dumps(metricas, ensure_ascii=False, default=valor_nativo),
+               time.strftime("%Y-%m-%dT%H:%M:%S")]
+
+    linhas_eventos = zip(eventos["Operador"].tolist(), eventos["Desvio"].tolist(), eventos["Início (s)"].tolist(),
+                         eventos["Fim (s)"].tolist(), eventos["Duração (s)"].tolist(),
+                         eventos["Ângulo mín"].tolist(), eventos["Ângulo máx"].tolist(),
+                         eventos["Ângulo médio"].tolist())
+    with closing(conectar(caminho)) as conexao, conexao:
+        if video_hash:
+            conexao.execute("DELETE FROM analises WHERE video_hash = ? AND posto IS ? AND operador IS ? "
+                            "AND trilha IS ?", (video_hash, posto, operador, valor_nativo(trilha)))
+        cursor = conexao.execute(f"INSERT INTO analises ({', '.join(colunas)}) "
+                                 f"VALUES ({', '.join('?' * len(colunas))})", valores)
+        analise_id = cursor.lastrowid
+        conexao.executemany("INSERT INTO eventos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            ((analise_id, *linha) for linha in linhas_eventos))
+    return analise_id
+
+
+def remover_analise(analise_id, caminho=None):
+    with closing(conectar(caminho)) as conexao, conexao:
+        conexao.execute("DELETE FROM analises WHERE id = ?", (int(analise_id),))
+
+
+def _filtros(postos=None, operadores=None, inicio=None, fim=None, ids=None):
+    """Cláusula WHERE (sobre analises a) e parâmetros dos filtros informados."""
+    condicoes, parametros = [], []
+    for coluna, valores in (("a.posto", postos), ("a.operador", operadores), ("a.id", ids)):
+        if valores:
+            valores = [valores] if isinstance(valores, (str, int)) else list(valores)
+            condicoes.append(f"{coluna} IN ({', '.join('?' * len(valores))})")
+            parametros.extend(valor_nativo(valor) for valor in valores)
+    if inicio:
+        condicoes.append("a.data >= ?")
+        parametros.append(str(inicio)[:10])
+    if fim:
+        condicoes.append("a.data <= ?")
+        parametros.append(str(fim)[:10])
+    return (" WHERE " + " AND ".join(condicoes) if condicoes else ""), parametros
+
+
+def _consultar(sql, parametros, caminho):
+    with closing(conectar(caminho)) as conexao:
+        return pd.read_sql_query(sql, conexao, params=parametros)
+
+
+def valores_distintos(coluna, caminho=None):
+    """Postos ou operadores ("posto" ou "operador") já registrados, em ordem."""
+    if coluna not in ("posto", "operador"):
+        raise ValueError(f"Coluna desconhecida: {coluna}")
+    tabela = _consultar(f"SELECT DISTINCT {coluna} FROM analises WHERE {coluna} IS NOT NULL ORDER BY {coluna}",
+                        [], caminho)
+    return tabela[coluna].tolist()
+
+
+def listar_analises(postos=None, operadores=None, inicio=None, fim=None, ids=None, caminho=None):
+    """Análises registradas (uma linha por vídeo, sem os eventos), da mais recente para a mais antiga."""
+    where, parametros = _filtros(postos, operadores, inicio, fim, ids)
+    return _consultar(f"SELECT a.id, a.posto, a.operador, a.data, a.video, a.duracao_s, a.risco, "
+                      f"{', '.join(f'a.{c}' for c in COLUNAS_METRICAS.values())} "
+                      f"FROM analises a{where} ORDER BY a.data DESC, a.id DESC", parametros, caminho)
+
+
+def agregar(por=("posto",), postos=None, operadores=None, inicio=None, fim=None, caminho=None):
+    """
+    Agregado das análises por uma ou mais chaves de AGRUPAMENTOS (posto, operador, dia,
+    semana, mes): número de vídeos, horas gravadas, média de cada métrica, vídeos com
+    risco alto e eventos de desvio por hora gravada.
+    """
+    por = [por] if isinstance(por, str) else list(por)
+    desconhecidos = [chave for chave in por if chave not in AGRUPAMENTOS]
+    if desconhecidos:
+        raise ValueError(f"Agrupamento desconhecido: {', '.join(desconhecidos)}")
+    where, parametros = _filtros(postos, operadores, inicio, fim)
+    chaves = ", ".join(f"{AGRUPAMENTOS[chave]} AS {chave}" for chave in por)
+    grupos = ", ".join(str(i + 1) for i in range(len(por)))
+    medias = ", ".join(f"ROUND(AVG(a.{coluna}), 2) AS {coluna}" for coluna in COLUNAS_METRICAS.values())
+    return _consultar(
+        f"SELECT {chaves}, COUNT(*) AS videos, ROUND(SUM(a.duracao_s) / 3600.0, 2) AS horas, {medias}, "
+        f"SUM(a.risco = 'Alto') AS risco_alto, "
+        f"ROUND(SUM(COALESCE(e.eventos, 0)) * 3600.0 / NULLIF(SUM(a.duracao_s), 0), 2) AS eventos_por_hora "
+        f"FROM analises a LEFT JOIN (SELECT analise_id, COUNT(*) AS eventos FROM eventos GROUP BY analise_id) e "
+        f"ON e.analise_id = a.id{where} GROUP BY {grupos} ORDER BY {grupos}", parametros, caminho)
+
+
+def eventos_por_desvio(por=("posto",), postos=None, operadores=None, inicio=None, fim=None, ids=None,
+                       caminho=None):
+    """
+    Eventos agregados por desvio e pelas chaves de AGRUPAMENTOS (ou "id", por análise):
+    quantidade, tempo total e médio em desvio e ângulo médio.
+    """
+    por = [por] if isinstance(por, str) else list(por)
+    agrupamentos = dict(AGRUPAMENTOS, id="a.id")
+    desconhecidos = [chave for chave in por if chave not in agrupamentos]
+    if desconhecidos:
+        raise ValueError(f"Agrupamento desconhecido: {', '.join(desconhecidos)}")
+    where, parametros = _filtros(postos, operadores, inicio, fim, ids)
+    chaves = "".join(f"{agrupamentos[chave]} AS {chave}, " for chave in por)
+    grupos = ", ".join(str(i + 1) for i in range(len(por) + 1))
+    return _consultar(
+        f"SELECT {chaves}e.desvio AS desvio, COUNT(*) AS eventos, ROUND(SUM(e.duracao_s), 2) AS tempo_total_s, "
+        f"ROUND(AVG(e.duracao_s), 2) AS duracao_media_s, ROUND(AVG(e.angulo_medio), 2) AS angulo_medio "
+        f"FROM eventos e JOIN analises a ON a.id = e.analise_id{where} GROUP BY {grupos} ORDER BY {grupos}",
+        parametros, caminho)
+
+
+def comparar_analises(ids, caminho=None):
+    """
+    Métricas das análises lado a lado: uma linha por métrica (mais eventos e tempo em
+    desvio de cada tipo) e uma coluna por análise, rotulada com posto, data e id.
+    """
+    ids = [int(i) for i in ids]
+    analises = listar_analises(ids=ids, caminho=caminho).set_index("id").reindex(ids).dropna(how="all")
+    if analises.empty:
+        return pd.DataFrame()
+    rotulos = {i: f"{linha.posto or '?'} · {linha.data} · #{i}" for i, linha in analises.iterrows()}
+
+    tabela = analises[["duracao_s", "risco", *COLUNAS_METRICAS.values()]].rename(
+        columns={"duracao_s": "Duração (s)", "risco": "Risco Postural",
+                 **{coluna: metrica for metrica, coluna in COLUNAS_METRICAS.items()}}).T
+    eventos = eventos_por_desvio("id", ids=list(rotulos), caminho=caminho)
+    if not eventos.empty:
+        contagem = eventos.pivot(index="desvio", columns="id", values="eventos").fillna(0).astype(int)
+        tempo = eventos.pivot(index="desvio", columns="id", values="tempo_total_s").fillna(0.0)
+        contagem.index = [f"Eventos: {desvio}" for desvio in contagem.index]
+        tempo.index = [f"Tempo em desvio (s): {desvio}" for desvio in tempo.index]
+        tabela = pd.concat([tabela, contagem, tempo]).fillna(0)
+    return tabela.rename(columns=rotulos)
@@ -0,0 +1,175 @@
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+# Arquivo JSON Lines onde cada execução medida é acrescentada (vale também para processos filhos)
+VARIAVEL_LOG = "ERGOVIEW_LOG_DESEMPENHO"
+
+# Instrumentação corrente, usada pelas etapas de análise (veja etapa())
+_atual = contextvars.ContextVar("desempenho", default=None)
+
+
+def pico_rss_mb():
+    """Pico de memória residente do processo em MB (None onde o módulo resource não existe)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+
+
+class Desempenho:
+    """
+    Medições de uma execução: tempo acumulado, chamadas e quadros de cada etapa,
+    profundidade das filas e pico de memória. Pode ser usado por várias threads. Etapas
+    que rodam em paralelo (decodificação e inferência, por exemplo) se sobrepõem, então a
+    soma dos tempos pode passar da duração da execução.
+    """
+
+    def __init__(self, nome=None):
+        self.nome = nome
+        self.quadros = 0
+        self.inicio = time.time()
+        self._relogio = time.perf_counter()
+        self._duracao = None
+        self.etapas = {}  # nome -> [segundos, chamadas, quadros]
+        self.filas = {}  # nome -> [soma, amostras, máximo]
+        self._lock = threading.Lock()
+
+    def registrar(self, nome, segundos, quadros=0, chamadas=1):
+        with self._lock:
+            etapa = self.etapas.setdefault(nome, [0.0, 0, 0])
+            etapa[0] += segundos
+            etapa[1] += chamadas
+            etapa[2] += quadros
+
+    @contextlib.contextmanager
+    def etapa(self, nome, quadros=0):
+        """Mede o bloco como uma chamada da etapa nome, que processou quadros quadros."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nome, time.perf_counter() - inicio, quadros)
+
+    def fila(self, nome, tamanho):
+        """Registra uma amostra da profundidade de uma fila."""
+        with self._lock:
+            fila = self.filas.setdefault(nome, [0, 0, 0])
+            fila[0] += tamanho
+            fila[1] += 1
+            fila[2] = max(fila[2], tamanho)
+
+    def incorporar(self, resumo):
+        """Soma as medições de outro resumo (ex.: de um processo filho) às desta execução."""
+        self.quadros += resumo["quadros"]
+        for nome, etapa in resumo["etapas"].items():
+            self.registrar(nome, etapa["tempo_s"], etapa["quadros"], etapa["chamadas"])
+        with self._lock:
+            for nome, dados in resumo["filas"].items():
+                fila = self.filas.setdefault(nome, [0, 0, 0])
+                fila[0] += dados["media"] * dados["amostras"]
+                fila[1] += dados["amostras"]
+                fila[2] = max(fila[2], dados["maximo"])
+
+    def finalizar(self):
+        """Fixa a duração da execução (sem isso, a duração é medida até o momento do resumo)."""
+        self._duracao = time.perf_counter() - self._relogio
+        return self
+
+    def ativar(self):
+        """
+        Torna esta a instrumentação corrente do contexto (thread) atual; as etapas de
+        análise passam a registrar aqui. Retorna o token para desativar().
+        """
+        return _atual.set(self)
+
+    def desativar(self, token):
+        _atual.reset(token)
+
+    @contextlib.contextmanager
+    def ativa(self):
+        """ativar() limitado a um bloco with."""
+        token = self.ativar()
+        try:
+            yield self
+        finally:
+            self.desativar(token)
+
+    def resumo(self):
+        """Dicionário serializável em JSON com todas as medições."""
+        duracao = self._duracao if self._duracao is not None else time.perf_counter() - self._relogio
+        with self._lock:
+            etapas = {nome: {"tempo_s": round(segundos, 4), "chamadas": chamadas, "quadros": quadros,
+                             "quadros_por_s": round(quadros / segundos, 1) if quadros and segundos > 0 else None}
+                      for nome, (segundos, chamadas, quadros) in self.etapas.items()}
+            filas = {nome: {"media": round(soma / amostras, 2) if amostras else 0.0, "maximo": maximo,
+                            "amostras": amostras}
+                     for nome, (soma, amostras, maximo) in self.filas.items()}
+        return {
+            "nome": self.nome,
+            "inicio": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.inicio)),
+            "duracao_s": round(duracao, 3),
+            "quadros": self.quadros,
+            "quadros_por_s": round(self.quadros / duracao, 1) if self.quadros and duracao > 0 else None,
+            "pico_rss_mb": pico_rss_mb(),
+            "etapas": etapas,
+            "filas": filas,
+        }
+
+    def gravar(self, caminho=None):
+        """
+        Acrescenta o resumo, em uma linha JSON, ao arquivo caminho (padrão: o da variável
+        ERGOVIEW_LOG_DESEMPENHO). Sem arquivo, não grava nada. Retorna o caminho usado.
+        """
+        caminho = caminho or os.environ.get(VARIAVEL_LOG)
+        if not caminho:
+            return None
+        linha = json.dumps(self.resumo(), ensure_ascii=False)
+        with self._lock, open(caminho, "a", encoding="utf-8") as f:
+            f.write(linha + "\n")
+        return caminho
+
+
+def tabela_etapas(resumo):
+    """Etapas de um resumo em um DataFrame, da mais demorada para a mais rápida."""
+    tabela = pd.DataFrame([{"Etapa": nome, "Tempo (s)": etapa["tempo_s"], "Chamadas": etapa["chamadas"],
+                            "Quadros": etapa["quadros"], "Quadros/s": etapa["quadros_por_s"]}
+                           for nome, etapa in resumo["etapas"].items()],
+                          columns=["Etapa", "Tempo (s)", "Chamadas", "Quadros", "Quadros/s"])
+    return tabela.sort_values("Tempo (s)", ascending=False, ignore_index=True)
+
+
+def atual():
+    """Instrumentação corrente do contexto, ou None."""
+    return _atual.get()
+
+
+@contextlib.contextmanager
+def etapa(nome, quadros=0):
+    """Mede o bloco na instrumentação corrente; sem nenhuma ativa, não mede nada."""
+    desempenho = _atual.get()
+    if desempenho is None:
+        yield
+        return
+    with desempenho.etapa(nome, quadros):
+        yield
+
+
+def medido(nome):
+    """Decorador: cada chamada da função é medida como uma chamada da etapa nome (veja etapa())."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            with etapa(nome):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorador
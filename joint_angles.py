@@ -0,0 +1,72 @@
+import numpy as np
+
+# Índices dos keypoints no formato COCO (YOLO Pose)
+OMBRO_ESQ, OMBRO_DIR = 5, 6
+COTOVELO_ESQ, COTOVELO_DIR = 7, 8
+PUNHO_ESQ, PUNHO_DIR = 9, 10
+QUADRIL_ESQ, QUADRIL_DIR = 11, 12
+JOELHO_ESQ, JOELHO_DIR = 13, 14
+TORNOZELO_ESQ, TORNOZELO_DIR = 15, 16
+
+# Cada articulação é um triplo (a, b, c) com o ângulo medido no vértice b.
+# Um ponto pode ser um índice de keypoint ou uma tupla de índices (usa-se o ponto médio).
+TRIPLETS = {
+    "cotovelo_esq": (OMBRO_ESQ, COTOVELO_ESQ, PUNHO_ESQ),
+    "cotovelo_dir": (OMBRO_DIR, COTOVELO_DIR, PUNHO_DIR),
+    "joelho_esq": (QUADRIL_ESQ, JOELHO_ESQ, TORNOZELO_ESQ),
+    "joelho_dir": (QUADRIL_DIR, JOELHO_DIR, TORNOZELO_DIR),
+    "tronco_esq": ((OMBRO_ESQ, OMBRO_DIR), (QUADRIL_ESQ, QUADRIL_DIR), JOELHO_ESQ),
+    "tronco_dir": ((OMBRO_ESQ, OMBRO_DIR), (QUADRIL_ESQ, QUADRIL_DIR), JOELHO_DIR),
+}
+
+# Keypoints com confiança abaixo deste valor são tratados como ausentes
+MIN_CONFIDENCE = 0.25
+
+
+def _as_points(keypoints):
+    """Garante um array float (..., K, 3); sem coluna de confiança, assume confiança 1."""
+    keypoints = np.asarray(keypoints, dtype=np.float64)
+    if keypoints.shape[-1] == 2:
+        conf = np.ones(keypoints.shape[:-1] + (1,))
+        keypoints = np.concatenate([keypoints, conf], axis=-1)
+    return keypoints
+
+
+def calcular_angulos(keypoints, articulacoes=None, min_confidence=MIN_CONFIDENCE, triplets=None):
+    """
+    Calcula, de uma só vez para todos os quadros, os ângulos (em graus) das articulações pedidas.
+
+    keypoints: array (..., 17, 2) ou (..., 17, 3) com [x, y, confiança]
+    articulacoes: nomes de TRIPLETS (padrão: todas) ou de triplets
+    Retorna um dicionário nome -> array (...) de ângulos; pontos ausentes, com
+    confiança baixa ou segmentos de comprimento zero resultam em NaN.
+    """
+    triplets = TRIPLETS if triplets is None else triplets
+    articulacoes = list(triplets) if articulacoes is None else list(articulacoes)
+    keypoints = _as_points(keypoints)
+
+    xy = keypoints[..., :2].copy()
+    conf = keypoints[..., 2]
+    xy[~(conf >= min_confidence)] = np.nan
+
+    # Cada ponto (simples ou médio) é calculado uma única vez, mesmo se usado em vários triplos
+    pontos = {}
+
+    def ponto(spec):
+        if spec not in pontos:
+            if isinstance(spec, tuple):
+                pontos[spec] = xy[..., list(spec), :].mean(axis=-2)
+            else:
+                pontos[spec] = xy[..., spec, :]
+        return pontos[spec]
+
+    angulos = {}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for nome in articulacoes:
+            a, b, c = (ponto(spec) for spec in triplets[nome])
+            ba = a - b
+            bc = c - b
+            norma = np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1)
+            cosseno = np.einsum("...i,...i->...", ba, bc) / np.where(norma > 0, norma, np.nan)
+            angulos[nome] = np.degrees(np.arccos(np.clip(cosseno, -1.0, 1.0)))
+    return angulos
@@ -0,0 +1,102 @@
+import os
+import threading
+
+import numpy as np
+
+# Tamanhos disponíveis do YOLO11 Pose, do mais leve ao mais preciso
+MODEL_SIZES = ("n", "s", "m", "l", "x")
+
+# Backend -> sufixo do arquivo (ou pasta) de pesos. Os backends exportados rodam na CPU
+# sem PyTorch e precisam existir localmente (veja export_model)
+BACKENDS = {
+    "pytorch": ".pt",
+    "onnx": ".onnx",
+    "openvino": "_openvino_model",
+}
+
+DEFAULT_IMGSZ = 640
+
+
+def model_path_for(size="n", backend="pytorch"):
+    """Caminho dos pesos do YOLO11 Pose para o tamanho e o backend pedidos."""
+    if size not in MODEL_SIZES:
+        raise ValueError(f"Tamanho de modelo desconhecido: {size}")
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend desconhecido: {backend}")
+    return f"yolo11{size}-pose{BACKENDS[backend]}"
+
+
+MODEL_PATH = model_path_for("n")
+
+
+class PoseModel:
+    """
+    Modelo de pose carregado uma única vez por processo. Chamado com uma lista de quadros
+    BGR, retorna os resultados do YOLO; chamadas concorrentes (várias sessões) são
+    serializadas, pois o preditor do Ultralytics não é seguro entre threads.
+    """
+
+    def __init__(self, yolo, path, imgsz=None):
+        self.yolo = yolo
+        self.path = path
+        self.imgsz = imgsz
+        self._lock = threading.Lock()
+
+    def __call__(self, frames):
+        with self._lock:
+            if self.imgsz:
+                return self.yolo(frames, imgsz=self.imgsz, verbose=False)
+            return self.yolo(frames, verbose=False)
+
+    def warmup(self):
+        """Inferência em um quadro vazio para inicializar o backend antes do primeiro vídeo."""
+        lado = self.imgsz or DEFAULT_IMGSZ
+        self([np.zeros((lado, lado, 3), dtype=np.uint8)])
+
+
+def _ensure_weights(model_path):
+    """Baixa pesos PyTorch ausentes; backends exportados (ONNX/OpenVINO) precisam existir localmente."""
+    if os.path.exists(model_path):
+        return
+    if not model_path.endswith(BACKENDS["pytorch"]):
+        raise FileNotFoundError(f"Modelo exportado não encontrado: {model_path}. Gere-o com export_model().")
+    from ultralytics.utils.downloads import attempt_download_asset
+    attempt_download_asset(model_path)
+
+
+# (caminho absoluto, imgsz) -> PoseModel
+_models = {}
+_models_lock = threading.Lock()
+
+
+def load_model(model_path=MODEL_PATH, imgsz=None, warmup=True):
+    """
+    Retorna o PoseModel do caminho pedido, carregando-o (e aquecendo-o) só na primeira vez.
+    """
+    key = (os.path.abspath(model_path), imgsz)
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            _ensure_weights(model_path)
+            from ultralytics import YOLO
+            model = PoseModel(YOLO(model_path, task="pose"), model_path, imgsz)
+            if warmup:
+                model.warmup()
+            _models[key] = model
+    return model
+
+
+def export_model(size="n", backend="onnx", imgsz=DEFAULT_IMGSZ):
+    """Exporta os pesos PyTorch do tamanho pedido para um backend de CPU e retorna o caminho gerado."""
+    model_path = model_path_for(size)
+    if backend == "pytorch":
+        return model_path
+    _ensure_weights(model_path)
+    from ultralytics import YOLO
+    return YOLO(model_path).export(format=backend, imgsz=imgsz)
+
+
+def clear_models():
+    """Descarta os modelos carregados (libera memória; o próximo uso carrega de novo)."""
+    with _models_lock:
+        _models.clear()
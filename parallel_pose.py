@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from instrumentacao import Desempenho, atual
+from pose_store import PoseStore
+from suavizacao import preprocessar
+from tracking import associar_trilhas
+from yolo_pose_analysis import read_video_info, run_pose_estimation
+
+# Linhas na borda de cada trecho usadas para unir as trilhas entre trechos vizinhos
+JANELA_COSTURA = 30
+
+
+def dividir_trechos(total_frames, n_trechos):
+    """Divide [0, total_frames) em até n_trechos intervalos (início, fim) de tamanhos parecidos."""
+    limites = np.linspace(0, total_frames, max(int(n_trechos), 1) + 1).round().astype(int)
+    return [(int(inicio), int(fim)) for inicio, fim in zip(limites[:-1], limites[1:]) if fim > inicio]
+
+
+def _processar_trecho(video_path, inicio, fim, threads, parametros):
+    """
+    Executado no processo trabalhador: carrega o próprio modelo e processa um trecho.
+    Retorna (pose_data, resumo das medições do trecho).
+    """
+    import torch
+    torch.set_num_threads(threads)
+    desempenho = Desempenho()
+    pose_data, _ = run_pose_estimation(video_path, start_frame=inicio, end_frame=fim, desempenho=desempenho,
+                                       **parametros)
+    return pose_data, desempenho.resumo()
+
+
+def _poses_de_borda(pose_data, final, janela=JANELA_COSTURA):
+    """
+    Pose de cada trilha vista nas janela linhas do início (ou do fim) do trecho: a primeira
+    aparição no início, a última no fim. Retorna (pessoas (n, 17, 3), track_ids (n,)).
+    """
+    linhas = slice(max(pose_data.n_frames - janela, 0), None) if final else slice(0, janela)
+    keypoints, track_ids = pose_data.keypoints[linhas], pose_data.track_ids[linhas]
+    linha, vaga = np.nonzero(track_ids >= 0)
+    if final:
+        linha, vaga = linha[::-1], vaga[::-1]
+    trilhas, primeira = np.unique(track_ids[linha, vaga], return_index=True)
+    return keypoints[linha[primeira], vaga[primeira]], trilhas
+
+
+def costurar_trilhas(trechos, janela=JANELA_COSTURA):
+    """
+    Unifica os ids de trilha de PoseStores de trechos consecutivos (alterando-os no lugar).
+    As trilhas do início de cada trecho são associadas às do fim do trecho anterior pelo
+    mesmo critério do rastreador; as demais recebem ids novos, sem repetir os anteriores.
+    """
+    proximo_id = 0
+    anterior = None
+    for pose_data in trechos:
+        mapa = {}
+        if anterior is not None:
+            mapa = associar_trilhas(*_poses_de_borda(pose_data, False, janela),
+                                    *_poses_de_borda(anterior, True, janela))
+        for trilha in np.unique(pose_data.track_ids[pose_data.valid]).tolist():
+            if trilha not in mapa:
+                mapa[trilha] = proximo_id
+                proximo_id += 1
+        pose_data.relabel_tracks(mapa)
+        anterior = pose_data
+    return trechos
+
+
+def run_pose_estimation_parallel(video_path, workers=None, segments=None, progress_callback=None, desempenho=None,
+                                 **parametros):
+    """
+    Versão paralela de run_pose_estimation para vídeos longos. O vídeo é dividido em
+    segments trechos por intervalo de quadros (padrão: um por processo), cada um
+    processado em um processo separado com seu próprio modelo. Os PoseStores dos trechos
+    são unidos em ordem e as trilhas costuradas nas bordas, de modo que os desvios
+    persistentes que atravessam a fronteira entre trechos continuam sendo um só evento.
+
+    Os demais parâmetros são repassados a run_pose_estimation. O vídeo anotado e o
+    frame_callback não são suportados aqui; progress_callback recebe a fração de quadros
+    dos trechos já concluídos; desempenho (padrão: o ativo no contexto) recebe a soma das
+    medições dos trechos. O pré-processamento dos keypoints (preprocess) é aplicado
+    uma vez ao resultado costurado, para que a suavização não recomece em cada trecho.
+    Retorna (pose_data, None).
+    """
+    if parametros.pop("save_annotated_video", False) or parametros.pop("frame_callback", None):
+        raise ValueError("O processamento paralelo não gera vídeo anotado nem chama frame_callback.")
+
+    desempenho = desempenho or atual() or Desempenho()
+    preprocess = parametros.pop("preprocess", True)
+    parametros["preprocess"] = False
+
+    workers = max(int(workers or os.cpu_count() or 1), 1)
+    total_frames, _ = read_video_info(video_path)
+    trechos = dividir_trechos(total_frames, segments or workers)
+    threads = max((os.cpu_count() or 1) // min(workers, len(trechos) or 1), 1)
+
+    resultados = [None] * len(trechos)
+    concluidos = 0
+    # "spawn" evita herdar, via fork, o estado de threads do PyTorch do processo pai
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(trechos) or 1), mp_context=contexto) as executor:
+        futuros = {executor.submit(_processar_trecho, video_path, inicio, fim, threads, parametros): i
+                   for i, (inicio, fim) in enumerate(trechos)}
+        for futuro in as_completed(futuros):
+            i = futuros[futuro]
+            resultados[i], resumo = futuro.result()
+            desempenho.incorporar(resumo)
+            concluidos += trechos[i][1] - trechos[i][0]
+            if progress_callback:
+                try:
+                    progress_callback(concluidos / total_frames)
+                except Exception:
+                    pass
+
+    if not resultados:
+        return PoseStore(), None
+    pose_data = PoseStore.concat(costurar_trilhas(resultados))
+    if preprocess:
+        with desempenho.etapa("preprocessamento", pose_data.n_frames):
+            pose_data = preprocessar(pose_data)
+    return pose_data, None
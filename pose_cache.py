@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from pose_dataset import carregar_dataset, e_dataset, salvar_dataset
+
+CACHE_DIR = ".ergoview_cache"
+CACHE_MAX_BYTES = 2 * 1024 ** 3  # 2 GB
+CACHE_VERSION = 7
+
+_POSE_DIR = "pose"
+_VIDEO_FILE = "annotated.mp4"
+
+
+def hash_video(video_bytes):
+    """Retorna o hash SHA-256 do conteúdo do vídeo."""
+    return hashlib.sha256(video_bytes).hexdigest()
+
+
+def hash_arquivo(caminho, bloco=1024 ** 2):
+    """Hash SHA-256 de um arquivo de vídeo lido em blocos (igual a hash_video do seu conteúdo)."""
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for parte in iter(lambda: f.read(bloco), b""):
+            h.update(parte)
+    return h.hexdigest()
+
+
+def chave_cache(video_hash, **parametros):
+    """Monta a chave do cache a partir do hash do vídeo e dos parâmetros de inferência."""
+    parametros = dict(parametros, _versao=CACHE_VERSION)
+    texto = video_hash + json.dumps(parametros, sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def _tamanho_entrada(caminho):
+    total = 0
+    for raiz, _, arquivos in os.walk(caminho):
+        for nome in arquivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, nome))
+            except OSError:
+                pass
+    return total
+
+
+def carregar_do_cache(chave, cache_dir=CACHE_DIR):
+    """
+    Retorna (pose_data, caminho_video_anotado) se a chave estiver no cache, ou None.
+    pose_data é carregado do dataset salvo na entrada (keypoints mapeados em memória).
+    O acesso atualiza o horário da entrada para a política LRU.
+    """
+    entrada = os.path.join(cache_dir, chave)
+    pasta_pose = os.path.join(entrada, _POSE_DIR)
+    if not e_dataset(pasta_pose):
+        return None
+
+    try:
+        pose_data = carregar_dataset(pasta_pose)
+    except Exception:
+        shutil.rmtree(entrada, ignore_errors=True)
+        return None
+
+    os.utime(entrada, None)
+    video = os.path.join(entrada, _VIDEO_FILE)
+    return pose_data, video if os.path.exists(video) else None
+
+
+def salvar_no_cache(chave, pose_data, video_anotado=None, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES,
+                    **metadados):
+    """
+    Grava pose_data como dataset (veja pose_dataset, com os metadados extras) e uma cópia
+    do vídeo anotado, se houver, no cache e aplica a remoção LRU. Retorna o caminho do
+    vídeo anotado dentro do cache.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    entrada = os.path.join(cache_dir, chave)
+    temporario = f"{entrada}.tmp-{os.getpid()}-{time.time_ns()}"
+    os.makedirs(temporario)
+
+    salvar_dataset(pose_data, os.path.join(temporario, _POSE_DIR), **metadados)
+    if video_anotado and os.path.exists(video_anotado):
+        shutil.copyfile(video_anotado, os.path.join(temporario, _VIDEO_FILE))
+
+    # Troca atômica: leitores nunca veem uma entrada pela metade
+    shutil.rmtree(entrada, ignore_errors=True)
+    os.replace(temporario, entrada)
+
+    limpar_cache(cache_dir, max_bytes, manter=chave)
+
+    video = os.path.join(entrada, _VIDEO_FILE)
+    return video if os.path.exists(video) else None
+
+
+def caminho_video_anotado(chave, cache_dir=CACHE_DIR):
+    """Caminho onde o vídeo anotado da entrada é (ou será) guardado, para renderizações posteriores."""
+    return os.path.join(cache_dir, chave, _VIDEO_FILE)
+
+
+def limpar_cache(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, manter=None):
+    """Remove as entradas menos usadas recentemente até o cache caber em max_bytes."""
+    if not os.path.isdir(cache_dir):
+        return
+
+    entradas = []
+    for nome in os.listdir(cache_dir):
+        caminho = os.path.join(cache_dir, nome)
+        if not os.path.isdir(caminho):
+            continue
+        if ".tmp-" in nome:
+            # Sobras de gravações interrompidas
+            if time.time() - os.path.getmtime(caminho) > 3600:
+                shutil.rmtree(caminho, ignore_errors=True)
+            continue
+        entradas.append((os.path.getmtime(caminho), nome, _tamanho_entrada(caminho)))
+
+    total = sum(tamanho for _, _, tamanho in entradas)
+    for _, nome, tamanho in sorted(entradas):
+        if total <= max_bytes:
+            break
+        if nome == manter:
+            continue
+        shutil.rmtree(os.path.join(cache_dir, nome), ignore_errors=True)
+        total -= tamanho
@@ -0,0 +1,115 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from pose_store import PoseStore
+
+# Versão do formato em disco; datasets de outra versão não são carregados
+DATASET_VERSION = 1
+
+META_FILE = "meta.json"
+
+# Pasta onde a interface guarda os datasets salvos pelo usuário
+DATASETS_DIR = "ergoview_datasets"
+
+# Nome do arquivo .npy -> (atributo do PoseStore, dtype gravado)
+_ARRAYS = {
+    "keypoints.npy": ("keypoints", np.float32),
+    "track_ids.npy": ("track_ids", np.int32),
+    "frames.npy": ("frames", np.int64),
+    "inferred.npy": ("inferred", np.bool_),
+}
+
+
+def e_dataset(pasta):
+    """True se a pasta contém um dataset de pose salvo."""
+    return os.path.isfile(os.path.join(pasta, META_FILE))
+
+
+def valor_nativo(valor):
+    """
+    Converte escalares e arrays NumPy em tipos nativos, para gravar em JSON (como default
+    de json.dump) ou no SQLite. Tipos nativos passam inalterados; outros objetos viram texto.
+    """
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if isinstance(valor, np.ndarray):
+        return valor.tolist()
+    if valor is None or isinstance(valor, (str, int, float, list, dict)):
+        return valor
+    return str(valor)
+
+
+def salvar_dataset(pose_data, pasta, **metadados):
+    """
+    Grava pose_data em pasta: um .npy por coluna (keypoints, track_ids, frames, inferred)
+    e meta.json com fps, frame_skip, número de quadros, o metadata do PoseStore e os
+    metadados extras (ex.: video_hash). A gravação é atômica: a pasta só aparece completa.
+    """
+    meta = dict(pose_data.metadata, **metadados)
+    meta.update(
+        versao=DATASET_VERSION,
+        fps=pose_data.fps,
+        frame_skip=pose_data.frame_skip,
+        n_frames=pose_data.n_frames,
+        n_persons=pose_data.n_persons,
+        criado_em=time.strftime("%Y-%m-%dT%H:%M:%S"),
+    )
+
+    pasta = os.path.abspath(pasta)
+    os.makedirs(os.path.dirname(pasta), exist_ok=True)
+    temporario = f"{pasta}.tmp-{os.getpid()}-{time.time_ns()}"
+    os.makedirs(temporario)
+    for arquivo, (atributo, dtype) in _ARRAYS.items():
+        np.save(os.path.join(temporario, arquivo), np.asarray(getattr(pose_data, atributo), dtype=dtype))
+    with open(os.path.join(temporario, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2, default=valor_nativo)
+
+    shutil.rmtree(pasta, ignore_errors=True)
+    os.replace(temporario, pasta)
+    return pasta
+
+
+def ler_metadados(pasta):
+    """Conteúdo do meta.json do dataset."""
+    with open(os.path.join(pasta, META_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def carregar_dataset(pasta, mmap=True):
+    """
+    Carrega um dataset salvo como PoseStore, sem precisar do vídeo. Com mmap=True os
+    keypoints são mapeados em memória (somente leitura) em vez de lidos por inteiro.
+    """
+    meta = ler_metadados(pasta)
+    if meta.get("versao") != DATASET_VERSION:
+        raise ValueError(f"Versão de dataset não suportada em {pasta}: {meta.get('versao')}")
+
+    arrays = {}
+    for arquivo, (atributo, _) in _ARRAYS.items():
+        modo = "r" if mmap and atributo == "keypoints" else None
+        arrays[atributo] = np.load(os.path.join(pasta, arquivo), mmap_mode=modo)
+    arrays["track_ids"] = arrays["track_ids"].astype(np.int64)
+
+    extras = {chave: valor for chave, valor in meta.items()
+              if chave not in ("versao", "fps", "frame_skip", "n_frames", "n_persons")}
+    return PoseStore.from_arrays(arrays["keypoints"], arrays["track_ids"], arrays["frames"], arrays["inferred"],
+                                 fps=meta["fps"], frame_skip=meta["frame_skip"], metadata=extras)
+
+
+def listar_datasets(raiz):
+    """Lista (pasta, metadados) dos datasets em raiz, do mais recente para o mais antigo."""
+    if not os.path.isdir(raiz):
+        return []
+    datasets = []
+    for nome in os.listdir(raiz):
+        pasta = os.path.join(raiz, nome)
+        if ".tmp-" not in nome and e_dataset(pasta):
+            try:
+                datasets.append((pasta, ler_metadados(pasta)))
+            except (OSError, ValueError):
+                continue
+    return sorted(datasets, key=lambda item: item[1].get("criado_em", ""), reverse=True)
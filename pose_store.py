@@ -0,0 +1,303 @@
+import itertools
+import weakref
+
+import numpy as np
+
+NUM_KEYPOINTS = 17
+
+# FPS assumido quando a origem dos dados não informa a taxa do vídeo
+DEFAULT_FPS = 30.0
+
+# Resultados já calculados para cada PoseStore (liberados junto com o dataset)
+_memo = weakref.WeakKeyDictionary()
+
+
+class PoseStore:
+    """
+    Armazenamento colunar dos keypoints de pose, uma linha por quadro processado.
+
+    keypoints: array float32 (quadros, vagas, 17, 3) com [x, y, confiança]
+    frames:    índice do quadro no vídeo de origem para cada linha
+    valid:     máscara (quadros, vagas) indicando onde há uma pessoa detectada
+    track_ids: id de trilha (operador) de cada célula (quadros, vagas); -1 quando vazia
+    fps, frame_skip: taxa do vídeo de origem e intervalo de amostragem usados na inferência;
+               timestamps (em segundos) derivam de frames / fps
+    inferred:  máscara (quadros,) dos quadros que passaram pela inferência; os demais foram
+               preenchidos pela amostragem adaptativa (keypoints mantidos ou interpolados)
+    metadata:  dicionário com a origem dos dados (modelo, parâmetros, hash do vídeo...)
+
+    Cada vaga guarda uma pessoa por quadro; uma trilha mantém a mesma vaga enquanto
+    possível, e o número de vagas é o máximo de pessoas simultâneas no vídeo.
+
+    Também se comporta como a antiga lista de dicionários (len, índice e iteração):
+    cada item é um quadro, {"frame": índice, "keypoints": [[x, y], ...]}, com os
+    keypoints do operador principal (lista vazia se ele não aparece no quadro).
+    """
+
+    def __init__(self, capacity=0, max_persons=1, fps=DEFAULT_FPS, frame_skip=1, metadata=None):
+        self.fps = float(fps) if fps and fps > 0 else DEFAULT_FPS
+        self.frame_skip = max(int(frame_skip), 1)
+        self.metadata = dict(metadata or {})
+        capacity = max(int(capacity), 1)
+        max_persons = max(int(max_persons), 1)
+        self._keypoints = np.full((capacity, max_persons, NUM_KEYPOINTS, 3), np.nan, dtype=np.float32)
+        self._frames = np.zeros(capacity, dtype=np.int64)
+        self._track_ids = np.full((capacity, max_persons), -1, dtype=np.int64)
+        self._inferred = np.ones(capacity, dtype=bool)
+        self._size = 0
+        self._slot_of = {}
+        self._primary = None
+
+    # ------------------------------------------------------------------ dados
+    @property
+    def keypoints(self):
+        return self._keypoints[:self._size]
+
+    @property
+    def frames(self):
+        return self._frames[:self._size]
+
+    @property
+    def timestamps(self):
+        return self.frames / self.fps
+
+    @property
+    def track_ids(self):
+        return self._track_ids[:self._size]
+
+    @property
+    def inferred(self):
+        return self._inferred[:self._size]
+
+    @property
+    def skipped_fraction(self):
+        """Fração dos quadros amostrados cujos keypoints foram preenchidos sem inferência."""
+        return float(1 - self.inferred.mean()) if self._size else 0.0
+
+    @property
+    def valid(self):
+        return self.track_ids >= 0
+
+    @property
+    def n_frames(self):
+        return self._size
+
+    @property
+    def n_persons(self):
+        return self._keypoints.shape[1]
+
+    def _grow(self, rows, persons):
+        capacity, max_persons = self._keypoints.shape[:2]
+        new_capacity = max(capacity, 1)
+        while new_capacity < rows:
+            new_capacity *= 2
+        new_persons = max(max_persons, persons)
+        if new_capacity == capacity and new_persons == max_persons:
+            return
+
+        keypoints = np.full((new_capacity, new_persons, NUM_KEYPOINTS, 3), np.nan, dtype=np.float32)
+        keypoints[:self._size, :max_persons] = self._keypoints[:self._size]
+        track_ids = np.full((new_capacity, new_persons), -1, dtype=np.int64)
+        track_ids[:self._size, :max_persons] = self._track_ids[:self._size]
+        frames = np.zeros(new_capacity, dtype=np.int64)
+        frames[:self._size] = self._frames[:self._size]
+        inferred = np.ones(new_capacity, dtype=bool)
+        inferred[:self._size] = self._inferred[:self._size]
+
+        self._keypoints, self._track_ids, self._frames = keypoints, track_ids, frames
+        self._inferred = inferred
+
+    def _slots(self, track_ids):
+        """Vaga de cada pessoa do quadro: a mesma da trilha quando livre, senão a primeira livre."""
+        slots = []
+        taken = set()
+        for track in track_ids:
+            slot = self._slot_of.get(int(track))
+            if slot in taken:
+                slot = None
+            slots.append(slot)
+            taken.add(slot)
+        free = (slot for slot in itertools.count() if slot not in taken)
+        return [slot if slot is not None else next(free) for slot in slots]
+
+    def append(self, frame_index, persons, track_ids=None, inferred=True):
+        """
+        Adiciona um quadro. persons é um array (n, 17, 2) ou (n, 17, 3); sem confiança
+        os pontos recebem confiança 1. track_ids (n,) identifica cada pessoa entre
+        quadros; sem ele, as pessoas recebem ids 0..n-1 na ordem de detecção.
+        inferred=False marca quadros preenchidos sem rodar o modelo.
+        """
+        persons = np.asarray(persons, dtype=np.float32)
+        n = len(persons) if persons.size else 0
+        track_ids = np.arange(n) if track_ids is None else np.asarray(track_ids, dtype=np.int64)
+        slots = self._slots(track_ids[:n])
+        self._grow(self._size + 1, max(slots, default=-1) + 1)
+
+        row = self._size
+        self._frames[row] = frame_index
+        self._inferred[row] = inferred
+        for person, track, slot in zip(persons[:n], track_ids, slots):
+            self._keypoints[row, slot, :, :persons.shape[-1]] = person
+            if persons.shape[-1] == 2:
+                self._keypoints[row, slot, :, 2] = 1.0
+            self._track_ids[row, slot] = track
+            self._slot_of[int(track)] = slot
+
+        self._size += 1
+        self._primary = None
+
+    def compact(self):
+        """Libera a capacidade pré-alocada que não foi usada."""
+        self._keypoints = self._keypoints[:self._size].copy()
+        self._frames = self._frames[:self._size].copy()
+        self._track_ids = self._track_ids[:self._size].copy()
+        self._inferred = self._inferred[:self._size].copy()
+        return self
+
+    @classmethod
+    def from_arrays(cls, keypoints, track_ids, frames, inferred=None, fps=DEFAULT_FPS, frame_skip=1, metadata=None):
+        """
+        Monta um PoseStore sobre arrays já existentes, sem copiá-los (por exemplo, arrays
+        mapeados em memória de um dataset salvo em disco).
+        """
+        store = cls(fps=fps, frame_skip=frame_skip, metadata=metadata)
+        store._keypoints = keypoints
+        store._track_ids = track_ids
+        store._frames = frames
+        store._inferred = np.ones(len(frames), dtype=bool) if inferred is None else inferred
+        store._size = len(frames)
+        return store
+
+    @classmethod
+    def concat(cls, stores):
+        """
+        Junta, em ordem, PoseStores de trechos consecutivos do mesmo vídeo (fps e
+        frame_skip do primeiro). Os ids de trilha devem já estar unificados entre trechos.
+        """
+        stores = list(stores)
+        first = stores[0]
+        persons = max(store.n_persons for store in stores)
+        merged = cls(capacity=sum(store.n_frames for store in stores), max_persons=persons,
+                     fps=first.fps, frame_skip=first.frame_skip, metadata=first.metadata)
+        row = 0
+        for store in stores:
+            rows = slice(row, row + store.n_frames)
+            merged._keypoints[rows, :store.n_persons] = store.keypoints
+            merged._track_ids[rows, :store.n_persons] = store.track_ids
+            merged._frames[rows] = store.frames
+            merged._inferred[rows] = store.inferred
+            merged._slot_of.update(store._slot_of)
+            row += store.n_frames
+        merged._size = row
+        return merged
+
+    def relabel_tracks(self, mapping):
+        """Troca os ids de trilha segundo mapping {id antigo: id novo}; ids ausentes não mudam."""
+        valid = self.track_ids >= 0
+        tracks, inverse = np.unique(self.track_ids[valid], return_inverse=True)
+        self.track_ids[valid] = np.array([mapping.get(int(t), int(t)) for t in tracks], dtype=np.int64)[inverse]
+        self._slot_of = {mapping.get(track, track): slot for track, slot in self._slot_of.items()}
+        self._primary = None
+
+    # ------------------------------------------------------------- operadores
+    def operators(self):
+        """Ids de trilha presentes, do que aparece em mais quadros para o que aparece em menos."""
+        ids = self.track_ids[self.track_ids >= 0]
+        if not len(ids):
+            return []
+        tracks, counts = np.unique(ids, return_counts=True)
+        return tracks[np.argsort(-counts, kind="stable")].tolist()
+
+    def primary_operator(self):
+        """Trilha que aparece em mais quadros (o operador do posto)."""
+        if self._primary is None:
+            operators = self.operators()
+            self._primary = operators[0] if operators else 0
+        return self._primary
+
+    def operator_keypoints(self, operator=None):
+        """Array (quadros, 17, 3) de um operador; NaN nos quadros em que ele não aparece."""
+        operator = self.primary_operator() if operator is None else operator
+        selected = self.track_ids == operator
+        data = self.keypoints[np.arange(self._size), selected.argmax(axis=1)]
+        data[~selected.any(axis=1)] = np.nan
+        return data
+
+    # ------------------------------------------------- adaptador tipo lista
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        selected = np.nonzero(self._track_ids[index] == self.primary_operator())[0]
+        keypoints = self._keypoints[index, selected[0], :, :2].tolist() if len(selected) else []
+        return {"frame": int(self._frames[index]), "keypoints": keypoints}
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self[i]
+
+    def to_list(self):
+        """Converte para a antiga lista de dicionários."""
+        return list(self)
+
+
+def as_track_arrays(pose_data):
+    """
+    Retorna (keypoints (quadros, vagas, 17, 3), track_ids (quadros, vagas), frames (quadros,))
+    para um PoseStore ou para a antiga lista de dicionários (tratada como um único operador 0).
+    """
+    if isinstance(pose_data, PoseStore):
+        return pose_data.keypoints, pose_data.track_ids, pose_data.frames
+
+    keypoints = as_keypoint_array(pose_data)
+    frames = np.array([frame.get("frame", i) for i, frame in enumerate(pose_data)], dtype=np.int64)
+    return keypoints[:, None], np.zeros((len(keypoints), 1), dtype=np.int64), frames
+
+
+def as_keypoint_array(pose_data, operator=None):
+    """
+    Converte pose_data (PoseStore ou lista de dicionários) em um array (quadros, 17, 3)
+    do operador pedido (padrão: o principal). Quadros sem os 17 keypoints viram NaN.
+    """
+    if isinstance(pose_data, PoseStore):
+        return pose_data.operator_keypoints(operator)
+
+    data = np.full((len(pose_data), NUM_KEYPOINTS, 3), np.nan, dtype=np.float32)
+    for i, frame in enumerate(pose_data):
+        keypoints = np.asarray(frame["keypoints"], dtype=np.float32)
+        if keypoints.ndim == 2 and keypoints.shape[0] == NUM_KEYPOINTS:
+            data[i, :, :keypoints.shape[1]] = keypoints[:, :3]
+            if keypoints.shape[1] == 2:
+                data[i, :, 2] = 1.0
+    return data
+
+
+def timing(pose_data):
+    """(fps, frame_skip) de pose_data; listas de dicionários usam DEFAULT_FPS e sem salto."""
+    if isinstance(pose_data, PoseStore):
+        return pose_data.fps, pose_data.frame_skip
+    return DEFAULT_FPS, 1
+
+
+def memorizado(pose_data, chave, calcular):
+    """
+    Reaproveita o resultado de calcular() para o mesmo PoseStore e a mesma chave (uma
+    tupla iniciada pelo nome do resultado). Quando o dataset cresce, os resultados antigos
+    são descartados; outras origens de dados são sempre recalculadas.
+    """
+    if not isinstance(pose_data, PoseStore):
+        return calcular()
+
+    resultados = _memo.setdefault(pose_data, {})
+    chave = (pose_data.n_frames,) + chave
+    if chave not in resultados:
+        for antiga in [c for c in resultados if c[0] != pose_data.n_frames]:
+            del resultados[antiga]
+        resultados[chave] = calcular()
+    return resultados[chave]
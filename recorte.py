@@ -0,0 +1,94 @@
+import numpy as np
+
+from joint_angles import MIN_CONFIDENCE
+from tracking import caixas_dos_keypoints, keypoints_visiveis
+
+# Valor de roi que faz a região acompanhar as pessoas detectadas no quadro anterior
+ROI_AUTOMATICA = "auto"
+
+
+def normalizar_regiao(regiao, largura, altura):
+    """
+    Converte (x1, y1, x2, y2) em pixels inteiros dentro do quadro. Regiões com todas as
+    coordenadas entre 0 e 1 são tratadas como frações da largura e da altura.
+    """
+    x1, y1, x2, y2 = (float(v) for v in regiao)
+    if max(x1, y1, x2, y2) <= 1:
+        x1, x2, y1, y2 = x1 * largura, x2 * largura, y1 * altura, y2 * altura
+    x1, x2 = sorted((int(np.clip(x1, 0, largura)), int(np.clip(round(x2), 0, largura))))
+    y1, y2 = sorted((int(np.clip(y1, 0, altura)), int(np.clip(round(y2), 0, altura))))
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        raise ValueError(f"Região de interesse vazia: {regiao}")
+    return x1, y1, x2, y2
+
+
+def caixa_das_pessoas(pessoas, min_confidence=MIN_CONFIDENCE):
+    """Caixa (x1, y1, x2, y2) que envolve os keypoints visíveis de todas as pessoas, ou None."""
+    pessoas = np.asarray(pessoas)
+    if not pessoas.size:
+        return None
+    caixas = caixas_dos_keypoints(pessoas, keypoints_visiveis(pessoas, min_confidence))
+    caixas = caixas[~np.isnan(caixas).any(axis=1)]
+    if not len(caixas):
+        return None
+    return (*caixas[:, :2].min(axis=0), *caixas[:, 2:].max(axis=0))
+
+
+class RecorteROI:
+    """
+    Região do quadro enviada ao modelo de pose.
+
+    roi é None (quadro inteiro), um retângulo fixo (x1, y1, x2, y2) ou ROI_AUTOMATICA: a
+    caixa das pessoas do último quadro inferido, ampliada por margem (fração do tamanho
+    da caixa em cada lado). No modo automático o quadro inteiro volta a ser usado quando
+    ninguém é detectado e, a cada reavaliar_a_cada inferências, para encontrar pessoas
+    que entraram na cena fora da região.
+    """
+
+    def __init__(self, largura, altura, roi=None, margem=0.2, reavaliar_a_cada=30):
+        self.largura = largura
+        self.altura = altura
+        self.automatica = roi == ROI_AUTOMATICA
+        self.margem = margem
+        self.reavaliar_a_cada = reavaliar_a_cada
+        self._regiao = None if roi is None or self.automatica else normalizar_regiao(roi, largura, altura)
+        self._desde_inteiro = 0
+
+    def recortar(self, frame):
+        """Retorna (recorte, região) para a próxima inferência; região None = quadro inteiro."""
+        regiao = self._regiao
+        if self.automatica:
+            self._desde_inteiro += 1
+            if self.reavaliar_a_cada and self._desde_inteiro > self.reavaliar_a_cada:
+                regiao = None
+            if regiao is None:
+                self._desde_inteiro = 0
+        if regiao is None:
+            return frame, None
+        x1, y1, x2, y2 = regiao
+        return frame[y1:y2, x1:x2], regiao
+
+    def atualizar(self, pessoas):
+        """Recebe as pessoas do quadro inferido (em coordenadas do quadro inteiro)."""
+        if not self.automatica:
+            return
+        caixa = caixa_das_pessoas(pessoas)
+        if caixa is None:
+            self._regiao = None
+            return
+        x1, y1, x2, y2 = caixa
+        dx, dy = (x2 - x1) * self.margem, (y2 - y1) * self.margem
+        try:
+            self._regiao = normalizar_regiao((x1 - dx, y1 - dy, x2 + dx, y2 + dy), self.largura, self.altura)
+        except ValueError:
+            self._regiao = None
+
+
+def para_quadro_inteiro(pessoas, regiao):
+    """Desloca os keypoints (n, 17, 3) de um recorte para as coordenadas do quadro inteiro."""
+    if regiao is None or not len(pessoas):
+        return pessoas
+    pessoas = np.array(pessoas, dtype=np.float32, copy=True)
+    pessoas[..., 0] += regiao[0]
+    pessoas[..., 1] += regiao[1]
+    return pessoas
@@ -0,0 +1,258 @@
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+from joint_angles import MIN_CONFIDENCE, TRIPLETS, calcular_angulos
+
+# Arquivo de regras usado quando nenhum outro é indicado
+ARQUIVO_REGRAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "regras_ergonomicas.json")
+
+# Variável de ambiente que aponta para outro arquivo de regras (vale também para processos filhos)
+VARIAVEL_REGRAS = "ERGOVIEW_REGRAS"
+
+# Versão do formato do arquivo de regras
+VERSAO_REGRAS = 1
+
+# Tempo mínimo (em segundos) que um desvio precisa durar quando a regra não define outro
+PERSISTENCIA_MINIMA_S = 3.0
+
+# Aplicação de uma regra: desvio que precisa persistir (evento) ou verificação de cada quadro
+EVENTO, QUADRO = "evento", "quadro"
+
+# "entre" e "fora" recebem uma faixa [mínimo, máximo] (inclusiva); os demais, um único ângulo
+COMPARADORES = ("<", "<=", ">", ">=", "entre", "fora")
+
+
+def amostras_minimas(segundos, fps, frame_skip=1):
+    """Converte uma duração em segundos no número de amostras consecutivas equivalente."""
+    return max(1, math.ceil(round(segundos * fps / frame_skip, 6)))
+
+
+def _limites(comparador, limite):
+    """(inferior, superior, inclui inferior, inclui superior, negada) da condição."""
+    if comparador is None:
+        return math.inf, -math.inf, False, False, False  # nunca verdadeira
+    if comparador in ("entre", "fora"):
+        inferior, superior = sorted(float(v) for v in limite)
+        return inferior, superior, True, True, comparador == "fora"
+    limite = float(limite)
+    if comparador in ("<", "<="):
+        return -math.inf, limite, False, comparador == "<=", False
+    return limite, math.inf, comparador == ">=", False, False
+
+
+def descrever(comparador, limite):
+    """Texto curto da condição, ex.: '< 90°' ou 'fora de 45–160°'."""
+    if comparador in ("entre", "fora"):
+        inferior, superior = sorted(limite)
+        return f"{'entre' if comparador == 'entre' else 'fora de'} {inferior:g}–{superior:g}°"
+    return f"{comparador} {limite:g}°"
+
+
+class Condicoes:
+    """
+    Condições de várias regras empilhadas em arrays, avaliadas de uma só vez: cada
+    condição é um intervalo (com bordas abertas ou fechadas), possivelmente negado.
+    NaN nunca satisfaz uma condição.
+    """
+
+    def __init__(self, condicoes):
+        colunas = list(zip(*[_limites(comparador, limite) for comparador, limite in condicoes])) or [()] * 5
+        self.inferior = np.array(colunas[0], dtype=np.float64)
+        self.superior = np.array(colunas[1], dtype=np.float64)
+        self.inclui_inferior = np.array(colunas[2], dtype=bool)
+        self.inclui_superior = np.array(colunas[3], dtype=bool)
+        self.negada = np.array(colunas[4], dtype=bool)
+
+    def avaliar(self, valores, indices=None):
+        """
+        Sem indices, valores tem forma (R, ...) com uma linha por condição. Com indices,
+        cada valores[i] é avaliado pela condição indices[i]. Retorna a máscara booleana.
+        """
+        valores = np.asarray(valores, dtype=np.float64)
+        if indices is None:
+            forma = (-1,) + (1,) * (valores.ndim - 1)
+
+            def por_valor(coluna):
+                return coluna.reshape(forma)
+        else:
+            def por_valor(coluna):
+                return coluna[indices]
+
+        inferior, superior = por_valor(self.inferior), por_valor(self.superior)
+        with np.errstate(invalid="ignore"):
+            acima = np.where(por_valor(self.inclui_inferior), valores >= inferior, valores > inferior)
+            abaixo = np.where(por_valor(self.inclui_superior), valores <= superior, valores < superior)
+        return ((acima & abaixo) != por_valor(self.negada)) & np.isfinite(valores)
+
+
+class Regra:
+    """
+    Regra ergonômica sobre o ângulo de uma articulação.
+
+    articulacao e lado formam o nome em joint_angles.TRIPLETS (ex.: "cotovelo" + "esq");
+    triplete permite definir outra articulação por índices de keypoints [a, b, c], com o
+    ângulo no vértice b (listas de índices usam o ponto médio). extremo é uma segunda
+    condição [comparador, limite] que marca os quadros do desvio em ângulo extremo.
+    """
+
+    def __init__(self, nome, articulacao, comparador, limite, lado=None, triplete=None, duracao_minima_s=None,
+                 extremo=None, norma=None, aplicacao=EVENTO):
+        if comparador not in COMPARADORES:
+            raise ValueError(f"Regra '{nome}': comparador desconhecido: {comparador}")
+        if (comparador in ("entre", "fora")) != isinstance(limite, (list, tuple)):
+            raise ValueError(f"Regra '{nome}': '{comparador}' exige "
+                             f"{'uma faixa [mínimo, máximo]' if comparador in ('entre', 'fora') else 'um único ângulo'}")
+        if aplicacao not in (EVENTO, QUADRO):
+            raise ValueError(f"Regra '{nome}': aplicação desconhecida: {aplicacao}")
+
+        self.nome = nome
+        self.articulacao = articulacao
+        self.lado = lado
+        self.chave = f"{articulacao}_{lado}" if lado else articulacao
+        self.comparador = comparador
+        self.limite = tuple(limite) if isinstance(limite, (list, tuple)) else limite
+        self.duracao_minima_s = PERSISTENCIA_MINIMA_S if duracao_minima_s is None else float(duracao_minima_s)
+        self.extremo = tuple(extremo) if extremo else None
+        self.norma = norma
+        self.aplicacao = aplicacao
+
+        if triplete is not None:
+            self.triplete = tuple(tuple(p) if isinstance(p, list) else p for p in triplete)
+            if self.chave in TRIPLETS and TRIPLETS[self.chave] != self.triplete:
+                raise ValueError(f"Regra '{nome}': triplete diferente do já definido para {self.chave}")
+        elif self.chave in TRIPLETS:
+            self.triplete = TRIPLETS[self.chave]
+        else:
+            raise ValueError(f"Regra '{nome}': articulação desconhecida: {self.chave}")
+
+    def limites(self):
+        """Ângulos de referência da regra (limite e extremo)."""
+        valores = []
+        for limite in (self.limite, self.extremo[1] if self.extremo else None):
+            if isinstance(limite, tuple):
+                valores.extend(limite)
+            elif limite is not None:
+                valores.append(limite)
+        return valores
+
+
+class ConjuntoRegras:
+    """
+    Regras compiladas para avaliação vetorizada: os ângulos de todas as articulações
+    usadas são calculados uma vez e todas as regras são avaliadas em uma única operação
+    sobre o array (regras, células). Acrescentar regras não acrescenta laços por quadro.
+    """
+
+    def __init__(self, regras, origem=None):
+        self.regras = list(regras)
+        self.origem = origem
+        self.nomes = [regra.nome for regra in self.regras]
+        if len(set(self.nomes)) != len(self.nomes):
+            raise ValueError("Nomes de regra repetidos")
+        self._indices = {nome: i for i, nome in enumerate(self.nomes)}
+
+        self.triplets = {regra.chave: regra.triplete for regra in self.regras}
+        self.articulacoes = sorted(self.triplets)
+        self.condicoes = Condicoes([(regra.comparador, regra.limite) for regra in self.regras])
+        self.extremos = Condicoes([regra.extremo or (None, None) for regra in self.regras])
+        self.duracoes_s = np.array([regra.duracao_minima_s for regra in self.regras], dtype=np.float64)
+        self._subconjuntos = {}
+
+    def __len__(self):
+        return len(self.regras)
+
+    def __iter__(self):
+        return iter(self.regras)
+
+    def regra(self, nome):
+        return self.regras[self._indices[nome]]
+
+    def aplicacao(self, aplicacao):
+        """Subconjunto (compilado uma vez) das regras de uma aplicação (EVENTO ou QUADRO)."""
+        if aplicacao not in self._subconjuntos:
+            self._subconjuntos[aplicacao] = ConjuntoRegras([r for r in self.regras if r.aplicacao == aplicacao],
+                                                           self.origem)
+        return self._subconjuntos[aplicacao]
+
+    def angulos(self, keypoints, min_confidence=MIN_CONFIDENCE):
+        """Ângulos (articulação -> array) de todas as articulações usadas pelas regras."""
+        return calcular_angulos(keypoints, self.articulacoes, min_confidence, triplets=self.triplets)
+
+    def valores(self, angulos):
+        """Empilha os ângulos na ordem das regras: array (regras, ...)."""
+        if not self.regras:
+            return np.empty((0,))
+        return np.stack([np.asarray(angulos[regra.chave], dtype=np.float64) for regra in self.regras])
+
+    def violacoes(self, valores):
+        """Máscara (regras, ...) dos valores que violam cada regra."""
+        return self.condicoes.avaliar(valores)
+
+    def indices(self, nomes):
+        """Índice da regra de cada nome (-1 para nomes desconhecidos)."""
+        return np.array([self._indices.get(nome, -1) for nome in nomes], dtype=np.int64)
+
+    def extremos_por_regra(self, angulos, indices):
+        """Máscara dos ângulos em extremo, cada um avaliado pela regra indices[i]."""
+        angulos = np.asarray(angulos, dtype=np.float64)
+        indices = np.asarray(indices, dtype=np.int64)
+        mascara = np.zeros(len(angulos), dtype=bool)
+        conhecidos = indices >= 0
+        mascara[conhecidos] = self.extremos.avaliar(angulos[conhecidos], indices[conhecidos])
+        return mascara
+
+    def amostras_minimas(self, fps, frame_skip=1, persistencia_minima_s=None):
+        """Amostras consecutivas exigidas por regra; persistencia_minima_s substitui a duração de todas."""
+        return np.array([amostras_minimas(regra.duracao_minima_s if persistencia_minima_s is None
+                                          else persistencia_minima_s, fps, frame_skip)
+                         for regra in self.regras], dtype=np.int64)
+
+    def limites(self, chave):
+        """Ângulos de referência (limites e extremos) das regras de uma articulação."""
+        return sorted({float(v) for regra in self.regras if regra.chave == chave for v in regra.limites()})
+
+
+def carregar_regras(caminho=None):
+    """
+    Lê e compila um arquivo de regras (JSON com "versao" e a lista "regras"). Sem caminho,
+    usa o arquivo da variável ERGOVIEW_REGRAS ou o regras_ergonomicas.json do projeto.
+    """
+    caminho = caminho or os.environ.get(VARIAVEL_REGRAS) or ARQUIVO_REGRAS
+    with open(caminho, encoding="utf-8") as f:
+        dados = json.load(f)
+    if dados.get("versao") != VERSAO_REGRAS:
+        raise ValueError(f"Versão de arquivo de regras não suportada em {caminho}: {dados.get('versao')}")
+
+    regras = []
+    for item in dados.get("regras", []):
+        try:
+            regras.append(Regra(**item))
+        except TypeError as e:
+            raise ValueError(f"Regra inválida em {caminho}: {item.get('nome', item)} ({e})") from None
+    return ConjuntoRegras(regras, origem=caminho)
+
+
+# (caminho absoluto, data de modificação) -> ConjuntoRegras
+_carregadas = {}
+_carregadas_lock = threading.Lock()
+
+
+def obter_regras(regras=None):
+    """
+    ConjuntoRegras a usar: o próprio conjunto, o arquivo indicado ou o arquivo padrão.
+    Arquivos são compilados uma vez e recarregados quando modificados.
+    """
+    if isinstance(regras, ConjuntoRegras):
+        return regras
+    caminho = os.path.abspath(regras or os.environ.get(VARIAVEL_REGRAS) or ARQUIVO_REGRAS)
+    chave = (caminho, os.path.getmtime(caminho))
+    with _carregadas_lock:
+        if chave not in _carregadas:
+            for antiga in [c for c in _carregadas if c[0] == caminho]:
+                del _carregadas[antiga]
+            _carregadas[chave] = carregar_regras(caminho)
+        return _carregadas[chave]
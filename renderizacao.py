@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from instrumentacao import Desempenho, atual
+from joint_angles import MIN_CONFIDENCE
+from pose_store import as_track_arrays
+
+# Ligações entre keypoints COCO desenhadas no esqueleto
+ESQUELETO = [(5, 7), (7, 9), (6, 8), (8, 10), (5, 6), (5, 11), (6, 12), (11, 12),
+             (11, 13), (13, 15), (12, 14), (14, 16), (0, 1), (0, 2), (1, 3), (2, 4)]
+
+# Cores (BGR) das trilhas, repetidas quando há mais operadores que cores
+CORES = [(0, 200, 255), (255, 128, 0), (0, 255, 0), (255, 0, 255), (0, 0, 255), (255, 255, 0)]
+
+# Estados de uma tarefa de renderização
+NA_FILA, RENDERIZANDO, CONCLUIDA, ERRO, CANCELADA = "na fila", "renderizando", "concluída", "erro", "cancelada"
+
+
+def desenhar_pessoas(frame, pessoas, track_ids, min_confidence=MIN_CONFIDENCE):
+    """Desenha no quadro (in-place) o esqueleto e o id de cada pessoa (n, 17, 3)."""
+    for pessoa, trilha in zip(pessoas, track_ids):
+        cor = CORES[int(trilha) % len(CORES)]
+        visiveis = (pessoa[:, 2] >= min_confidence) & np.isfinite(pessoa[:, :2]).all(axis=1)
+        pontos = np.nan_to_num(pessoa[:, :2]).round().astype(int)
+        for a, b in ESQUELETO:
+            if visiveis[a] and visiveis[b]:
+                cv2.line(frame, tuple(pontos[a]), tuple(pontos[b]), cor, 2, cv2.LINE_AA)
+        for x, y in pontos[visiveis]:
+            cv2.circle(frame, (int(x), int(y)), 3, cor, -1, cv2.LINE_AA)
+        if visiveis.any():
+            x, y = pontos[visiveis].min(axis=0)
+            cv2.putText(frame, f"Op {trilha}", (int(x), max(int(y) - 8, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, cor, 1,
+                        cv2.LINE_AA)
+    return frame
+
+
+def renderizar_video(video_path, pose_data, saida, progress_callback=None, cancelar=None, desempenho=None):
+    """
+    Gera o vídeo anotado a partir dos keypoints já armazenados (sem nova inferência).
+    Todos os quadros do vídeo são gravados; cada um recebe o esqueleto da última amostra
+    de pose até frame_skip quadros antes. O arquivo só aparece em saida quando completo.
+    cancelar é um threading.Event opcional que interrompe a renderização. Os tempos de
+    leitura, desenho e codificação vão para desempenho (padrão: o ativo no contexto).
+    """
+    desempenho = desempenho or atual() or Desempenho()
+    keypoints, track_ids, frames = as_track_arrays(pose_data)
+    frame_skip = getattr(pose_data, "frame_skip", 1)
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Não foi possível abrir o vídeo: {video_path}")
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or getattr(pose_data, "fps", 30)
+
+    temporario = f"{saida}.tmp-{os.getpid()}.mp4"
+    out = cv2.VideoWriter(temporario, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    linha = -1
+    quadro = 0
+    try:
+        while True:
+            if cancelar is not None and cancelar.is_set():
+                raise InterruptedError("Renderização cancelada")
+            inicio = time.perf_counter()
+            ret, frame = cap.read()
+            lido = time.perf_counter()
+            desempenho.registrar("decodificacao_render", lido - inicio, 1 if ret else 0)
+            if not ret:
+                break
+
+            while linha + 1 < len(frames) and frames[linha + 1] <= quadro:
+                linha += 1
+            if linha >= 0 and quadro - frames[linha] < frame_skip:
+                presentes = track_ids[linha] >= 0
+                desenhar_pessoas(frame, keypoints[linha][presentes], track_ids[linha][presentes])
+            desenhado = time.perf_counter()
+            desempenho.registrar("desenho", desenhado - lido, 1)
+            out.write(frame)
+            desempenho.registrar("codificacao", time.perf_counter() - desenhado, 1)
+            quadro += 1
+
+            if progress_callback and total_frames and quadro % 30 == 0:
+                progress_callback(min(quadro / total_frames, 1.0))
+    except BaseException:
+        out.release()
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    finally:
+        cap.release()
+        out.release()
+
+    os.replace(temporario, saida)
+    if progress_callback:
+        progress_callback(1.0)
+    return saida
+
+
+class TarefaRenderizacao:
+    """Renderização de um vídeo anotado executada em segundo plano."""
+
+    def __init__(self, tarefa_id, video_path, pose_data, saida):
+        self.id = tarefa_id
+        self.video_path = video_path
+        self.pose_data = pose_data
+        self.saida = saida
+        self.estado = NA_FILA
+        self.progresso = 0.0
+        self.erro = None
+        self.cancelar = threading.Event()
+        self.desempenho = Desempenho(f"renderizacao {tarefa_id}")
+
+    def _progresso(self, fracao):
+        self.progresso = fracao
+
+    def executar(self):
+        if self.cancelar.is_set():
+            self.estado = CANCELADA
+            return
+        self.estado = RENDERIZANDO
+        try:
+            renderizar_video(self.video_path, self.pose_data, self.saida, self._progresso, self.cancelar,
+                             self.desempenho)
+            self.estado = CONCLUIDA
+        except InterruptedError:
+            self.estado = CANCELADA
+        except Exception as e:
+            self.erro = str(e)
+            self.estado = ERRO
+        finally:
+            # Os keypoints não são mais necessários depois de renderizar
+            self.pose_data = None
+            self.desempenho.finalizar().gravar()
+
+    def status(self):
+        return {
+            "id": self.id,
+            "estado": self.estado,
+            "progresso": self.progresso,
+            "caminho": self.saida if self.estado == CONCLUIDA else None,
+            "erro": self.erro,
+            "desempenho": self.desempenho.resumo(),
+        }
+
+
+# Uma renderização por vez: a codificação de vídeo já ocupa a CPU
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="renderizacao")
+_tarefas = {}
+_tarefas_lock = threading.Lock()
+
+
+def iniciar_renderizacao(video_path, pose_data, saida, tarefa_id=None):
+    """
+    Agenda a renderização do vídeo anotado e retorna o id da tarefa. Uma tarefa com o
+    mesmo id ainda ativa, ou concluída com o vídeo ainda em disco, é reaproveitada.
+    """
+    tarefa_id = tarefa_id or uuid.uuid4().hex
+    with _tarefas_lock:
+        tarefa = _tarefas.get(tarefa_id)
+        if tarefa is not None and (tarefa.estado in (NA_FILA, RENDERIZANDO) or
+                                   (tarefa.estado == CONCLUIDA and os.path.exists(tarefa.saida))):
+            return tarefa_id
+        tarefa = _tarefas[tarefa_id] = TarefaRenderizacao(tarefa_id, video_path, pose_data, saida)
+    _executor.submit(tarefa.executar)
+    return tarefa_id
+
+
+def status_renderizacao(tarefa_id):
+    """Dicionário com estado, progresso (0 a 1), caminho do vídeo pronto e erro; None se o id não existe."""
+    with _tarefas_lock:
+        tarefa = _tarefas.get(tarefa_id)
+    return tarefa.status() if tarefa is not None else None
+
+
+def cancelar_renderizacao(tarefa_id):
+    """Pede a interrupção da tarefa (na fila ou em andamento)."""
+    with _tarefas_lock:
+        tarefa = _tarefas.get(tarefa_id)
+    if tarefa is not None:
+        tarefa.cancelar.set()
+
+
+def videos_em_uso():
+    """Caminhos dos vídeos de origem das renderizações na fila ou em andamento."""
+    with _tarefas_lock:
+        return {tarefa.video_path for tarefa in _tarefas.values() if tarefa.estado in (NA_FILA, RENDERIZANDO)}
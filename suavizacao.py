@@ -0,0 +1,104 @@
+import numpy as np
+
+from joint_angles import MIN_CONFIDENCE
+from pose_store import PoseStore
+
+# Lacunas de até este tamanho (keypoint oculto com a pessoa presente) são interpoladas
+LACUNA_MAXIMA_S = 0.5
+
+# Filtro de Savitzky–Golay causal: reta (ordem 1) ajustada às amostras dos últimos
+# JANELA_SUAVIZACAO_S segundos e avaliada na amostra atual (sem atraso de fase)
+JANELA_SUAVIZACAO_S = 0.6
+ORDEM_SUAVIZACAO = 1
+
+
+def coeficientes_savgol(janela, ordem=ORDEM_SUAVIZACAO):
+    """
+    Pesos do Savitzky–Golay causal: pesos[k] multiplica a amostra t - k. O polinômio de
+    grau ordem ajustado às janela últimas amostras é avaliado na amostra atual.
+    """
+    tempos = -np.arange(janela, dtype=np.float64)
+    return np.linalg.pinv(np.vander(tempos, ordem + 1, increasing=True))[0]
+
+
+def mascarar(keypoints, min_confidence=MIN_CONFIDENCE):
+    """
+    Cópia dos keypoints (..., 17, 3) com x, y = NaN nos pontos de confiança baixa e nos
+    que vieram na origem (0, 0), como o modelo devolve articulações ocultas.
+    """
+    keypoints = np.array(keypoints, dtype=np.float32, copy=True)
+    ocultos = ~(keypoints[..., 2] >= min_confidence) | (keypoints[..., :2] == 0).all(axis=-1)
+    keypoints[..., :2][ocultos] = np.nan
+    return keypoints
+
+
+def interpolar_lacunas(keypoints, track_ids, lacuna_maxima):
+    """
+    Preenche, in-place e sem laço por quadro, as lacunas de até lacuna_maxima amostras de
+    cada keypoint (quadros, pessoas, 17, 3) por interpolação linear entre as amostras
+    válidas vizinhas. Só são preenchidas lacunas em que a mesma trilha está presente antes,
+    durante e depois; a confiança do ponto preenchido é a menor das vizinhas.
+    """
+    n = len(keypoints)
+    validos = np.isfinite(keypoints[..., :2]).all(axis=-1)
+    posicoes = np.arange(n).reshape((-1,) + (1,) * (validos.ndim - 1))
+    anterior = np.maximum.accumulate(np.where(validos, posicoes, -1), axis=0)
+    seguinte = np.minimum.accumulate(np.where(validos, posicoes, n)[::-1], axis=0)[::-1]
+    lacunas = ~validos & (anterior >= 0) & (seguinte < n) & (seguinte - anterior - 1 <= lacuna_maxima)
+
+    quadro, pessoa, ponto = np.nonzero(lacunas)
+    antes, depois = anterior[quadro, pessoa, ponto], seguinte[quadro, pessoa, ponto]
+    trilha = track_ids[quadro, pessoa]
+    mesma = (trilha >= 0) & (track_ids[antes, pessoa] == trilha) & (track_ids[depois, pessoa] == trilha)
+    quadro, pessoa, ponto, antes, depois = (v[mesma] for v in (quadro, pessoa, ponto, antes, depois))
+
+    peso = ((quadro - antes) / (depois - antes))[:, None]
+    inicio, fim = keypoints[antes, pessoa, ponto], keypoints[depois, pessoa, ponto]
+    keypoints[quadro, pessoa, ponto, :2] = inicio[:, :2] + (fim[:, :2] - inicio[:, :2]) * peso
+    keypoints[quadro, pessoa, ponto, 2] = np.minimum(inicio[:, 2], fim[:, 2])
+    return keypoints
+
+
+def suavizar_causal(keypoints, track_ids, janela, ordem=ORDEM_SUAVIZACAO):
+    """
+    Aplica in-place o Savitzky–Golay causal a x e y de todos os keypoints de uma vez (um
+    laço só sobre as janela defasagens). Onde a janela não está completa (início do
+    vídeo, ponto ausente ou troca de trilha na vaga) a amostra original é mantida.
+    """
+    if janela <= ordem + 1 or len(keypoints) < janela:
+        return keypoints
+    xy = keypoints[..., :2]
+    filtrado = np.zeros(xy.shape, dtype=np.float64)
+    completos = np.isfinite(xy).all(axis=-1)
+    completos[:janela - 1] = False
+    for defasagem, peso in enumerate(coeficientes_savgol(janela, ordem)):
+        fim = len(xy) - defasagem
+        filtrado[defasagem:] += peso * np.nan_to_num(xy[:fim])
+        if defasagem:
+            completos[defasagem:] &= np.isfinite(xy[:fim]).all(axis=-1) & \
+                (track_ids[:fim] == track_ids[defasagem:])[..., None]
+    xy[completos] = filtrado[completos]
+    return keypoints
+
+
+def preprocessar(pose_data, min_confidence=MIN_CONFIDENCE, lacuna_maxima_s=LACUNA_MAXIMA_S,
+                 janela_s=JANELA_SUAVIZACAO_S, ordem=ORDEM_SUAVIZACAO):
+    """
+    Etapa de limpeza antes do cálculo de ângulos, vetorizada sobre o dataset inteiro:
+    descarta (NaN) os keypoints de confiança baixa ou na origem, interpola lacunas curtas
+    e aplica o Savitzky–Golay causal. Retorna um novo PoseStore; os parâmetros usados
+    ficam em metadata["preprocessamento"].
+    """
+    dt = pose_data.frame_skip / pose_data.fps
+    lacuna_maxima = int(round(lacuna_maxima_s / dt))
+    janela = max(int(round(janela_s / dt)), ordem + 2)
+
+    track_ids = pose_data.track_ids
+    keypoints = mascarar(pose_data.keypoints, min_confidence)
+    interpolar_lacunas(keypoints, track_ids, lacuna_maxima)
+    suavizar_causal(keypoints, track_ids, janela, ordem)
+
+    metadata = dict(pose_data.metadata, preprocessamento=dict(
+        min_confidence=min_confidence, lacuna_maxima=lacuna_maxima, janela=janela, ordem=ordem))
+    return PoseStore.from_arrays(keypoints, track_ids, pose_data.frames, pose_data.inferred, fps=pose_data.fps,
+                                 frame_skip=pose_data.frame_skip, metadata=metadata)
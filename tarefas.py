@@ -0,0 +1,308 @@
+"""
+Fila local de tarefas de estimativa de pose, compartilhada por todas as sessões da
+interface (o módulo é carregado uma vez por processo do servidor).
+
+Cada tarefa roda em um processo do pool, com até PROCESSOS tarefas simultâneas e THREADS
+threads por tarefa (configuráveis pelas variáveis ERGOVIEW_PROCESSOS e ERGOVIEW_THREADS),
+e tem a própria pasta de trabalho em TAREFAS_DIR: progresso, alertas ao vivo e o dataset
+de pose resultante ficam ali, sem arquivos fixos no diretório corrente. A interface só
+envia a tarefa e consulta o estado e o resultado pelo id. Vídeos enviados e pastas de
+tarefas sem uso há mais de RETENCAO_S (inclusive as deixadas por um servidor anterior)
+são apagados por limpar_tarefas.
+"""
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from analise_incremental import AnalisadorIncremental
+from instrumentacao import Desempenho
+from pose_dataset import carregar_dataset, salvar_dataset, valor_nativo
+from renderizacao import NA_FILA, CONCLUIDA, ERRO, CANCELADA, videos_em_uso
+from yolo_pose_analysis import read_video_info, run_pose_estimation
+
+TAREFAS_DIR = ".ergoview_tarefas"
+
+VARIAVEL_PROCESSOS = "ERGOVIEW_PROCESSOS"
+VARIAVEL_THREADS = "ERGOVIEW_THREADS"
+
+# Tarefas simultâneas quando ERGOVIEW_PROCESSOS não é definida
+PROCESSOS_PADRAO = 2
+
+# Tarefas terminadas, suas pastas e vídeos enviados sem uso são descartados depois deste tempo
+RETENCAO_S = 24 * 3600
+
+# Intervalo mínimo entre gravações do progresso pela tarefa
+INTERVALO_PROGRESSO_S = 0.5
+
+# Alertas ao vivo mantidos no progresso
+MAX_ALERTAS = 50
+
+PROCESSANDO = "processando"
+
+_ENTRADAS = "entradas"
+_PROGRESSO = "progresso.json"
+_CANCELAR = "cancelar"
+_POSE = "pose"
+
+
+def limites():
+    """(processos simultâneos, threads por tarefa) configurados."""
+    processos = max(int(os.environ.get(VARIAVEL_PROCESSOS) or PROCESSOS_PADRAO), 1)
+    threads = max(int(os.environ.get(VARIAVEL_THREADS) or (os.cpu_count() or 1) // processos), 1)
+    return processos, threads
+
+
+def salvar_entrada(video_bytes, video_hash, extensao=".mp4", pasta=TAREFAS_DIR):
+    """
+    Grava o vídeo enviado em pasta/entradas com o hash do conteúdo como nome (o mesmo vídeo
+    enviado por duas sessões vira um arquivo só, e vídeos diferentes nunca se sobrescrevem).
+    Um vídeo já gravado tem a data de modificação renovada, o que o mantém fora da limpeza
+    enquanto alguma sessão o usa. Retorna o caminho.
+    """
+    caminho = os.path.abspath(os.path.join(pasta, _ENTRADAS, video_hash + extensao))
+    if os.path.exists(caminho):
+        os.utime(caminho)
+    else:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f"{caminho}.tmp-{os.getpid()}-{time.time_ns()}"
+        with open(temporario, "wb") as f:
+            f.write(video_bytes)
+        os.replace(temporario, caminho)
+    return caminho
+
+
+def _gravar_json(caminho, dados):
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False, default=valor_nativo)
+    os.replace(temporario, caminho)
+
+
+class _PedidoCancelamento:
+    """Sinal de cancelamento (como um threading.Event) lido do arquivo criado por cancelar_tarefa."""
+
+    def __init__(self, pasta):
+        self.caminho = os.path.join(pasta, _CANCELAR)
+
+    def is_set(self):
+        return os.path.exists(self.caminho)
+
+
+class _Progresso:
+    """Lado do processo trabalhador: grava o progresso e os alertas da tarefa."""
+
+    def __init__(self, pasta, analisador):
+        self.pasta = pasta
+        self.analisador = analisador
+        self.fracao = 0.0
+        self.alertas = []
+        self._gravado = 0.0
+        self.gravar(forcar=True)
+
+    def atualizar(self, fracao):
+        self.fracao = fracao
+        self.gravar()
+
+    def avisos(self, avisos):
+        self.alertas = (self.alertas + list(avisos))[-MAX_ALERTAS:]
+        self.gravar(forcar=bool(avisos))
+
+    def gravar(self, forcar=False):
+        agora = time.monotonic()
+        if not forcar and agora - self._gravado < INTERVALO_PROGRESSO_S:
+            return
+        self._gravado = agora
+        _gravar_json(os.path.join(self.pasta, _PROGRESSO), {"progresso": self.fracao, "alertas": self.alertas,
+                                                             "metricas": self.analisador.metricas()})
+
+
+def _executar_pose(pasta, video_path, threads, parametros):
+    """
+    Executado no processo trabalhador: estimativa de pose com análise ao vivo, gravando
+    o progresso na pasta da tarefa e o dataset em pasta/pose. O pedido de cancelamento é
+    verificado antes de cada inferência (InterruptedError). Retorna o resumo de desempenho.
+    """
+    import torch
+    torch.set_num_threads(threads)
+
+    _, fps = read_video_info(video_path)
+    analisador = AnalisadorIncremental(fps=fps, frame_skip=parametros.get("frame_skip", 2))
+    progresso = _Progresso(pasta, analisador)
+    desempenho = Desempenho(os.path.basename(pasta))
+
+    def analisar_quadro(frame_index, keypoints, track_ids):
+        progresso.avisos(analisador.atualizar(keypoints, track_ids, frame_index))
+
+    pose_data, _ = run_pose_estimation(video_path, progress_callback=progresso.atualizar,
+                                       frame_callback=analisar_quadro, desempenho=desempenho,
+                                       cancelar=_PedidoCancelamento(pasta),
+                                       **dict(parametros, save_annotated_video=False))
+    progresso.fracao = 1.0
+    progresso.avisos(analisador.finalizar())
+    salvar_dataset(pose_data, os.path.join(pasta, _POSE))
+    desempenho.finalizar().gravar()
+    return desempenho.resumo()
+
+
+class Tarefa:
+    """Tarefa de estimativa de pose enviada ao pool (lado da interface)."""
+
+    def __init__(self, tarefa_id, pasta, video_path, parametros):
+        self.id = tarefa_id
+        self.pasta = pasta
+        self.video_path = video_path
+        self.parametros = parametros
+        self.estado = NA_FILA
+        self.erro = None
+        self.desempenho = None
+        self.criada_em = time.time()
+        self.terminada_em = None
+        self.futuro = None
+
+    def _concluir(self, futuro):
+        if futuro.cancelled():
+            self.estado = CANCELADA
+        elif isinstance(futuro.exception(), InterruptedError):
+            self.estado = CANCELADA
+        elif futuro.exception() is not None:
+            self.erro = str(futuro.exception()) or type(futuro.exception()).__name__
+            self.estado = ERRO
+        else:
+            self.desempenho = futuro.result()
+            self.estado = CONCLUIDA
+        self.terminada_em = time.time()
+
+    def status(self):
+        progresso = {}
+        try:
+            with open(os.path.join(self.pasta, _PROGRESSO), encoding="utf-8") as f:
+                progresso = json.load(f)
+        except (OSError, ValueError):
+            pass
+        estado = self.estado
+        if estado == NA_FILA and progresso:
+            estado = PROCESSANDO
+        return {
+            "id": self.id,
+            "estado": estado,
+            "progresso": 1.0 if estado == CONCLUIDA else progresso.get("progresso", 0.0),
+            "alertas": progresso.get("alertas", []),
+            "metricas": progresso.get("metricas"),
+            "erro": self.erro,
+            "desempenho": self.desempenho,
+            "decorrido_s": (self.terminada_em or time.time()) - self.criada_em,
+        }
+
+
+_executor = None
+_tarefas = {}
+_tarefas_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        # "spawn" evita herdar, via fork, o estado de threads do servidor e do PyTorch
+        _executor = ProcessPoolExecutor(max_workers=limites()[0], mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def _modificado_em(caminho):
+    try:
+        return os.path.getmtime(caminho)
+    except OSError:
+        return None
+
+
+def limpar_tarefas(retencao_s=RETENCAO_S, pasta=TAREFAS_DIR):
+    """
+    Descarta as tarefas terminadas há mais de retencao_s segundos e suas pastas e varre
+    pasta pela data de modificação: apaga as pastas de tarefas desconhecidas (de um
+    servidor anterior) e os vídeos enviados mais antigos que retencao_s que nenhuma
+    tarefa ativa nem renderização em andamento usa.
+    """
+    limite = time.time() - retencao_s
+    with _tarefas_lock:
+        antigas = [t for t in _tarefas.values() if t.terminada_em and t.terminada_em < limite]
+        for tarefa in antigas:
+            del _tarefas[tarefa.id]
+        pastas_ativas = {tarefa.pasta for tarefa in _tarefas.values()}
+        em_uso = {os.path.abspath(tarefa.video_path) for tarefa in _tarefas.values() if tarefa.estado == NA_FILA}
+    for tarefa in antigas:
+        shutil.rmtree(tarefa.pasta, ignore_errors=True)
+
+    pasta = os.path.abspath(pasta)
+    nomes = os.listdir(pasta) if os.path.isdir(pasta) else []
+    for nome in nomes:
+        caminho = os.path.join(pasta, nome)
+        modificado = _modificado_em(caminho)
+        if nome != _ENTRADAS and caminho not in pastas_ativas and modificado is not None and modificado < limite:
+            shutil.rmtree(caminho, ignore_errors=True)
+
+    entradas = os.path.join(pasta, _ENTRADAS)
+    if not os.path.isdir(entradas):
+        return
+    em_uso |= {os.path.abspath(video) for video in videos_em_uso()}
+    for nome in os.listdir(entradas):
+        caminho = os.path.join(entradas, nome)
+        modificado = _modificado_em(caminho)
+        if caminho not in em_uso and modificado is not None and modificado < limite:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+
+
+def enviar_tarefa(video_path, tarefa_id=None, pasta=TAREFAS_DIR, **parametros):
+    """
+    Agenda a estimativa de pose do vídeo (parâmetros de run_pose_estimation) e retorna o
+    id da tarefa. Uma tarefa com o mesmo id na fila, em andamento ou concluída é
+    reaproveitada; uma que falhou ou foi cancelada é enviada de novo.
+    """
+    limpar_tarefas(pasta=pasta)
+    tarefa_id = tarefa_id or uuid.uuid4().hex
+    with _tarefas_lock:
+        tarefa = _tarefas.get(tarefa_id)
+        if tarefa is not None and tarefa.estado in (NA_FILA, CONCLUIDA):
+            return tarefa_id
+        pasta_tarefa = os.path.abspath(os.path.join(pasta, tarefa_id))
+        shutil.rmtree(pasta_tarefa, ignore_errors=True)
+        os.makedirs(pasta_tarefa)
+        tarefa = _tarefas[tarefa_id] = Tarefa(tarefa_id, pasta_tarefa, video_path, parametros)
+        tarefa.futuro = _pool().submit(_executar_pose, pasta_tarefa, video_path, limites()[1], parametros)
+    tarefa.futuro.add_done_callback(tarefa._concluir)
+    return tarefa_id
+
+
+def status_tarefa(tarefa_id):
+    """
+    Dicionário com estado, progresso (0 a 1), alertas e métricas ao vivo, erro e, quando
+    concluída, o resumo de desempenho; None se o id não existe.
+    """
+    with _tarefas_lock:
+        tarefa = _tarefas.get(tarefa_id)
+    return tarefa.status() if tarefa is not None else None
+
+
+def resultado_tarefa(tarefa_id):
+    """PoseStore de uma tarefa concluída (carregado da pasta da tarefa) ou None."""
+    with _tarefas_lock:
+        tarefa = _tarefas.get(tarefa_id)
+    if tarefa is None or tarefa.estado != CONCLUIDA:
+        return None
+    return carregar_dataset(os.path.join(tarefa.pasta, _POSE))
+
+
+def cancelar_tarefa(tarefa_id):
+    """Retira a tarefa da fila ou pede a interrupção da que está em andamento."""
+    with _tarefas_lock:
+        tarefa = _tarefas.get(tarefa_id)
+    if tarefa is None or tarefa.estado != NA_FILA:
+        return
+    if not tarefa.futuro.cancel():
+        open(os.path.join(tarefa.pasta, _CANCELAR), "w").close()
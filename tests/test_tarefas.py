@@ -0,0 +1,51 @@
+import time
+
+import cv2
+import numpy as np
+
+from tarefas import CANCELADA, cancelar_tarefa, enviar_tarefa, status_tarefa
+
+QUADROS = 100
+
+
+class _Resultado:
+    keypoints = None
+
+
+class ModeloLento:
+    """Modelo sem detecções (nenhum alerta) e lento o bastante para a tarefa ser cancelada no meio."""
+
+    def __call__(self, quadros):
+        time.sleep(0.05)
+        return [_Resultado() for _ in quadros]
+
+
+def _video(caminho):
+    saida = cv2.VideoWriter(str(caminho), cv2.VideoWriter_fourcc(*"mp4v"), 30, (64, 48))
+    for i in range(QUADROS):
+        saida.write(np.full((48, 64, 3), i % 255, dtype=np.uint8))
+    saida.release()
+    return str(caminho)
+
+
+def _aguardar(tarefa_id, condicao, limite_s=60):
+    fim = time.monotonic() + limite_s
+    while time.monotonic() < fim:
+        status = status_tarefa(tarefa_id)
+        if condicao(status):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"Tempo esgotado; último estado: {status}")
+
+
+def test_cancelar_tarefa_sem_alertas_interrompe_a_inferencia(tmp_path):
+    video = _video(tmp_path / "video.mp4")
+    tarefa_id = enviar_tarefa(video, pasta=str(tmp_path / "tarefas"), model=ModeloLento(), frame_skip=1,
+                              batch_size=1, preprocess=False)
+
+    _aguardar(tarefa_id, lambda status: status["progresso"] > 0)
+    cancelar_tarefa(tarefa_id)
+    status = _aguardar(tarefa_id, lambda status: status["estado"] == CANCELADA)
+
+    assert not status["alertas"]
+    assert status["progresso"] < (QUADROS - 1) / QUADROS
@@ -0,0 +1,150 @@
+import warnings
+
+import numpy as np
+
+from joint_angles import MIN_CONFIDENCE
+
+
+def keypoints_visiveis(pessoas, min_confidence=MIN_CONFIDENCE):
+    """Máscara (..., 17) dos keypoints com confiança suficiente e coordenadas finitas."""
+    return (pessoas[..., 2] >= min_confidence) & np.isfinite(pessoas[..., :2]).all(axis=-1)
+
+
+def caixas_dos_keypoints(pessoas, visiveis):
+    """Caixa (x1, y1, x2, y2) envolvendo os keypoints visíveis de cada pessoa."""
+    x = np.where(visiveis, pessoas[..., 0], np.nan)
+    y = np.where(visiveis, pessoas[..., 1], np.nan)
+    with warnings.catch_warnings():
+        # Pessoas sem nenhum keypoint visível ficam com caixa NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        caixas = np.stack([np.nanmin(x, axis=1), np.nanmin(y, axis=1),
+                           np.nanmax(x, axis=1), np.nanmax(y, axis=1)], axis=1)
+    return caixas
+
+
+def _iou(a, b):
+    """IoU entre todas as caixas de a (n, 4) e b (m, 4)."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    intersecao = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    uniao = area_a[:, None] + area_b[None, :] - intersecao
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.nan_to_num(intersecao / uniao)
+
+
+def _semelhanca(pessoas, caixas, referencias, caixas_referencias, iou_minimo, distancia_maxima, min_confidence):
+    """
+    Matriz (pessoas, referências) de semelhança: IoU das caixas menos a distância média
+    entre keypoints (normalizada pela diagonal da caixa de referência); -inf onde o par
+    não é aceitável.
+    """
+    iou = _iou(caixas, caixas_referencias)
+
+    visiveis = keypoints_visiveis(pessoas, min_confidence)
+    visiveis_referencias = keypoints_visiveis(referencias, min_confidence)
+    ambos = visiveis[:, None, :] & visiveis_referencias[None, :, :]
+    distancias = np.linalg.norm(pessoas[:, None, :, :2] - referencias[None, :, :, :2], axis=-1)
+    diagonal = np.hypot(caixas_referencias[:, 2] - caixas_referencias[:, 0],
+                        caixas_referencias[:, 3] - caixas_referencias[:, 1])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        distancia = np.where(ambos, distancias, 0).sum(axis=-1) / ambos.sum(axis=-1) / diagonal[None, :]
+    distancia = np.nan_to_num(distancia, nan=np.inf, posinf=np.inf)
+
+    aceitavel = (iou >= iou_minimo) | (distancia <= distancia_maxima)
+    return np.where(aceitavel, iou - np.minimum(distancia, 1.0), -np.inf)
+
+
+def _pares_gulosos(semelhanca):
+    """Pares (linha, coluna) escolhidos do mais semelhante para o menos, sem repetir linha nem coluna."""
+    linhas, colunas = set(), set()
+    for indice in np.argsort(-semelhanca, axis=None):
+        linha, coluna = np.unravel_index(indice, semelhanca.shape)
+        if not np.isfinite(semelhanca[linha, coluna]):
+            break
+        if linha in linhas or coluna in colunas:
+            continue
+        linhas.add(linha)
+        colunas.add(coluna)
+        yield int(linha), int(coluna)
+
+
+def associar_trilhas(pessoas, ids, referencias, ids_referencias, iou_minimo=0.3, distancia_maxima=0.5,
+                     min_confidence=MIN_CONFIDENCE):
+    """
+    Associa trilhas de dois trechos do vídeo processados separadamente: pessoas (n, 17, 3)
+    são as primeiras poses de cada trilha do trecho seguinte e referencias (m, 17, 3) as
+    últimas poses das trilhas do trecho anterior. Retorna {id: id_referência}.
+    """
+    if not len(pessoas) or not len(referencias):
+        return {}
+    pessoas = np.asarray(pessoas, dtype=np.float32)
+    referencias = np.asarray(referencias, dtype=np.float32)
+    caixas = caixas_dos_keypoints(pessoas, keypoints_visiveis(pessoas, min_confidence))
+    caixas_referencias = caixas_dos_keypoints(referencias, keypoints_visiveis(referencias, min_confidence))
+    semelhanca = _semelhanca(pessoas, caixas, referencias, caixas_referencias, iou_minimo, distancia_maxima,
+                             min_confidence)
+    return {int(ids[i]): int(ids_referencias[j]) for i, j in _pares_gulosos(semelhanca)}
+
+
+class RastreadorPessoas:
+    """
+    Rastreador leve que associa as pessoas detectadas entre quadros e atribui ids estáveis.
+
+    A associação é gulosa pela sobreposição (IoU) das caixas dos keypoints; quando a
+    sobreposição é pequena, aceita o par se a distância média entre keypoints, normalizada
+    pela diagonal da caixa anterior, for menor que distancia_maxima. Trilhas não vistas
+    por mais de idade_maxima quadros são descartadas.
+    """
+
+    def __init__(self, iou_minimo=0.3, distancia_maxima=0.5, idade_maxima=30, min_confidence=MIN_CONFIDENCE):
+        self.iou_minimo = iou_minimo
+        self.distancia_maxima = distancia_maxima
+        self.idade_maxima = idade_maxima
+        self.min_confidence = min_confidence
+        self._proximo_id = 0
+        self._quadro = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._keypoints = np.empty((0, 17, 3), dtype=np.float32)
+        self._caixas = np.empty((0, 4))
+        self._visto_em = np.empty(0, dtype=np.int64)
+
+    def atualizar(self, pessoas):
+        """Recebe as pessoas de um quadro (n, 17, 3) e retorna o array de ids de trilha (n,)."""
+        pessoas = np.asarray(pessoas, dtype=np.float32).reshape(-1, 17, np.shape(pessoas)[-1] if np.size(pessoas) else 3)
+        if pessoas.shape[-1] == 2:
+            pessoas = np.concatenate([pessoas, np.ones(pessoas.shape[:-1] + (1,), dtype=np.float32)], axis=-1)
+        n = len(pessoas)
+        ids = np.full(n, -1, dtype=np.int64)
+
+        visiveis = keypoints_visiveis(pessoas, self.min_confidence)
+        caixas = caixas_dos_keypoints(pessoas, visiveis)
+
+        if n and len(self._ids):
+            semelhanca = _semelhanca(pessoas, caixas, self._keypoints, self._caixas,
+                                     self.iou_minimo, self.distancia_maxima, self.min_confidence)
+            # Associação gulosa: pares mais semelhantes primeiro
+            for deteccao, trilha in _pares_gulosos(semelhanca):
+                ids[deteccao] = self._ids[trilha]
+                self._keypoints[trilha] = pessoas[deteccao]
+                self._caixas[trilha] = caixas[deteccao]
+                self._visto_em[trilha] = self._quadro
+
+        novas = np.nonzero(ids < 0)[0]
+        if len(novas):
+            ids[novas] = np.arange(self._proximo_id, self._proximo_id + len(novas))
+            self._proximo_id += len(novas)
+            self._ids = np.concatenate([self._ids, ids[novas]])
+            self._keypoints = np.concatenate([self._keypoints, pessoas[novas]])
+            self._caixas = np.concatenate([self._caixas, caixas[novas]])
+            self._visto_em = np.concatenate([self._visto_em, np.full(len(novas), self._quadro)])
+
+        vivas = self._quadro - self._visto_em <= self.idade_maxima
+        self._ids, self._keypoints = self._ids[vivas], self._keypoints[vivas]
+        self._caixas, self._visto_em = self._caixas[vivas], self._visto_em[vivas]
+
+        self._quadro += 1
+        return ids
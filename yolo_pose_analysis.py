@@ -1,69 +1,269 @@
-from ultralytics import YOLO
-import torch
 import cv2
 import numpy as np
+import math
 import os
+import queue
+import threading
+import time
+from amostragem import AmostradorMovimento, preencher
+from instrumentacao import Desempenho, atual
+from model_registry import MODEL_PATH, load_model
+from pose_store import PoseStore, DEFAULT_FPS
+from recorte import RecorteROI, para_quadro_inteiro
+from renderizacao import renderizar_video
+from suavizacao import preprocessar
+from tracking import RastreadorPessoas
 
-def run_pose_estimation(video_path, progress_callback=None, frame_skip=2, save_annotated_video=False):
-    model_path = "yolo11n-pose.pt"
+# Máximo de lotes na fila entre a decodificação e a inferência; limita a memória usada
+QUEUE_SIZE = 4
 
-    if not os.path.exists(model_path):
-        from ultralytics.utils.downloads import attempt_download_asset
-        attempt_download_asset(model_path)
+_END = object()
 
-    # ✅ Carregamento forçado com weights_only=False
-    from ultralytics import YOLO
-    model = YOLO("yolo11n-pose.pt")
+
+def _put(q, item, stop):
+    """Coloca item na fila respeitando a contrapressão; desiste se o pipeline foi interrompido."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _decode_stage(cap, frame_skip, batch_size, decoded, stop, sampler=None, start_frame=0, end_frame=None,
+                  desempenho=None):
+    """
+    Etapa de decodificação: lê o vídeo e envia lotes (quadros, posições, pulados) para a
+    inferência. pulados[i] lista as posições que o amostrador adaptativo dispensou antes
+    do quadro i; um item extra no fim de pulados guarda as dispensadas após o último quadro.
+    Lê apenas os quadros [start_frame, end_frame); as posições são relativas ao vídeo inteiro.
+    O tempo de leitura e o de espera por espaço na fila vão para desempenho, se informado.
+    """
+    desempenho = desempenho or Desempenho()
+    try:
+        frame_count = start_frame
+        batch = []
+        batch_positions = []
+        skipped = []
+        pending = []
+        while not stop.is_set() and (end_frame is None or frame_count < end_frame):
+            inicio = time.perf_counter()
+            ret, frame = cap.read()
+            desempenho.registrar("decodificacao", time.perf_counter() - inicio, 1 if ret else 0)
+            if not ret:
+                break
+
+            if frame_count % frame_skip != 0:
+                frame_count += 1
+                continue
+
+            frame_count += 1
+            if sampler is not None:
+                with desempenho.etapa("amostragem"):
+                    inferir = sampler.inferir(frame)
+                if not inferir:
+                    pending.append(frame_count)
+                    continue
+
+            batch.append(frame)
+            batch_positions.append(frame_count)
+            skipped.append(pending)
+            pending = []
+
+            if len(batch) >= batch_size:
+                with desempenho.etapa("espera_fila"):
+                    _put(decoded, (batch, batch_positions, skipped), stop)
+                batch = []
+                batch_positions = []
+                skipped = []
+
+        if batch or pending:
+            _put(decoded, (batch, batch_positions, skipped + [pending]), stop)
+    except Exception as e:
+        _put(decoded, e, stop)
+    finally:
+        _put(decoded, _END, stop)
+
+
+def _result_keypoints(result):
+    """Keypoints (x, y, confiança) das pessoas detectadas em um resultado do YOLO, shape (n, 17, 3)."""
+    if result.keypoints is not None and result.keypoints.data is not None:
+        return result.keypoints.data.cpu().numpy()
+    return np.empty((0, 17, 3), dtype=np.float32)
+
+
+def read_video_info(video_path):
+    """Retorna (total de quadros, fps) do vídeo; fps ausente no arquivo vira DEFAULT_FPS."""
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    return total_frames, fps if fps and fps > 0 else DEFAULT_FPS
+
+
+def run_pose_estimation(video_path, progress_callback=None, frame_skip=2, save_annotated_video=False,
+                        model_path=MODEL_PATH, batch_size=1, frame_callback=None, motion_threshold=None,
+                        max_motion_gap=15, interpolate=True, start_frame=0, end_frame=None, model=None, imgsz=None,
+                        roi=None, roi_margin=0.2, preprocess=True, desempenho=None, output_path=None,
+                        cancelar=None):
+    """
+    Executa o YOLO Pose no vídeo e retorna (pose_data, caminho_do_video_anotado).
+    pose_data é um PoseStore, que também pode ser usado como a antiga lista de dicionários.
+    Com batch_size > 1 os quadros decodificados são agrupados e inferidos em lote;
+    o resultado é idêntico ao processamento quadro a quadro.
+
+    Decodificação e inferência rodam em paralelo, ligadas por uma fila limitada
+    (QUEUE_SIZE). Com save_annotated_video, o vídeo anotado é gerado depois da inferência
+    a partir dos keypoints armazenados (renderizacao.renderizar_video) em output_path
+    (padrão: <vídeo>_anotado.mp4, ao lado do original); para não esperar por ele, use
+    renderizacao.iniciar_renderizacao em segundo plano.
+
+    As pessoas são associadas entre quadros por um rastreador leve; cada linha do
+    PoseStore corresponde a um quadro do vídeo e cada pessoa tem um id de trilha estável.
+    O PoseStore guarda o fps do vídeo e o frame_skip usado, de onde saem os tempos em segundos.
+
+    frame_callback(frame_index, keypoints, track_ids), se informado, recebe cada quadro
+    assim que é inferido (na thread chamadora), permitindo análise enquanto o vídeo é
+    processado. Exceções de progress_callback são ignoradas; para interromper, use
+    cancelar: um objeto com is_set() (ex.: threading.Event), verificado antes de cada
+    inferência, que faz a função levantar InterruptedError.
+
+    Com motion_threshold, um amostrador adaptativo (AmostradorMovimento) só envia ao modelo
+    os quadros em que a cena mudou, ou um a cada max_motion_gap quadros em posturas
+    paradas. Os quadros dispensados recebem os keypoints interpolados entre as inferências
+    vizinhas (ou mantidos, com interpolate=False) e são marcados em pose_data.inferred;
+    pose_data.skipped_fraction informa a fração pulada.
+
+    start_frame e end_frame restringem o processamento a um trecho [start_frame, end_frame)
+    do vídeo (usado pelo processamento paralelo em parallel_pose); os índices de quadro no
+    PoseStore continuam relativos ao vídeo inteiro.
+
+    O modelo vem do registro do processo (model_registry.load_model), carregado e aquecido
+    uma única vez por model_path e imgsz (resolução de entrada). model permite passar
+    outro modelo: qualquer chamável que receba uma lista de quadros e retorne resultados
+    no formato do Ultralytics.
+
+    roi limita a área enviada ao modelo: um retângulo fixo (x1, y1, x2, y2), em pixels ou
+    em frações do quadro, ou "auto" para seguir a caixa das pessoas do quadro anterior
+    ampliada por roi_margin (veja recorte.RecorteROI). Os keypoints voltam sempre em
+    coordenadas do quadro inteiro. Como cada recorte automático depende do resultado do
+    quadro anterior, com "auto" a inferência é feita quadro a quadro, qualquer que seja
+    batch_size (a decodificação continua agrupada e em paralelo).
+
+    Com preprocess, os keypoints passam por suavizacao.preprocessar antes de serem
+    devolvidos: pontos de confiança baixa ou na origem são descartados, lacunas curtas
+    da mesma trilha são interpoladas e as posições suavizadas por um filtro causal.
+    frame_callback recebe sempre os keypoints brutos.
+
+    desempenho (instrumentacao.Desempenho; padrão: o ativo no contexto, se houver) recebe
+    o tempo de cada etapa (decodificação, espera, inferência, rastreamento, análise ao
+    vivo, pré-processamento e renderização) e a profundidade da fila de quadros.
+    """
+    batch_size = max(1, int(batch_size))
+    desempenho = desempenho or atual() or Desempenho()
+
+    if model is None:
+        with desempenho.etapa("carregamento_modelo"):
+            model = load_model(model_path, imgsz)
 
     cap = cv2.VideoCapture(video_path)
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
+    fps = cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+    if start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    segment_frames = max((total_frames if end_frame is None else min(end_frame, total_frames)) - start_frame, 1)
 
-    output_path = "output_video.mp4"
-    out = None
-    if save_annotated_video:
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+    output_path = output_path or os.path.splitext(video_path)[0] + "_anotado.mp4"
 
-    pose_data = []
-    frame_count = 0
-    processed_frames = 0
+    pose_data = PoseStore(capacity=math.ceil(segment_frames / frame_skip), fps=fps, frame_skip=frame_skip,
+                          metadata=dict(video=os.path.basename(video_path), total_frames=total_frames,
+                                        model=getattr(model, "path", type(model).__name__), imgsz=imgsz,
+                                        roi=roi, motion_threshold=motion_threshold))
+    tracker = RastreadorPessoas()
+    cropper = RecorteROI(width, height, roi, roi_margin)
+    sampler = None
+    if motion_threshold is not None:
+        sampler = AmostradorMovimento(limiar=motion_threshold, passo_maximo=max_motion_gap)
+    stop = threading.Event()
+    decoded = queue.Queue(maxsize=QUEUE_SIZE)
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
+    decoder = threading.Thread(target=_decode_stage, args=(cap, frame_skip, batch_size, decoded, stop, sampler,
+                                                                start_frame, end_frame, desempenho), daemon=True)
+    decoder.start()
 
-        if frame_count % frame_skip != 0:
-            frame_count += 1
-            continue
+    def record(frame_index, persons, track_ids, inferred=True):
+        pose_data.append(frame_index, persons, track_ids, inferred=inferred)
+        if frame_callback:
+            with desempenho.etapa("analise_ao_vivo", 1):
+                frame_callback(frame_index, persons, track_ids)
 
-        results = model(frame, verbose=False)
+    def fill(positions, current=None, position=None):
+        """Preenche os quadros dispensados entre a última inferência e a atual (ou o fim do vídeo)."""
+        last_persons, last_ids, last_position = previous
+        following = current if interpolate else None
+        for skipped_position in positions:
+            t = (skipped_position - last_position) / (position - last_position) if following else 0.0
+            persons, track_ids = preencher(last_persons, last_ids, following, t)
+            record(skipped_position - 1, persons, track_ids, inferred=False)
 
-        if save_annotated_video:
-            annotated_frame = results[0].plot()
-            out.write(annotated_frame)
+    # Pessoas, ids e posição do último quadro inferido
+    previous = None
 
-        if results[0].keypoints is not None and results[0].keypoints.xy is not None:
-            for person in results[0].keypoints.xy:
-                keypoints = person.cpu().numpy().tolist()
-                pose_data.append({"keypoints": keypoints})
-        else:
-            pose_data.append({"keypoints": []})
+    # A inferência roda na thread chamadora, então o progress_callback continua
+    # sendo chamado na mesma thread (necessário para atualizar a UI do Streamlit)
+    try:
+        while True:
+            desempenho.fila("quadros_decodificados", decoded.qsize())
+            with desempenho.etapa("espera_decodificacao"):
+                item = decoded.get()
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
 
-        frame_count += 1
-        processed_frames += 1
+            batch, batch_positions, skipped = item
+            # Na ROI automática o recorte de cada quadro vem do resultado do anterior
+            groups = [[i] for i in range(len(batch))] if cropper.automatica else [range(len(batch))]
+            for indices in groups if batch else []:
+                if cancelar is not None and cancelar.is_set():
+                    raise InterruptedError("Estimativa de pose cancelada")
+                with desempenho.etapa("recorte", len(indices)):
+                    crops, regions = zip(*(cropper.recortar(batch[i]) for i in indices))
+                with desempenho.etapa("inferencia", len(indices)):
+                    results = model(list(crops))
 
-        if progress_callback:
-            try:
-                progress_callback(frame_count / total_frames)
-            except Exception:
-                pass
+                for result, region, i in zip(results, regions, indices):
+                    position, skipped_before = batch_positions[i], skipped[i]
+                    with desempenho.etapa("rastreamento", 1):
+                        persons = para_quadro_inteiro(_result_keypoints(result), region)
+                        cropper.atualizar(persons)
+                        track_ids = tracker.atualizar(persons)
+                    if skipped_before:
+                        fill(skipped_before, (persons, track_ids), position)
+                    record(position - 1, persons, track_ids)
+                    previous = (persons, track_ids, position)
 
-    cap.release()
-    if save_annotated_video and out:
-        out.release()
+                    if progress_callback:
+                        try:
+                            progress_callback((position - start_frame) / segment_frames)
+                        except Exception:
+                            pass
+
+            for skipped_after in skipped[len(batch):]:
+                fill(skipped_after)
+    finally:
+        stop.set()
+        decoder.join()
+        cap.release()
 
-    return pose_data, output_path if save_annotated_video else None
+    pose_data.compact()
+    desempenho.quadros += pose_data.n_frames * frame_skip
+    if preprocess:
+        with desempenho.etapa("preprocessamento", pose_data.n_frames):
+            pose_data = preprocessar(pose_data)
+    if not save_annotated_video:
+        return pose_data, None
+    return pose_data, renderizar_video(video_path, pose_data, output_path, desempenho=desempenho)